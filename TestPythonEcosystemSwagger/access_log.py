@@ -0,0 +1,267 @@
+"""Асинхронное журналирование: очередь, фоновый поток и запись пачками.
+
+Потоки обработки запросов не пишут в файл или stderr сами. Записи журнала
+приложения (logging) попадают в очередь через QueueHandler, записи журнала
+доступа - кортежем без создания LogRecord. Фоновый поток раз в
+flush_interval забирает из очереди все, что накопилось, форматирует и пишет
+пачками до batch_size строк: одна операция write и один flush на пачку.
+
+Очередь ограничена: если поток записи не успевает, новые записи
+отбрасываются без ожидания, а число потерь видно в счетчике dropped
+(GET /metrics) и в журнале сообщением "dropped N log messages".
+
+Журнал доступа - текст в прежнем формате или JSON (одна строка на запрос).
+При sample_rate = N пишется каждый N-й успешный запрос и все ответы со
+статусом 400 и выше. Файл журнала поворачивается по размеру: file.log ->
+file.log.1 -> ... -> file.log.<backups>. В пути файла можно указать {pid}:
+в режиме prefork каждый процесс пишет и поворачивает свой файл.
+"""
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import QueueHandler
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class BatchWriter:
+    """Запись строк пачками в поток (stderr) или в файл с поворотом по размеру"""
+
+    def __init__(self, path=None, max_bytes=10 * 1024 * 1024, backups=5):
+        self.template = path
+        self.path = path.format(pid=os.getpid()) if path else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        if self.path:
+            # Файл открыт в двоичном режиме: размер для поворота считается в байтах,
+            # а не в символах (кириллица в UTF-8 - два байта на символ)
+            self.stream = open(self.path, 'ab')
+            self.size = self.stream.tell()
+        else:
+            self.stream = sys.stderr
+            self.size = 0
+
+    def write(self, lines):
+        data = '\n'.join(lines) + '\n'
+        if not self.path:
+            self.stream.write(data)
+            self.stream.flush()
+            return
+        data = data.encode('utf-8')
+        if self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+            self._rotate()
+        self.stream.write(data)
+        self.stream.flush()
+        self.size += len(data)
+
+    def _rotate(self):
+        self.stream.close()
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.stream = open(self.path, 'ab')
+        self.size = 0
+
+    def close(self):
+        if self.path:
+            self.stream.close()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который не ждет места в очереди, а отбрасывает запись"""
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        # Сообщение форматируется в потоке записи; здесь - только трассировка,
+        # которая ссылается на кадры стека текущего потока
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.put(record)
+
+
+class LogPipeline:
+    """Очередь записей и фоновый поток, который пишет их пачками.
+
+    Очередь - deque без блокировок: добавление записи не будит поток записи,
+    он сам просыпается раз в flush_interval и забирает все накопленное.
+    Иначе каждый запрос стоил бы переключения потоков.
+    """
+
+    def __init__(self, writer, json_format=False, queue_size=10000, batch_size=512, flush_interval=0.1):
+        self.writer = writer
+        self.json_format = json_format
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = deque()
+        self.dropped = 0
+        self._reported_dropped = 0
+        self.formatter = logging.Formatter(TEXT_FORMAT)
+        self._stopping = threading.Event()
+        self._thread = None
+        if hasattr(os, 'register_at_fork'):
+            # Поток записи не переживает fork: в дочернем процессе (prefork)
+            # создаются своя очередь, свой поток и, для {pid} в пути, свой файл
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="log-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Запись оставшегося в очереди и остановка потока"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self.writer.close()
+
+    def put(self, item):
+        # Проверка длины и append не атомарны вместе, поэтому под нагрузкой
+        # очередь может превысить queue_size на число потоков - это не страшно
+        if len(self.queue) >= self.queue_size:
+            self.dropped += 1
+        else:
+            self.queue.append(item)
+
+    def _after_fork(self):
+        self.queue = deque()
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, DroppingQueueHandler) and handler.pipeline is self:
+                handler.queue = self.queue
+        self.dropped = self._reported_dropped = 0
+        self._stopping = threading.Event()
+        writer = self.writer
+        if writer.template and '{pid}' in writer.template:
+            self.writer = BatchWriter(writer.template, writer.max_bytes, writer.backups)
+        if self._thread is not None:
+            self.start()
+
+    def _run(self):
+        while True:
+            stop = self._stopping.wait(self.flush_interval)
+            self._flush()
+            if stop:
+                return
+
+    def _flush(self):
+        popleft = self.queue.popleft
+        while True:
+            lines = []
+            try:
+                while len(lines) < self.batch_size:
+                    lines.append(self._format(popleft()))
+            except IndexError:
+                pass
+            if self.dropped != self._reported_dropped:
+                lines.append(self._format_dropped(self.dropped - self._reported_dropped))
+                self._reported_dropped = self.dropped
+            if lines:
+                try:
+                    self.writer.write(lines)
+                except Exception as e:
+                    # Ошибку записи журнала некуда записать, кроме stderr
+                    print(f"log writer error: {e}", file=sys.stderr)
+            if len(lines) < self.batch_size:
+                return
+
+    def _format(self, item):
+        if isinstance(item, tuple):
+            return self._format_access(*item)
+        if self.json_format:
+            entry = {
+                "time": datetime.fromtimestamp(item.created).isoformat(timespec='milliseconds'),
+                "level": item.levelname,
+                "logger": item.name,
+                "message": item.getMessage(),
+            }
+            if item.exc_text or item.exc_info:
+                entry["exception"] = item.exc_text or self.formatter.formatException(item.exc_info)
+            return json.dumps(entry, ensure_ascii=False)
+        return self.formatter.format(item)
+
+    def _format_access(self, created, client, method, path, version, status, size, duration):
+        if self.json_format:
+            entry = {
+                "time": datetime.fromtimestamp(created).isoformat(timespec='milliseconds'),
+                "type": "access",
+                "client": client,
+                "method": method,
+                "path": path,
+                "protocol": version,
+                "status": status,
+                "bytes": size,
+                "durationMs": round(duration * 1000, 3) if duration is not None else None,
+            }
+            return json.dumps(entry, ensure_ascii=False)
+        record = logging.LogRecord('access', logging.INFO, '', 0, '', None, None)
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        timing = f" {duration * 1000:.2f}ms" if duration is not None else ''
+        record.msg = f'{client} - "{method} {path} {version}" {status} {"-" if size is None else size}{timing}'
+        return self.formatter.format(record)
+
+    def _format_dropped(self, count):
+        record = logging.LogRecord('access_log', logging.WARNING, '', 0,
+                                   "dropped %d log messages: log queue is full", (count,), None)
+        return self._format(record)
+
+
+class AccessLog:
+    """Журнал доступа с выборкой успешных запросов.
+
+    Пока конвейер не настроен (setup_logging не вызывался), записи идут
+    в logging синхронно, как раньше.
+    """
+
+    def __init__(self, sample_rate=1, enabled=True):
+        self.sample_rate = sample_rate
+        self.enabled = enabled
+        self.pipeline = None
+        self._counter = itertools.count()
+        self._logger = logging.getLogger('access')
+
+    def log(self, client, method, path, version, status, size, duration=None):
+        if not self.enabled:
+            return
+        # Ошибки пишутся всегда, успешные запросы - каждый sample_rate-й
+        if status < 400 and self.sample_rate > 1 and next(self._counter) % self.sample_rate:
+            return
+        if self.pipeline is not None:
+            self.pipeline.put((time.time(), client, method, path, version, status, size, duration))
+        else:
+            self._logger.info('%s - "%s %s %s" %s %s', client, method, path, version, status,
+                              '-' if size is None else size)
+
+
+def setup_logging(access_log, path=None, json_format=False, max_bytes=10 * 1024 * 1024, backups=5,
+                  queue_size=10000, batch_size=512):
+    """Перевод logging и журнала доступа на очередь с фоновой записью"""
+    pipeline = LogPipeline(BatchWriter(path, max_bytes, backups), json_format, queue_size, batch_size)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(pipeline))
+    access_log.pipeline = pipeline
+    pipeline.start()
+    return pipeline
@@ -0,0 +1,488 @@
+"""HTTP/1.1 сервер на asyncio для обработчиков в стиле BaseHTTPRequestHandler.
+
+Соединения обслуживает один цикл событий (asyncio.start_server), поэтому
+простаивающее или keep-alive соединение не занимает поток. Запрос разбирается
+здесь же: строка запроса, заголовки, тело по Content-Length или
+Transfer-Encoding: chunked. Затем создается обработчик (подкласс
+BaseHTTPRequestHandler) без сокета: тело запроса он читает из rfile, а ответ
+пишет в буфер wfile, который отправляется в соединение целиком. Так asyncio-
+движок обслуживает те же маршруты теми же методами, что и http.server.
+
+Потоковый ответ обработчик не пишет сам, а оставляет в pending_stream
+(текст, формат, chunked, пауза, размер порции): его отдает цикл событий
+через asyncio.sleep, не блокируя остальные соединения.
+
+Обработчики выполняются прямо в цикле событий, если они не блокируются
+(хранилища в памяти). Для хранилищ с вводом-выводом (SQLite, mmap) задайте
+blocking_handlers=True - тогда обработчики выполняются в пуле потоков.
+blocking_paths - пути, запросы к которым всегда уходят в пул потоков
+(вход ждет проверки хеша пароля в пуле процессов).
+
+Остановка, как у APIServer: begin_drain() прекращает прием соединений
+(serve_forever возвращается), drain() в том же цикле событий дожидается
+соединений в работе, закрывая простаивающие keep-alive соединения.
+"""
+import asyncio
+import http.client
+import io
+import logging
+import socket
+import time
+
+import streaming
+from request_body import MAX_CHUNK_LINE, BodyError, _chunk_size
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Ограничения на заголовки запроса и на тело
+MAX_HEADER_BYTES = 65536
+MAX_HEADERS = 100
+
+SUPPORTED_VERSIONS = ('HTTP/1.0', 'HTTP/1.1')
+
+# Как часто drain() проверяет, остались ли соединения, сек
+DRAIN_POLL_INTERVAL = 0.05
+
+
+def raise_open_files_limit():
+    """Поднятие мягкого лимита открытых файлов до жесткого: каждое соединение - дескриптор"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            logger.warning(f"Cannot raise open files limit above {soft}")
+
+
+class BadRequest(Exception):
+    """Ошибка разбора запроса: ответ status и закрытие соединения"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def error_response(status, message):
+    """Ответ об ошибке разбора, отправляемый до создания обработчика"""
+    body = ('{"error": "%s"}' % message).encode('utf-8')
+    reason = http.client.responses.get(status, '')
+    return (f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n").encode('latin-1') + body
+
+
+class ParsedRequest:
+    """Разобранный запрос до передачи обработчику"""
+
+    __slots__ = ('command', 'path', 'request_version', 'requestline', 'headers', 'body')
+
+    def __init__(self, command, path, request_version, requestline, headers, body):
+        self.command = command
+        self.path = path
+        self.request_version = request_version
+        self.requestline = requestline
+        self.headers = headers
+        self.body = body
+
+    def wants_close(self):
+        connection = self.headers.get('Connection', '').lower()
+        if connection == 'close':
+            return True
+        if connection == 'keep-alive':
+            return False
+        return self.request_version != 'HTTP/1.1'
+
+
+class AsyncHTTPServer:
+    """Сервер с интерфейсом HTTPServer (serve_forever, server_close) на asyncio.
+
+    Сокет создается в конструкторе, как у HTTPServer: ошибка занятого порта
+    видна сразу, а server_port известен до запуска цикла событий.
+    idle_timeout - сколько ждать следующего запроса в keep-alive соединении,
+    max_body_size - предел тела запроса (больше - 413).
+
+    Обработчик сам решает, закрыть ли соединение (close_connection), и видит
+    номер запроса на соединении в requests_served - как в APIHandler.
+    sock - готовый слушающий сокет (унаследованный при горячем перезапуске)
+    вместо нового на server_address.
+    """
+
+    request_queue_size = 4096
+    keep_alive = True
+    max_keepalive_requests = 1000
+    # Простаивающее соединение ждет в цикле событий, не занимая поток
+    wait_for_idle = True
+    # Остановка: новые соединения не принимаются, ответы закрывают соединение
+    draining = False
+    # Соединение без запроса закрывается при остановке, если клиент молчит дольше, сек
+    drain_idle_grace = 1.0
+
+    def __init__(self, server_address, handler_class, max_streams=10000, idle_timeout=5.0,
+                 max_body_size=1024 * 1024, blocking_handlers=False, blocking_paths=(), sock=None):
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self.idle_timeout = idle_timeout
+        self.max_body_size = max_body_size
+        self.blocking_handlers = blocking_handlers
+        self.blocking_paths = frozenset(blocking_paths)
+        self.stream_slots = streaming.StreamSlots(max_streams)
+        self.stream_write_timeout = 10.0
+        self.connections = 0
+        # Соединения, которым отдается потоковый или отложенный ответ
+        self.delivering = 0
+        # Соединения, ждущие запроса: writer -> (reader, когда можно закрыть при остановке)
+        self._idle = {}
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind(server_address)
+                sock.listen(self.request_queue_size)
+            except OSError:
+                sock.close()
+                raise
+        self.socket = sock
+        self.socket.setblocking(False)
+        self.server_port = self.socket.getsockname()[1]
+        self._server = None
+        self._loop = None
+        self._stopping = None
+
+    def serve_forever(self):
+        """Прием соединений до begin_drain(); соединения в работе обслуживает drain()"""
+        raise_open_files_limit()
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._serve())
+
+    def begin_drain(self):
+        """Прекращение приема соединений; можно вызывать из любого потока"""
+        if self.draining:
+            return
+        self.draining = True
+        if self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def drain(self, timeout, on_quiesced=None):
+        """Ожидание соединений после begin_drain() не дольше timeout сек, затем закрытие цикла.
+
+        on_quiesced() вызывается, когда запросов в обработке не осталось (только
+        потоковые и отложенные ответы) или истек timeout. Возвращает число
+        соединений, оборванных по timeout.
+        """
+        if self._loop is None:
+            if on_quiesced is not None:
+                on_quiesced()
+            return 0
+        try:
+            return self._loop.run_until_complete(self._drain(timeout, on_quiesced))
+        finally:
+            self._close_loop()
+
+    def server_close(self):
+        self.socket.close()
+
+    def detach_request(self, request):
+        raise RuntimeError("Streaming responses are sent by the event loop, use pending_stream")
+
+    async def _serve(self):
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, sock=self.socket,
+                                                  limit=MAX_HEADER_BYTES)
+        if self.draining:
+            self._stopping.set()
+        await self._stopping.wait()
+        # Прием прекращается, но сервер не закрывается: соединение, принятое на
+        # этом шаге цикла, подключается к нему позже, и после Server.close()
+        # его сокет остался бы открытым до выхода процесса. Сам слушающий
+        # сокет закрывает serve() или server_close(); если он передан новому
+        # процессу, тот продолжит прием
+        self._loop.remove_reader(self.socket.fileno())
+
+    async def _drain(self, timeout, on_quiesced):
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            for writer, (reader, closable_at) in list(self._idle.items()):
+                if closable_at <= now:
+                    del self._idle[writer]
+                    # Запрос, уже лежащий в буфере, будет обслужен; новых данных соединение не примет
+                    writer.transport.pause_reading()
+                    reader.feed_eof()
+            # Задачи цикла, кроме этой: по одной на соединение, включая принятые
+            # перед остановкой приема, но еще не дошедшие до _handle_connection
+            pending = len(asyncio.all_tasks()) - 1
+            if on_quiesced is not None and pending == self.delivering:
+                on_quiesced()
+                on_quiesced = None
+            if not pending or now >= deadline:
+                break
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        if on_quiesced is not None:
+            on_quiesced()
+        return pending
+
+    def _close_loop(self):
+        loop = self._loop
+        tasks = asyncio.all_tasks(loop)
+        if tasks:
+            # Соединения, оборванные по timeout
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+        self._loop = None
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        client_address = writer.get_extra_info('peername') or ('', 0)
+        requests_served = 0
+        try:
+            while True:
+                # Ожидание запроса: при остановке соединение закрывается, если клиент молчит
+                self._idle[writer] = (reader, time.monotonic() + self.drain_idle_grace)
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader, writer),
+                                                     self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    break
+                except BadRequest as e:
+                    writer.write(error_response(e.status, e.message))
+                    await writer.drain()
+                    break
+                finally:
+                    self._idle.pop(writer, None)
+                if request is None:
+                    break
+
+                requests_served += 1
+                if self.blocking_handlers or request.path.partition('?')[0] in self.blocking_paths:
+                    loop = asyncio.get_running_loop()
+                    handler = await loop.run_in_executor(None, self._process, request,
+                                                         client_address, requests_served)
+                else:
+                    handler = self._process(request, client_address, requests_served)
+                delivery = handler.pending_delivery
+                if delivery is not None:
+                    # Ответ с задержкой или порциями: ждет только это соединение
+                    self.delivering += 1
+                    try:
+                        delivered = await self._deliver(writer, handler.wfile.getvalue(), delivery)
+                    finally:
+                        self.delivering -= 1
+                    if not delivered:
+                        break
+                else:
+                    writer.write(handler.wfile.getvalue())
+
+                stream = handler.pending_stream
+                if stream is not None:
+                    self.delivering += 1
+                    try:
+                        sent = await self._send_stream(writer, stream)
+                    finally:
+                        self.delivering -= 1
+                        self.stream_slots.release()
+                    stream_finished = getattr(handler, 'stream_finished', None)
+                    if stream_finished is not None:
+                        stream_finished(sent)
+                    break
+                await writer.drain()
+                if handler.close_connection:
+                    break
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # Обрыв по истечении drain(): задача завершается без ошибки, иначе
+            # start_server сообщает о ней как о необработанном исключении
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        """Чтение одного запроса; None - клиент закрыл соединение между запросами"""
+        head = b''
+        while not head:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.LimitOverrunError:
+                raise BadRequest(431, "Request header fields too large")
+            except asyncio.IncompleteReadError as e:
+                if e.partial.strip():
+                    raise BadRequest(400, "Incomplete request")
+                return None
+            # Пустые строки перед запросом допускаются (RFC 9112, 2.2)
+            head = head.lstrip(b'\r\n')
+
+        line_end = head.index(b'\r\n')
+        requestline = head[:line_end].decode('latin-1')
+        words = requestline.split()
+        if len(words) != 3:
+            raise BadRequest(400, "Bad request line")
+        command, path, version = words
+        if version not in SUPPORTED_VERSIONS:
+            raise BadRequest(505, "HTTP version not supported")
+
+        header_block = head[line_end + 2:]
+        if header_block.count(b'\r\n') > MAX_HEADERS + 1:
+            raise BadRequest(431, "Too many headers")
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+
+        if version == 'HTTP/1.1' and headers.get('Expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+        transfer_encoding = headers.get('Transfer-Encoding', '').lower()
+        if transfer_encoding:
+            if transfer_encoding != 'chunked':
+                raise BadRequest(501, "Unsupported Transfer-Encoding")
+            body = await self._read_chunked_body(reader)
+            # Обработчик читает тело по Content-Length
+            del headers['Transfer-Encoding']
+            headers['Content-Length'] = str(len(body))
+        else:
+            try:
+                length = int(headers.get('Content-Length', 0))
+            except ValueError:
+                raise BadRequest(400, "Bad Content-Length")
+            if length < 0:
+                raise BadRequest(400, "Bad Content-Length")
+            if length > self.max_body_size:
+                raise BadRequest(413, "Request body too large")
+            body = await reader.readexactly(length) if length else b''
+        return ParsedRequest(command, path, version, requestline, headers, body)
+
+    async def _read_chunked_body(self, reader):
+        # Разбор тот же, что у потоковых движков (request_body.read_chunked):
+        # одни и те же байты принимаются или отклоняются одинаково
+        parts = []
+        size = 0
+        while True:
+            line = await self._read_chunk_line(reader)
+            try:
+                chunk_size = _chunk_size(line)
+            except BodyError as e:
+                raise BadRequest(e.status, e.message) from None
+            if chunk_size == 0:
+                # Завершающие заголовки (trailers) пропускаются
+                while await self._read_chunk_line(reader) not in (b'\r\n', b'\n'):
+                    pass
+                return b''.join(parts)
+            size += chunk_size
+            if size > self.max_body_size:
+                raise BadRequest(413, "Request body too large")
+            try:
+                parts.append(await reader.readexactly(chunk_size))
+            except asyncio.IncompleteReadError:
+                raise BadRequest(400, "Incomplete request body") from None
+            if await self._read_chunk_line(reader) not in (b'\r\n', b'\n'):
+                raise BadRequest(400, "Bad chunk")
+
+    @staticmethod
+    async def _read_chunk_line(reader):
+        """Строка размера порции или завершающего заголовка не длиннее MAX_CHUNK_LINE"""
+        try:
+            line = await reader.readuntil(b'\n')
+        except asyncio.LimitOverrunError:
+            raise BadRequest(400, "Chunk line too long") from None
+        except asyncio.IncompleteReadError:
+            raise BadRequest(400, "Incomplete request body") from None
+        if len(line) > MAX_CHUNK_LINE:
+            raise BadRequest(400, "Chunk line too long")
+        return line
+
+    def _process(self, request, client_address, requests_served):
+        """Вызов обработчика для разобранного запроса; ответ остается в handler.wfile"""
+        handler = self.handler_class.__new__(self.handler_class)
+        handler.server = self
+        handler.client_address = client_address
+        handler.requests_served = requests_served
+        handler.command = request.command
+        handler.path = request.path
+        handler.request_version = request.request_version
+        handler.requestline = request.requestline
+        handler.headers = request.headers
+        handler.close_connection = request.wants_close()
+        handler.rfile = io.BytesIO(request.body)
+        handler.wfile = io.BytesIO()
+        handler.pending_stream = None
+        handler.pending_delivery = None
+
+        method = getattr(handler, 'do_' + request.command, None)
+        try:
+            if method is None:
+                handler.send_error(501, f"Unsupported method ({request.command!r})")
+            else:
+                method()
+        except Exception:
+            logger.exception(f"Error processing {request.command} {request.path}")
+            handler.wfile = io.BytesIO(error_response(500, "Internal server error"))
+            handler.pending_stream = None
+            handler.pending_delivery = None
+            handler.close_connection = True
+        return handler
+
+    async def _deliver(self, writer, data, delivery):
+        """Отдача ответа через delay сек, порциями по drip_bytes (0 - целиком).
+
+        Возвращает False, если клиент не принимает ответ и соединение брошено.
+        """
+        delay, drip_bytes, drip_interval = delivery
+        if delay:
+            await asyncio.sleep(delay)
+        if not drip_bytes:
+            writer.write(data)
+            return True
+        view = memoryview(data)
+        try:
+            for start in range(0, len(view), drip_bytes):
+                if start and drip_interval:
+                    await asyncio.sleep(drip_interval)
+                writer.write(view[start:start + drip_bytes])
+                await asyncio.wait_for(writer.drain(), self.stream_write_timeout)
+        except asyncio.TimeoutError:
+            writer.transport.abort()
+            return False
+        return True
+
+    async def _send_stream(self, writer, stream):
+        """Отдача потокового ответа; запись ждет клиента не дольше stream_write_timeout.
+
+        Возвращает число байт тела, переданных в соединение.
+        """
+        text, stream_format, chunked, delay, chunk_size = stream
+        timeout = self.stream_write_timeout
+        sent = 0
+        try:
+            await asyncio.wait_for(writer.drain(), timeout)
+            for chunk in streaming.iter_chunks(text, chunk_size):
+                if delay:
+                    await asyncio.sleep(delay)
+                data = streaming.encode_event(stream_format, chunk)
+                if chunked:
+                    data = streaming.frame_chunk(data)
+                writer.write(data)
+                sent += len(data)
+                await asyncio.wait_for(writer.drain(), timeout)
+            tail = streaming.encode_done(stream_format, text)
+            if chunked:
+                tail = (streaming.frame_chunk(tail) if tail else b'') + streaming.LAST_CHUNK
+            if tail:
+                writer.write(tail)
+                sent += len(tail)
+            await asyncio.wait_for(writer.drain(), timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            logger.warning("chat stream aborted: client is too slow or gone")
+            writer.transport.abort()
+        return sent
@@ -0,0 +1,87 @@
+"""Бенчмарк правил чата: автомат Ахо-Корасик против последовательных проверок "in".
+
+Генерирует --rules правил со случайными ключевыми словами и сообщения размером
+--message-kb КБ (без совпадений, с совпадением в конце и с совпадением первого
+правила) и сравнивает время ответа ChatRules с прежним подходом: цикл по
+правилам, в каждом message.lower() и проверка "keyword in message".
+
+Пример:
+    python benchmarks/bench_chat_rules.py --rules 10000 --message-kb 64
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_rules import ChatRules
+
+ALPHABET = string.ascii_lowercase + 'абвгдежзиклмнопрстуфхцчшщэюя'
+
+
+def random_word(rng, low, high):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(low, high)))
+
+
+def sequential_answer(rules, default, message):
+    """Прежняя логика обработчика /api/chat/send, обобщенная на таблицу правил"""
+    for rule in rules:
+        for keyword in rule['keywords']:
+            if message and keyword in message.lower():
+                return rule['answer']
+    return default
+
+
+def timed(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', type=int, default=10000, help="число правил")
+    parser.add_argument('--message-kb', type=int, default=64, help="размер сообщения, КБ")
+    parser.add_argument('--repeat', type=int, default=3, help="повторов замера")
+    parser.add_argument('--sequential-rules', type=int, default=200,
+                        help="число правил для последовательного варианта (он медленный)")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    rules = [{"keywords": [random_word(rng, 8, 14) for _ in range(2)], "answer": f"answer {i}"}
+             for i in range(args.rules)]
+    words = []
+    while sum(len(w) + 1 for w in words) < args.message_kb * 1024:
+        words.append(random_word(rng, 2, 7))
+    filler = ' '.join(words)
+    messages = {
+        'no match': filler,
+        'match last': filler + ' ' + rules[-1]['keywords'][0],
+        'match first': filler + ' ' + rules[0]['keywords'][0],
+    }
+
+    started = time.perf_counter()
+    compiled = ChatRules(rules, "default")
+    print(f"compile {args.rules} rules: {(time.perf_counter() - started) * 1000:.1f} ms, "
+          f"{len(compiled.automaton.goto)} automaton states")
+
+    sequential_rules = rules[:args.sequential_rules]
+    sequential_compiled = ChatRules(sequential_rules, "default")
+    print(f"{'message':<12} {'rules':>6} {'automaton, ms':>14} {'sequential, ms':>15}")
+    for name, message in messages.items():
+        automaton_time = timed(lambda: compiled.answer(message), args.repeat)
+        print(f"{name:<12} {args.rules:>6} {automaton_time * 1000:>14.2f} {'-':>15}")
+    for name, message in messages.items():
+        automaton_time = timed(lambda: sequential_compiled.answer(message), args.repeat)
+        sequential_time = timed(lambda: sequential_answer(sequential_rules, "default", message), args.repeat)
+        print(f"{name:<12} {len(sequential_rules):>6} {automaton_time * 1000:>14.2f} "
+              f"{sequential_time * 1000:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""Бенчмарк движков: asyncio против потоков http.server.
+
+Для каждого режима из --modes запускает main.py и последовательно:
+
+1. открывает --connections соединений, которые начали запрос и "зависли"
+   на середине заголовков, и, удерживая их, гоняет GET /api/health
+   из --clients параллельных клиентов в течение --duration секунд;
+2. открывает --streams одновременных SSE-потоков POST /api/chat/send
+   (stream=sse) и считает, сколько из них дошли до события done.
+
+Клиент написан на asyncio, чтобы держать десятки тысяч соединений в одном
+потоке. Лимит открытых файлов поднимается до жесткого; для 10k+ соединений
+он должен быть больше числа соединений (ulimit -n).
+
+Пример:
+    python benchmarks/bench_engines.py --modes asyncio,pool --connections 10000 --streams 2000
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import free_port, start_server, stop_server
+from async_server import raise_open_files_limit
+
+HEALTH_REQUEST = b"GET /api/health HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+def login(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request('POST', '/api/auth/login', 'Login=v_shutenko&Password=8nEThznM',
+                       {'Content-Type': 'application/x-www-form-urlencoded'})
+    token = json.loads(connection.getresponse().read())['sessionToken']
+    connection.close()
+    return token
+
+
+async def read_response(reader):
+    """Чтение ответа с Content-Length; возвращает (статус, можно ли продолжать соединение)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.lower().split(b'\r\n')
+    version, status = lines[0].split(b' ', 2)[:2]
+    length = 0
+    keep_alive = version == b'http/1.1'
+    for line in lines[1:]:
+        if line.startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+        elif line.startswith(b'connection:') and b'close' in line:
+            keep_alive = False
+    await reader.readexactly(length)
+    return int(status), keep_alive
+
+
+async def open_idle(port, count):
+    """Соединения с незавершенными заголовками; возвращает (открытые, ошибки)"""
+    async def open_one():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b"GET /api/health HTTP/1.1\r\nHost: localhost\r\n")
+        await writer.drain()
+        return writer
+
+    writers, errors = [], 0
+    # Порциями, чтобы не переполнить backlog слушающего сокета
+    for start in range(0, count, 500):
+        results = await asyncio.gather(*(open_one() for _ in range(start, min(count, start + 500))),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                errors += 1
+            else:
+                writers.append(result)
+    return writers, errors
+
+
+async def run_clients(port, clients, duration, timeout):
+    """Запросы health из clients клиентов по keep-alive; возвращает (ok, ошибки, задержки)"""
+    stop_at = time.monotonic() + duration
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        reader = writer = None
+        while time.monotonic() < stop_at:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection('127.0.0.1', port), timeout)
+                started = time.perf_counter()
+                writer.write(HEALTH_REQUEST)
+                status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                errors += 1
+                keep_alive = False
+            if not keep_alive and writer is not None:
+                writer.close()
+                writer = None
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return len(latencies), errors, latencies
+
+
+async def run_streams(port, token, count, delay_ms, timeout):
+    """Одновременные SSE-потоки; возвращает (завершенные, ошибки, время)"""
+    body = f"sessionToken={token}&message=artificial intelligence&stream=sse&tokenDelayMs={delay_ms}"
+    body = body.encode('utf-8')
+    request = (b"POST /api/chat/send HTTP/1.1\r\nHost: localhost\r\n"
+               b"Content-Type: application/x-www-form-urlencoded\r\n"
+               b"Content-Length: %d\r\n\r\n%s" % (len(body), body))
+
+    # Одновременных подключений не больше 500: иначе переполняется очередь SYN
+    # слушающего сокета и клиент ждет повторной отправки SYN секундами
+    connecting = asyncio.Semaphore(500)
+
+    async def stream():
+        async with connecting:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(request)
+            data = await asyncio.wait_for(reader.read(-1), timeout)
+            return b'event: done' in data
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    completed = errors = 0
+    for result in await asyncio.gather(*(stream() for _ in range(count)), return_exceptions=True):
+        if result is True:
+            completed += 1
+        else:
+            errors += 1
+    return completed, errors, time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def bench_mode(args, port):
+    token = login(port)
+    idle, idle_errors = await open_idle(port, args.connections)
+    ok, errors, latencies = await run_clients(port, args.clients, args.duration, args.timeout)
+    for writer in idle:
+        writer.close()
+    # Серверу нужно время, чтобы заметить закрытые соединения и освободить потоки
+    await asyncio.sleep(1)
+    streams, stream_errors, elapsed = await run_streams(port, token, args.streams,
+                                                        args.stream_delay_ms, args.stream_timeout)
+    return {
+        'idle': idle, 'idle_errors': idle_errors,
+        'ok': ok, 'errors': errors, 'latencies': latencies,
+        'streams': streams, 'stream_errors': stream_errors, 'stream_time': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='asyncio,pool', help="режимы main.py через запятую")
+    parser.add_argument('--workers', type=int, default=64, help="размер пула для режимов pool/prefork")
+    parser.add_argument('--connections', type=int, default=10000, help="число зависших соединений")
+    parser.add_argument('--clients', type=int, default=16, help="число клиентов health")
+    parser.add_argument('--duration', type=float, default=5.0, help="длительность замера health, сек")
+    parser.add_argument('--timeout', type=float, default=2.0, help="таймаут запроса health, сек")
+    parser.add_argument('--streams', type=int, default=2000, help="число одновременных SSE-потоков")
+    parser.add_argument('--stream-delay-ms', type=int, default=50, help="пауза между токенами, мс")
+    parser.add_argument('--stream-timeout', type=float, default=60.0, help="таймаут потока, сек")
+    args = parser.parse_args()
+    raise_open_files_limit()
+
+    print(f"{'mode':<8} {'held':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'streams':>8} {'failed':>7} {'stream s':>9}")
+    for mode in args.modes.split(','):
+        port = free_port()
+        server = start_server(port, '--mode', mode, '--workers', str(args.workers),
+                              '--queue-size', str(args.workers * 4),
+                              '--max-streams', str(args.streams), '--processes', '2')
+        try:
+            result = asyncio.run(bench_mode(args, port))
+        finally:
+            stop_server(server)
+        latencies = result['latencies']
+        print(f"{mode:<8} {len(result['idle']):>7} {result['ok'] / args.duration:>9.0f} "
+              f"{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+              f"{result['errors']:>7} {result['streams']:>8} {result['stream_errors']:>7} "
+              f"{result['stream_time']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Бенчмарк генератора ответов чата: таблицы выборки против выбора с весами на каждом шаге.
+
+Для нескольких пар temperature/top-p измеряет:
+- build - построение таблицы выборки (один раз на пару, затем из кеша);
+- table - скорость генерации TextGenerator.generate, МБ UTF-8 в секунду,
+  для ответов размером --lengths символов;
+- weighted - та же цепь, но на каждом шаге веса продолжений пересчитываются
+  с temperature и top-p и слово выбирается random.choices, как без таблиц.
+
+Пример:
+    python benchmarks/bench_generator.py --lengths 1000,65536,1048576,8388608
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from text_generator import TextGenerator, _weights
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'chat_corpus.txt')
+SETTINGS = ((1.0, 1.0), (0.7, 0.9), (2.0, 1.0), (0.0, 1.0))
+
+
+def weighted_generate(generator, length, temperature, top_p, seed):
+    """Генерация без таблицы: веса и выбор на каждом шаге"""
+    rng = random.Random(seed)
+    state = generator._start(rng, '')
+    parts = list(generator._keys[state])
+    size = sum(map(len, parts)) + len(parts)
+    while size <= length:
+        counts, successors = generator._successors[state]
+        weights = _weights(counts, temperature, top_p)
+        state = rng.choices(successors[:len(weights)], weights)[0]
+        word = generator._emit[state]
+        parts.append(word)
+        size += len(word) + 1
+    return ' '.join(parts)[:length]
+
+
+def best_of(function, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=CORPUS_PATH, help="текстовый корпус")
+    parser.add_argument('--order', type=int, default=1, help="порядок цепи")
+    parser.add_argument('--lengths', default='1000,65536,1048576,8388608', help="длины ответов, символов")
+    parser.add_argument('--weighted-length', type=int, default=65536,
+                        help="длина ответа для варианта weighted (он медленный)")
+    parser.add_argument('--repeat', type=int, default=3, help="повторов замера")
+    args = parser.parse_args()
+    lengths = [int(value) for value in args.lengths.split(',')]
+
+    started = time.perf_counter()
+    generator = TextGenerator.load(args.corpus, args.order)
+    print(f"corpus: {generator.corpus_words} words, {len(generator)} states, "
+          f"index {(time.perf_counter() - started) * 1000:.1f} ms")
+    print(f"{'T':>4} {'top-p':>5} {'build ms':>9} " + ''.join(f"{f'{n} ch MB/s':>18}" for n in lengths)
+          + f" {'weighted MB/s':>14}")
+    for temperature, top_p in SETTINGS:
+        generator._tables.clear()
+        started = time.perf_counter()
+        generator.table(temperature, top_p)
+        build = (time.perf_counter() - started) * 1000
+        line = f"{temperature:>4} {top_p:>5} {build:>9.1f} "
+        for length in lengths:
+            elapsed, text = best_of(lambda: generator.generate(length, temperature, top_p, seed=1), args.repeat)
+            line += f"{len(text.encode('utf-8')) / elapsed / 1e6:>18.1f}"
+        elapsed, text = best_of(lambda: weighted_generate(generator, args.weighted_length, temperature, top_p, 1),
+                                args.repeat)
+        line += f" {len(text.encode('utf-8')) / elapsed / 1e6:>14.1f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Бенчмарк записи метрик: цена одного запроса для Metrics в 1 и нескольких потоках.
+
+Каждый поток вызывает request_started и record так же, как
+APIHandler._dispatch, по --routes маршрутам. Из результата вычитается
+время пустого цикла с теми же вызовами time.perf_counter().
+
+Пример:
+    python benchmarks/bench_metrics.py --requests 200000 --threads 1,4,16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import Metrics
+
+
+class BenchRoute:
+    """Маршрут с теми же атрибутами, что и main.Route"""
+
+    __slots__ = ('method', 'path')
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+
+
+def loop(metrics, routes, count):
+    perf_counter = time.perf_counter
+    for i in range(count):
+        shard = metrics.request_started()
+        started = perf_counter()
+        shard.record(routes[i % len(routes)], 200, perf_counter() - started, 128)
+
+
+def empty_loop(metrics, routes, count):
+    perf_counter = time.perf_counter
+    for i in range(count):
+        started = perf_counter()
+        routes[i % len(routes)], perf_counter() - started
+
+
+def run(function, threads, routes, count, repeat):
+    """Лучшее время из repeat прогонов и метрики последнего"""
+    best = float('inf')
+    for _ in range(repeat):
+        metrics = Metrics()
+        workers = [threading.Thread(target=function, args=(metrics, routes, count)) for _ in range(threads)]
+        # Процессорное время, а не настенное: меньше зависит от соседей по машине
+        started = time.process_time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        best = min(best, time.process_time() - started)
+    return best, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200000, help="запросов на поток")
+    parser.add_argument('--threads', default='1,4,16', help="список чисел потоков через запятую")
+    parser.add_argument('--routes', type=int, default=20, help="число маршрутов")
+    parser.add_argument('--repeat', type=int, default=5, help="повторов замера (берется лучший)")
+    args = parser.parse_args()
+
+    routes = [BenchRoute('GET', f"/api/route/{i}") for i in range(args.routes)]
+    print(f"{'threads':>7} {'ns/request':>11} {'collect ms':>11}")
+    for threads in [int(t) for t in args.threads.split(',')]:
+        elapsed, metrics = run(loop, threads, routes, args.requests, args.repeat)
+        baseline, _ = run(empty_loop, threads, routes, args.requests, args.repeat)
+        started = time.perf_counter()
+        metrics.render()
+        render_time = time.perf_counter() - started
+        per_request = (elapsed - baseline) / (threads * args.requests) * 1e9
+        print(f"{threads:>7} {per_request:>11.0f} {render_time * 1000:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Бенчмарк записи ответа: прежний путь send_header против закодированных блоков.
+
+Обработчик создается без сокета: wfile - буферизованный поток поверх
+счетчика записей, connection - счетчик вызовов sendmsg/sendall. Каждая
+запись в них соответствует одному системному вызову настоящего сокета.
+Для каждого ответа выводятся время, число системных вызовов и пик памяти,
+выделенной на время ответа (tracemalloc).
+
+"before" - прежняя последовательность send_response, send_header,
+_set_cors_headers, end_headers и json.dumps(default=str); "after" -
+_send_response (с кэшем повторяющихся ответов) и _send_encoded.
+
+Пример:
+    python benchmarks/bench_responses.py --requests 50000
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import HEALTH_RESPONSE, APIHandler
+
+
+class CountingRaw(io.RawIOBase):
+    """Сырой поток, который только считает записи"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.calls += 1
+        return len(data)
+
+
+class CountingSocket:
+    """Сокет для sendmsg/sendall, который только считает вызовы"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def sendmsg(self, parts):
+        self.calls += 1
+        return sum(map(len, parts))
+
+    def sendall(self, data):
+        self.calls += 1
+
+
+class BenchServer:
+    keep_alive = True
+    max_keepalive_requests = 0
+
+
+def make_handler():
+    handler = APIHandler.__new__(APIHandler)
+    handler.server = BenchServer()
+    handler.client_address = ('127.0.0.1', 0)
+    handler.request_version = 'HTTP/1.1'
+    handler.requestline = 'GET / HTTP/1.1'
+    handler.command = 'GET'
+    handler.path = '/'
+    handler.close_connection = False
+    handler.requests_served = 1
+    # Как в _dispatch: журнал доступа пишется не из send_response
+    handler.in_dispatch = True
+    handler.raw = CountingRaw()
+    handler.wfile = io.BufferedWriter(handler.raw)
+    handler.connection = CountingSocket()
+    return handler
+
+
+def legacy_send_response(handler, data, status_code=200, content_type='application/json'):
+    """_send_response до перехода на закодированные блоки"""
+    handler.send_response(status_code)
+    handler.send_header('Content-Type', content_type)
+    body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+    handler.send_header('Content-Length', str(len(body)))
+    handler._set_cors_headers()
+    handler.end_headers()
+    handler._write_body(body)
+
+
+EXPIRES_AT = time.time() + 3600
+
+
+def large_payload():
+    messages = [{"id": i, "role": "user", "text": "hello " * 20, "timestamp": "2026-01-01T00:00:00"}
+                for i in range(600)]
+    return {"messages": messages, "nextCursor": None}
+
+
+CASES = [
+    ("health", lambda h: legacy_send_response(h, {"status": "OK"}),
+     lambda h: h._send_encoded(HEALTH_RESPONSE)),
+    ("small json", lambda h: legacy_send_response(h, {"value": 42}),
+     lambda h: h._send_response({"value": 42})),
+    ("404 error", lambda h: legacy_send_response(h, {"error": "Endpoint not found"}, 404),
+     lambda h: h._send_response({"error": "Endpoint not found"}, 404)),
+    ("401 session", lambda h: legacy_send_response(h, {"error": "Invalid session"}, 401),
+     lambda h: h._send_response({"error": "Invalid session"}, 401)),
+    ("chat clear", lambda h: legacy_send_response(h, {"message": "Chat cleared"}),
+     lambda h: h._send_response({"message": "Chat cleared"})),
+    ("check sess", lambda h: legacy_send_response(h, {"valid": True, "userLogin": "v_shutenko",
+                                                      "expiresAt": datetime.fromtimestamp(EXPIRES_AT)}),
+     lambda h: h._send_response({"valid": True, "userLogin": "v_shutenko",
+                                 "expiresAt": datetime.fromtimestamp(EXPIRES_AT).isoformat(sep=' ')})),
+]
+
+
+def measure(send, requests):
+    handler = make_handler()
+    # Конец handle_one_request: буфер wfile уходит в сокет
+    flush = handler.wfile.flush
+    started = time.perf_counter()
+    for _ in range(requests):
+        send(handler)
+        flush()
+    elapsed = time.perf_counter() - started
+    syscalls = (handler.raw.calls + handler.connection.calls) / requests
+
+    tracemalloc.start()
+    peak = 0
+    for _ in range(100):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        send(handler)
+        flush()
+        peak += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return elapsed / requests * 1e6, syscalls, peak / 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=50000, help="ответов на замер")
+    args = parser.parse_args()
+
+    payload = large_payload()
+    cases = CASES + [("large json", lambda h: legacy_send_response(h, payload),
+                      lambda h: h._send_response(payload))]
+    print(f"{'response':<11} {'':<7} {'us/resp':>8} {'syscalls':>9} {'peak KiB':>9}")
+    for name, before, after in cases:
+        requests = args.requests if name != "large json" else max(1, args.requests // 50)
+        for label, send in (("before", before), ("after", after)):
+            micros, syscalls, peak = measure(send, requests)
+            print(f"{name:<11} {label:<7} {micros:>8.2f} {syscalls:>9.2f} {peak / 1024:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
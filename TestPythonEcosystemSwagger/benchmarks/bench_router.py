@@ -0,0 +1,99 @@
+"""Микробенчмарк диспетчеризации: таблица маршрутов Router против цепочки if/elif.
+
+Для каждого числа маршрутов строит Router из main.py и эквивалентную цепочку
+сравнений строк (как в прежних do_GET/do_POST) и измеряет среднее время поиска
+первого маршрута, последнего маршрута, случайного маршрута и отсутствующего пути.
+
+Пример:
+    python benchmarks/bench_router.py --routes 15,100,500,1000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import Router
+
+METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+
+def make_routes(count):
+    """Набор (метод, путь); каждый пятый маршрут - с параметром пути"""
+    routes = []
+    for i in range(count):
+        method = METHODS[i % len(METHODS)]
+        if i % 5 == 4:
+            routes.append((method, f'/api/group{i % 7}/item{i}/{{id}}'))
+        else:
+            routes.append((method, f'/api/group{i % 7}/item{i}'))
+    return routes
+
+
+def build_router(routes):
+    router = Router()
+    for index, (method, path) in enumerate(routes):
+        router.add(method, path, index)
+    return router
+
+
+def build_chain(routes):
+    """Функция dispatch(method, path) в стиле прежних if/elif цепочек"""
+    lines = ['def dispatch(method, path):']
+    for method in METHODS:
+        lines.append(f'    if method == {method!r}:')
+        first = True
+        for index, (route_method, path) in enumerate(routes):
+            if route_method != method:
+                continue
+            keyword = 'if' if first else 'elif'
+            first = False
+            if '{' in path:
+                prefix = path[:path.index('{')]
+                lines.append(f'        {keyword} path.startswith({prefix!r}) and "/" not in path[{len(prefix)}:]:')
+            else:
+                lines.append(f'        {keyword} path == {path!r}:')
+            lines.append(f'            return {index}')
+        lines.append('        return None')
+    lines.append('    return None')
+    namespace = {}
+    exec('\n'.join(lines), namespace)
+    return namespace['dispatch']
+
+
+def concrete(path):
+    return path.replace('{id}', '42')
+
+
+def measure(function, requests, number):
+    timer = timeit.Timer(lambda: [function(method, path) for method, path in requests])
+    return min(timer.repeat(repeat=5, number=number)) / (number * len(requests)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--routes', default='15,50,100,250,500,1000', help="числа маршрутов через запятую")
+    parser.add_argument('--number', type=int, default=200, help="повторов каждого замера")
+    args = parser.parse_args()
+
+    random.seed(1)
+    print(f"{'routes':>6} {'case':<8} {'if/elif, ns':>12} {'Router, ns':>11} {'speedup':>8}")
+    for count in [int(c) for c in args.routes.split(',')]:
+        routes = make_routes(count)
+        router = build_router(routes)
+        chain = build_chain(routes)
+        cases = {
+            'first': [(routes[0][0], concrete(routes[0][1]))],
+            'last': [(routes[-1][0], concrete(routes[-1][1]))],
+            'random': [(m, concrete(p)) for m, p in random.sample(routes, min(count, 50))],
+            'miss': [('GET', '/api/unknown/path')],
+        }
+        for case, requests in cases.items():
+            chain_ns = measure(chain, requests, args.number)
+            router_ns = measure(router.resolve, requests, args.number)
+            print(f"{count:>6} {case:<8} {chain_ns:>12.0f} {router_ns:>11.0f} {chain_ns / router_ns:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
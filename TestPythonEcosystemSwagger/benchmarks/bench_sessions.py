@@ -0,0 +1,86 @@
+"""Бенчмарк хранилищ сессий: обычный dict, SessionStore, SQLite (WAL) и mmap.
+
+Из --threads потоков выполняет --sessions входов (create), затем по одной
+проверке (get) на каждую сессию и выводит число операций в секунду.
+Для SQLite дополнительно замеряется вариант без group commit (одна транзакция
+и один fsync на каждый вход).
+
+Пример:
+    python benchmarks/bench_sessions.py --sessions 20000 --threads 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sessions import MmapSessionStore, SQLiteSessionStore, SessionStore, fcntl
+
+
+class DictStore:
+    """Прежний вариант: глобальный dict без блокировок и ограничений"""
+
+    def __init__(self):
+        self._sessions = {}
+
+    def create(self, user_login):
+        token = str(uuid.uuid4())
+        self._sessions[token] = {"userLogin": user_login, "expiresAt": time.time() + 3600}
+        return token
+
+    def get(self, token):
+        return self._sessions.get(token)
+
+
+def run_threads(threads, items, function):
+    """Выполнение function(item) для всех items из нескольких потоков; время в секундах"""
+    chunks = [items[i::threads] for i in range(threads)]
+    results = [None] * threads
+
+    def worker(index):
+        results[index] = [function(item) for item in chunks[index]]
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started, [r for chunk in results for r in chunk]
+
+
+def bench(name, store, sessions, threads):
+    elapsed_create, created = run_threads(threads, range(sessions), lambda i: store.create(f"user{i}"))
+    tokens = [s if isinstance(s, str) else s.token for s in created]
+    elapsed_get, found = run_threads(threads, tokens, store.get)
+    assert all(found), f"{name}: not all sessions found"
+    print(f"{name:<24} {sessions / elapsed_create:>12.0f} {sessions / elapsed_get:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20000, help="число входов")
+    parser.add_argument('--threads', type=int, default=16, help="число потоков")
+    parser.add_argument('--no-commit-sessions', type=int, default=500,
+                        help="число входов для SQLite без group commit (медленно)")
+    args = parser.parse_args()
+
+    print(f"{'store':<24} {'create/s':>12} {'get/s':>12}")
+    bench('dict', DictStore(), args.sessions, args.threads)
+    bench('SessionStore', SessionStore(max_sessions=args.sessions), args.sessions, args.threads)
+    with tempfile.TemporaryDirectory() as directory:
+        bench('sqlite (group commit)', SQLiteSessionStore(os.path.join(directory, 'group.db')),
+              args.sessions, args.threads)
+        no_batching = SQLiteSessionStore(os.path.join(directory, 'single.db'), batch_size=1)
+        bench('sqlite (commit per op)', no_batching, args.no_commit_sessions, args.threads)
+        if fcntl is not None:
+            bench('mmap', MmapSessionStore(os.path.join(directory, 'sessions.mmap'),
+                                           max_sessions=args.sessions),
+                  args.sessions, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Бенчмарк проверки сессии: поиск в словаре против подписанных токенов.
+
+Выдает --sessions сессий и замеряет цену одной проверки токена (get):
+- dict - прежний словарь active_sessions (поиск и проверка срока);
+- SessionStore - хранилище в памяти (блокировка и LRU);
+- signed (cold) - каждый токен проверяется впервые: HMAC-SHA256, фильтр Блума;
+- signed (hot) - --hot-tokens токенов повторяются и отвечают из кэша.
+Для signed журнал отзывов заранее заполнен --revoked токенами.
+
+Память - прирост по tracemalloc при выдаче всех сессий: у словаря и
+SessionStore он растет с числом сессий, у signed - только кэш и журнал.
+
+Пример:
+    python benchmarks/bench_tokens.py --sessions 1000000 --lookups 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sessions import Session, SessionStore, SignedSessionStore
+
+
+class DictStore:
+    """Прежний вариант: глобальный dict без блокировок и ограничений"""
+
+    def __init__(self):
+        self._sessions = {}
+
+    def create(self, user_login):
+        session = Session(str(uuid.uuid4()), user_login, time.time() + 3600)
+        self._sessions[session.token] = session
+        return session
+
+    def get(self, token):
+        session = self._sessions.get(token)
+        if session is None or time.time() > session.expires_at:
+            return None
+        return session
+
+
+def issue(store, sessions):
+    """Выдача сессий; токены и прирост памяти, байт"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tokens = [store.create(f"user{i}").token for i in range(sessions)]
+    # Сами строки токенов хранит клиент, а не сервер
+    memory = tracemalloc.get_traced_memory()[0] - before - sum(map(sys.getsizeof, tokens))
+    tracemalloc.stop()
+    return tokens, memory
+
+
+def lookups(store, tokens):
+    get = store.get
+    started = time.perf_counter()
+    for token in tokens:
+        if get(token) is None:
+            raise AssertionError("valid token rejected")
+    return (time.perf_counter() - started) / len(tokens) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=1000000, help="число выданных сессий")
+    parser.add_argument('--lookups', type=int, default=200000, help="проверок на замер")
+    parser.add_argument('--hot-tokens', type=int, default=10000,
+                        help="сколько разных токенов в замере signed (hot)")
+    parser.add_argument('--revoked', type=int, default=10000, help="отозванных токенов в журнале")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'store':<16} {'ns/get':>9} {'memory MiB':>11}")
+    for name, store in (("dict", DictStore()), ("SessionStore", SessionStore(max_sessions=args.sessions))):
+        tokens, memory = issue(store, args.sessions)
+        sample = [rng.choice(tokens) for _ in range(args.lookups)]
+        print(f"{name:<16} {lookups(store, sample):>9.0f} {memory / 2**20:>11.1f}")
+        del store, tokens, sample
+
+    store = SignedSessionStore(max_revocations=max(args.revoked * 2, 1024))
+    tokens, memory = issue(store, args.sessions)
+    for token in tokens[:args.revoked]:
+        store.remove(token)
+    live = tokens[args.revoked:]
+    cold = rng.sample(live, min(args.lookups, len(live)))
+    print(f"{'signed (cold)':<16} {lookups(store, cold):>9.0f} {memory / 2**20:>11.1f}")
+    hot = live[:args.hot_tokens]
+    sample = [rng.choice(hot) for _ in range(args.lookups)]
+    lookups(store, hot)
+    print(f"{'signed (hot)':<16} {lookups(store, sample):>9.0f} {'':>11}")
+    revoked = sum(store.get(token) is None for token in tokens[:args.revoked])
+    print(f"revoked tokens rejected: {revoked}/{args.revoked}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Бенчмарк проверки параметров: скомпилированные проверки против обхода схемы.
+
+Для нескольких типичных запросов измеряет:
+- compiled - функцию проверки маршрута, скомпилированную из спецификации
+  при загрузке (validation.py, Route.validator);
+- interpreted - то же по спецификации, но с обходом схемы операции на каждый
+  запрос (поиск операции, полей, типов и ограничений), как делал бы
+  универсальный валидатор;
+- request - обработку запроса целиком без сети: разбор тела, сессия,
+  проверка, обработчик и запись ответа (обработчик asyncio-движка);
+и долю compiled во времени запроса.
+
+Пример:
+    python benchmarks/bench_validation.py --requests 50000
+"""
+import argparse
+import http.client
+import io
+import math
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from async_server import AsyncHTTPServer, ParsedRequest
+from main import APIHandler, AsyncAPIHandler, access_log, build_swagger_spec, chat_history, session_store
+from request_body import RequestParams
+from validation import FORM
+
+CASES = [
+    ("temperature", 'POST', '/api/settings/temperature', 'value=150&sessionToken={token}'),
+    # Раньше отправки: отправки вытесняют сообщение 1 из истории
+    ("chat update", 'PUT', '/api/chat/update', 'messageId=1&newMessage=edited&sessionToken={token}'),
+    ("chat send", 'POST', '/api/chat/send', 'message=hello%20there&sessionToken={token}'),
+    ("history", 'GET', '/api/chat/history?limit=20&after=0&sessionToken={token}', ''),
+]
+
+
+def interpreted_validate(spec, method, path, params):
+    """Проверка с обходом спецификации на каждый запрос"""
+    operation = spec['paths'][path][method.lower()]
+    schemas = spec['components']['schemas']
+    fields = [(p['name'], p.get('required', False), p.get('schema', {})) for p in operation.get('parameters', ())]
+    body = operation.get('requestBody', {}).get('content', {}).get(FORM)
+    if body is not None:
+        schema = body['schema']
+        while '$ref' in schema:
+            schema = schemas[schema['$ref'].rsplit('/', 1)[-1]]
+        fields += [(name, name in schema.get('required', ()), field)
+                   for name, field in schema.get('properties', {}).items()]
+    problems = []
+    for name, required, schema in fields:
+        if name == 'sessionToken':
+            continue
+        values = params.get(name)
+        if not values or values[0] == '':
+            if required:
+                problems.append(f"Missing required field: {name}")
+            continue
+        value = values[0]
+        kind = schema.get('type', 'string')
+        try:
+            if kind == 'integer':
+                value = int(value)
+            elif kind == 'number':
+                value = float(value)
+                if not math.isfinite(value):
+                    raise ValueError
+        except ValueError:
+            problems.append(f"{name} must be a {kind}")
+            continue
+        if 'minimum' in schema and value < schema['minimum']:
+            problems.append(f"{name} is too small")
+        elif 'maximum' in schema and value > schema['maximum']:
+            problems.append(f"{name} is too large")
+        elif 'enum' in schema and value not in schema['enum']:
+            problems.append(f"{name} is not allowed")
+        else:
+            params[name] = [value]
+    return problems or None
+
+
+def make_params(method, target, body, count):
+    """count копий параметров с уже разобранным телом: проверка пишет в них значения"""
+    copies = []
+    for _ in range(count):
+        if method == 'GET':
+            params = RequestParams(parse_qs(urlsplit(target).query))
+        else:
+            params = RequestParams(body=body, content_type=FORM)
+        params.get('sessionToken')
+        copies.append(params)
+    return copies
+
+
+def per_call(function, arguments):
+    started = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - started) / len(arguments) * 1e9
+
+
+def per_repeat(function, requests):
+    started = time.perf_counter()
+    for _ in range(requests):
+        function()
+    return (time.perf_counter() - started) / requests * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=50000, help="повторов на замер")
+    args = parser.parse_args()
+
+    spec = build_swagger_spec(8000)
+    # Журнал доступа без фонового потока пишет синхронно и завысил бы время запроса
+    access_log.enabled = False
+    token = session_store.create('v_shutenko').token
+    chat_history.append(token, "hello", "user")
+    server = AsyncHTTPServer(('127.0.0.1', 0), AsyncAPIHandler)
+    server.stream_delay, server.stream_chunk_size = 0.0, 16
+    print(f"{'request':<12} {'compiled ns':>12} {'interp. ns':>11} {'request us':>11} {'share':>7}")
+    try:
+        for name, method, target, body in CASES:
+            target = target.format(token=token)
+            body = body.format(token=token).encode('utf-8')
+            path = urlsplit(target).path
+            route, _ = APIHandler.router.resolve(method, path)
+            compiled = per_call(route.validator, make_params(method, target, body, args.requests))
+            interpreted = per_call(lambda params: interpreted_validate(spec, method, path, params),
+                                   make_params(method, target, body, args.requests))
+            headers = http.client.parse_headers(io.BytesIO(
+                f"Host: localhost\r\nContent-Type: {FORM}\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1')))
+            request = ParsedRequest(method, target, 'HTTP/1.1', f"{method} {target} HTTP/1.1", headers, body)
+            handler = server._process(request, ('127.0.0.1', 0), 1)
+            if handler.status_code != 200:
+                raise AssertionError(f"{name}: status {handler.status_code}")
+            full = per_repeat(lambda: server._process(request, ('127.0.0.1', 0), 1), args.requests // 5 or 1)
+            print(f"{name:<12} {compiled:>12.0f} {interpreted:>11.0f} {full / 1000:>11.2f} "
+                  f"{compiled / full * 100:>6.1f}%")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
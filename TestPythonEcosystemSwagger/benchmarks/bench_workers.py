@@ -0,0 +1,87 @@
+"""Нагрузочный бенчмарк: пропускная способность сервера в зависимости от числа потоков.
+
+Для каждого значения --workers запускает main.py, открывает --slow-clients
+"медленных" соединений (отправляют заголовки по одному байту и не завершают
+запрос) и в течение --duration секунд гоняет GET /api/health из --clients потоков.
+
+Пример:
+    python benchmarks/bench_workers.py --mode pool --workers 1,2,4,8,16
+"""
+import argparse
+import http.client
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import free_port, start_server, stop_server
+
+
+def open_slow_clients(port, count):
+    """Соединения, которые начали запрос и "зависли" на середине заголовков"""
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(b"GET /api/health HTTP/1.1\r\nHost: localhost\r\n")
+        sockets.append(sock)
+    return sockets
+
+
+def run_clients(port, clients, duration, timeout):
+    """Запросы из нескольких потоков; возвращает (успешных, ошибок)"""
+    stop_at = time.monotonic() + duration
+    counters = [[0, 0] for _ in range(clients)]
+
+    def client(counter):
+        while time.monotonic() < stop_at:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            try:
+                connection.request('GET', '/api/health')
+                response = connection.getresponse()
+                response.read()
+                counter[0 if response.status == 200 else 1] += 1
+            except OSError:
+                counter[1] += 1
+            finally:
+                connection.close()
+
+    threads = [threading.Thread(target=client, args=(counter,)) for counter in counters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(c[0] for c in counters), sum(c[1] for c in counters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=['single', 'pool', 'prefork'], default='pool')
+    parser.add_argument('--workers', default='1,2,4,8,16', help="список размеров пула через запятую")
+    parser.add_argument('--processes', type=int, default=2, help="число процессов для prefork")
+    parser.add_argument('--queue-size', type=int, default=256)
+    parser.add_argument('--clients', type=int, default=16, help="число параллельных клиентов")
+    parser.add_argument('--slow-clients', type=int, default=4, help="число зависших соединений")
+    parser.add_argument('--duration', type=float, default=5.0, help="длительность замера, сек")
+    parser.add_argument('--timeout', type=float, default=2.0, help="таймаут запроса, сек")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'workers':>7} {'ok':>8} {'errors':>7} {'req/s':>10}")
+    for workers in [int(w) for w in args.workers.split(',')]:
+        port = free_port()
+        server = start_server(port, '--mode', args.mode, '--workers', str(workers),
+                              '--processes', str(args.processes),
+                              '--queue-size', str(args.queue_size))
+        slow = open_slow_clients(port, args.slow_clients)
+        try:
+            ok, errors = run_clients(port, args.clients, args.duration, args.timeout)
+        finally:
+            for sock in slow:
+                sock.close()
+            stop_server(server)
+        print(f"{args.mode:<8} {workers:>7} {ok:>8} {errors:>7} {ok / args.duration:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Общие функции для бенчмарков: запуск сервера в отдельном процессе"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+def free_port():
+    """Свободный TCP-порт на localhost"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    """Ожидание, пока сервер начнет принимать соединения"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Сервер не запустился на порту {port}")
+
+
+def start_server(port, *args):
+    """Запуск main.py с заданными параметрами; вывод сервера отбрасывается"""
+    process = subprocess.Popen(
+        [sys.executable, MAIN_PY, '--port', str(port), '--no-browser', *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def stop_server(process):
+    """Остановка сервера, запущенного через start_server"""
+    # SIGINT, как Ctrl+C: в режиме prefork родитель сам завершает дочерние процессы
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
@@ -0,0 +1,689 @@
+"""Контрактный фаззер: запросы по /swagger.json сервера и проверка ответов по схемам.
+
+Спецификация берется у запущенного сервера. Для каждой операции
+генерируются запросы из схем ее параметров и тела:
+- корректные: только обязательные поля, все поля, границы minimum/maximum,
+  каждое значение enum, тело формой и объектом JSON;
+- нарушающие: значение за границей (min - 1, max + 1), не число вместо
+  integer/number, значение вне enum, пропуск обязательного поля, пропуск или
+  чужой sessionToken (если операция объявляет 401);
+- на прочность: большие строки (--large-string байт и тело больше предела
+  сервера), числа в 5000 цифр, JSON-значения не того типа (true, список, объект);
+- случайные сочетания корректных и некорректных значений, пока не закончится
+  --duration или --requests.
+
+Запросы идут параллельно по --concurrency соединениям keep-alive. Ответ
+нарушает контракт, если:
+- статус 5xx;
+- статус не объявлен у операции (кроме 413, 415 и 429, общих для сервера);
+- корректный запрос отвергнут проверкой параметров (400 с details);
+- нарушающий запрос принят (статус ниже 400);
+- тело JSON не соответствует схеме объявленного ответа.
+
+Каждое найденное нарушение (операция и вид) уменьшается до минимального
+воспроизводящего запроса: поля по одному убираются, строки укорачиваются,
+числа упрощаются, пока нарушение повторяется. Итог - таблица по операциям
+и команды curl для воспроизведения; код выхода 1, если нарушения есть.
+
+Примеры:
+    python benchmarks/contract_fuzz.py --base-url http://localhost:8000
+    python benchmarks/contract_fuzz.py --spawn pool --concurrency 32 --duration 30 --output fuzz.json
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import queue
+import random
+import re
+import shlex
+import sys
+import threading
+import time
+from urllib.parse import quote, urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import free_port, start_server, stop_server
+from users import DEFAULT_USER
+from validation import FORM, JSON, operation_fields
+
+# Статусы, которые сервер может вернуть на любой запрос: тело больше предела,
+# неизвестный Content-Type, ограничение частоты
+GLOBAL_STATUSES = frozenset((413, 415, 429))
+# Тело больше этого размера заведомо больше предела сервера по умолчанию (1 МБ)
+OVERSIZED_BODY = 1024 * 1024 + 1
+# Значения вместо integer/number; те, что допустимы для number, отсеивает conforms
+NOT_NUMBERS = ('abc', '1.5', '0x10', '1e400', 'nan', '--1', ' 7', '1_000', '٣')
+INTEGER = re.compile(r'[+-]?[0-9]+\Z')
+NUMBER = re.compile(r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?\Z')
+BOOLEANS = frozenset(('true', 'false', '1', '0'))
+# Длина числа больше предела int() из строки (sys.get_int_max_str_digits)
+HUGE_NUMBER_DIGITS = 5000
+# Значения JSON не того типа
+WRONG_JSON_TYPES = (True, [1, 2], {'nested': 1}, 1.5)
+
+VALID, INVALID, ANY = 'valid', 'invalid', 'any'
+
+
+class Case:
+    """Один запрос фаззера.
+
+    fields - {имя: (где передается, значение)}; значение None - поле пропущено.
+    expect - valid (запрос корректен по спецификации), invalid (нарушает ее)
+    или any (проверяются только 5xx, статус и схема ответа).
+    """
+
+    __slots__ = ('operation', 'fields', 'encoding', 'expect', 'label')
+
+    def __init__(self, operation, fields, encoding, expect, label):
+        self.operation = operation
+        self.fields = fields
+        self.encoding = encoding
+        self.expect = expect
+        self.label = label
+
+    def replace(self, **changes):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Case(**values)
+
+    def render(self, token):
+        """(метод, путь с query, заголовки, тело); значение TOKEN заменяется токеном сессии"""
+        operation = self.operation
+        path = operation.path
+        query = {}
+        body = {}
+        for name, (location, value) in self.fields.items():
+            if value is None:
+                continue
+            if value is TOKEN:
+                value = token
+            if location == 'path':
+                path = path.replace('{' + name + '}', quote(_form_value(value), safe=''))
+            elif location == 'query':
+                query[name] = _form_value(value)
+            else:
+                body[name] = value
+        if query:
+            path += '?' + urlencode(query)
+        headers = {}
+        data = None
+        if operation.method != 'GET' and (body or operation.has_body):
+            if self.encoding == 'json':
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                headers['Content-Type'] = JSON
+            else:
+                data = urlencode({name: _form_value(value) for name, value in body.items()}).encode('ascii')
+                headers['Content-Type'] = FORM
+        return operation.method, path, headers, data
+
+    def curl(self, base_url, token):
+        method, path, headers, data = self.render(token)
+        command = ['curl', '-i', '-X', method, base_url + path]
+        for name, value in headers.items():
+            command += ['-H', f"{name}: {value}"]
+        if data is not None:
+            text = data.decode('utf-8')
+            command += ['--data-binary', text if len(text) <= 200 else f"<{len(text)} bytes>"]
+        return ' '.join(shlex.quote(part) for part in command)
+
+
+class _Token:
+    def __repr__(self):
+        return 'TOKEN'
+
+
+# Метка места, куда подставляется действующий sessionToken
+TOKEN = _Token()
+
+
+def _form_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+class Operation:
+    """Операция спецификации и ее поля"""
+
+    def __init__(self, method, path, spec_operation, components):
+        self.method = method
+        self.path = path
+        self.key = f"{method} {path}"
+        self.spec = spec_operation
+        self.responses = spec_operation.get('responses', {})
+        self.fields = operation_fields(spec_operation, components)
+        self.has_body = 'requestBody' in spec_operation
+        self.needs_session = any(name == 'sessionToken' for name, *_ in self.fields)
+        # Выход завершает сессию: каждый такой запрос получает свой токен
+        self.consumes_session = path.rstrip('/').endswith('/logout')
+
+
+def valid_value(schema, rng, large=0):
+    """Значение, которое схема допускает; large - длина строки вместо короткой"""
+    kind = schema.get('type', 'string')
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+    if kind in ('integer', 'number'):
+        # У нижней границы: maximum проверяется отдельным запросом, а большие
+        # значения вроде tokenDelayMs растягивают запрос на минуты
+        low = schema.get('minimum', 0)
+        high = min(schema.get('maximum', math.inf), low + 10)
+        return rng.randint(low, int(high)) if kind == 'integer' else round(rng.uniform(low, high), 3)
+    if kind == 'boolean':
+        return rng.choice((True, False))
+    if large:
+        length = min(large, schema.get('maxLength', large))
+    else:
+        length = rng.randint(schema.get('minLength', 1), min(12, schema.get('maxLength', 12)))
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz ЖЯ😀') for _ in range(max(1, length)))
+
+
+def conforms(value, schema):
+    """Допускает ли схема значение в том виде, в каком оно уйдет в запросе"""
+    text = _form_value(value)
+    kind = schema.get('type', 'string')
+    if kind in ('integer', 'number'):
+        if not (INTEGER if kind == 'integer' else NUMBER).match(text):
+            return False
+        if len(text) > HUGE_NUMBER_DIGITS // 2:
+            return 'maximum' not in schema
+        number = int(text) if kind == 'integer' else float(text)
+        if not math.isfinite(number):
+            return False
+        return schema.get('minimum', -math.inf) <= number <= schema.get('maximum', math.inf)
+    if kind == 'boolean':
+        return text.lower() in BOOLEANS
+    if 'enum' in schema and text not in schema['enum']:
+        return False
+    if not schema.get('minLength', 0) <= len(text) <= schema.get('maxLength', math.inf):
+        return False
+    return 'pattern' not in schema or re.search(schema['pattern'], text) is not None
+
+
+def classify(operation, fields):
+    """VALID или INVALID для набора полей по схемам операции"""
+    for name, location, required, schema in operation.fields:
+        value = fields.get(name, (location, None))[1]
+        if name == 'sessionToken':
+            # Без 401 в ответах сессия для операции необязательна (как у выхода)
+            if value is not TOKEN and required and '401' in operation.responses:
+                return INVALID
+            continue
+        if value is None or value == '':
+            if required:
+                return INVALID
+        elif not conforms(value, schema):
+            return INVALID
+    return VALID
+
+
+def invalid_values(schema):
+    """[(значение, метка)] значений, которые схема не допускает"""
+    kind = schema.get('type', 'string')
+    values = []
+    if kind in ('integer', 'number'):
+        if 'minimum' in schema:
+            values.append((schema['minimum'] - 1, 'below minimum'))
+        if 'maximum' in schema:
+            values.append((schema['maximum'] + 1, 'above maximum'))
+        values += [(value, f"not a{'n integer' if kind == 'integer' else ' number'} {value!r}")
+                   for value in NOT_NUMBERS]
+    elif kind == 'boolean':
+        values.append(('maybe', 'not a boolean'))
+    if 'enum' in schema:
+        values.append(('not-in-enum', 'outside enum'))
+    if 'maxLength' in schema:
+        values.append(('x' * (schema['maxLength'] + 1), 'longer than maxLength'))
+    return [(value, label) for value, label in values if not conforms(value, schema)]
+
+
+def generate_cases(operation, rng, large_string):
+    """Детерминированный набор запросов операции"""
+    cases = []
+
+    def add(fields, label, encoding='form', robustness=False):
+        expect = ANY if robustness else classify(operation, fields)
+        cases.append(Case(operation, fields, encoding, expect, label))
+
+    base = {}
+    for name, location, required, schema in operation.fields:
+        if name == 'sessionToken':
+            base[name] = (location, TOKEN)
+        elif required:
+            base[name] = (location, valid_value(schema, rng))
+    add(base, 'required fields only')
+    full = dict(base)
+    for name, location, required, schema in operation.fields:
+        if name not in full:
+            full[name] = (location, valid_value(schema, rng))
+    add(full, 'all fields')
+    if operation.has_body:
+        add(full, 'all fields as JSON', 'json')
+
+    for name, location, required, schema in operation.fields:
+        if name == 'sessionToken':
+            if required and '401' in operation.responses:
+                add({**base, name: (location, None)}, 'no sessionToken')
+                add({**base, name: (location, 'not-a-session')}, 'unknown sessionToken')
+            continue
+        for bound in ('minimum', 'maximum'):
+            if bound in schema:
+                add({**base, name: (location, schema[bound])}, f"{name} = {bound}")
+        for value in schema.get('enum', ()):
+            add({**base, name: (location, value)}, f"{name} = {value}")
+        for value, label in invalid_values(schema):
+            add({**base, name: (location, value)}, f"{name}: {label}")
+        if required:
+            add({**base, name: (location, None)}, f"no {name}")
+            add({**base, name: (location, '')}, f"empty {name}")
+        if schema.get('type', 'string') == 'string' and 'enum' not in schema and location != 'path':
+            add({**base, name: (location, valid_value(schema, rng, large_string))},
+                f"{name}: {large_string} byte string")
+            if location == 'body':
+                add({**base, name: (location, 'x' * OVERSIZED_BODY)}, f"{name}: body over 1 MB", robustness=True)
+        if schema.get('type') in ('integer', 'number'):
+            add({**base, name: (location, '9' * HUGE_NUMBER_DIGITS)}, f"{name}: {HUGE_NUMBER_DIGITS} digits",
+                robustness=True)
+        if location == 'body':
+            for value in WRONG_JSON_TYPES:
+                add({**base, name: (location, value)}, f"{name}: JSON {type(value).__name__}", 'json',
+                    robustness=True)
+    return cases
+
+
+def random_case(operation, rng, large_string):
+    """Случайное сочетание корректных и некорректных значений полей"""
+    fields = {}
+    for name, location, required, schema in operation.fields:
+        roll = rng.random()
+        if name == 'sessionToken':
+            value = TOKEN
+        elif roll < 0.1:
+            value = None
+        elif roll < 0.35 and invalid_values(schema):
+            value = rng.choice(invalid_values(schema))[0]
+        elif not required and roll < 0.6:
+            value = None
+        else:
+            value = valid_value(schema, rng, large_string if rng.random() < 0.01 else 0)
+        fields[name] = (location, value)
+    encoding = 'json' if operation.has_body and rng.random() < 0.3 else 'form'
+    return Case(operation, fields, encoding, classify(operation, fields), 'random')
+
+
+def schema_errors(value, schema, components, where='$'):
+    """Несоответствия значения JSON схеме ответа (подмножество OpenAPI 3.0)"""
+    while '$ref' in schema:
+        schema = components[schema['$ref'].rsplit('/', 1)[-1]]
+    if value is None:
+        return [] if schema.get('nullable') or not schema else [f"{where} is null"]
+    kind = schema.get('type')
+    checks = {
+        'object': lambda v: isinstance(v, dict),
+        'array': lambda v: isinstance(v, list),
+        'string': lambda v: isinstance(v, str),
+        'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+        'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        'boolean': lambda v: isinstance(v, bool),
+    }
+    if kind in checks and not checks[kind](value):
+        return [f"{where} is {type(value).__name__}, expected {kind}"]
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f"{where} = {value!r} is outside enum")
+    if isinstance(value, dict):
+        for name in schema.get('required', ()):
+            if name not in value:
+                errors.append(f"{where}.{name} is missing")
+        for name, field_schema in schema.get('properties', {}).items():
+            if name in value:
+                errors += schema_errors(value[name], field_schema, components, f"{where}.{name}")
+    elif isinstance(value, list) and 'items' in schema:
+        for index, item in enumerate(value[:50]):
+            errors += schema_errors(item, schema['items'], components, f"{where}[{index}]")
+    return errors
+
+
+def violations(case, status, content_type, data, components):
+    """[(вид, подробности)] нарушений контракта в ответе на case"""
+    operation = case.operation
+    found = []
+    if status >= 500:
+        found.append(('server error', f"status {status}"))
+    declared = operation.responses.get(str(status)) or operation.responses.get('default')
+    if declared is None and status not in GLOBAL_STATUSES:
+        found.append(('undeclared status', f"status {status} is not in the spec"))
+    body = None
+    if content_type.startswith(JSON):
+        try:
+            body = json.loads(data)
+        except ValueError:
+            found.append(('invalid JSON', data[:100].decode('utf-8', 'replace')))
+    if case.expect == VALID and status == 400 and isinstance(body, dict) and 'details' in body:
+        found.append(('valid request rejected', body.get('error', '')))
+    if case.expect == INVALID and status < 400:
+        found.append(('invalid request accepted', f"status {status}"))
+    if declared is not None and body is not None:
+        schema = declared.get('content', {}).get(JSON, {}).get('schema')
+        if schema is not None:
+            errors = schema_errors(body, schema, components)
+            if errors:
+                found.append(('response schema mismatch', '; '.join(errors[:3])))
+    return found
+
+
+class Client:
+    """Соединение keep-alive со своей сессией"""
+
+    def __init__(self, host, port, timeout, credentials):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.credentials = credentials
+        self.connection = None
+        self.token = None
+
+    def send(self, case):
+        """(статус, Content-Type, тело) ответа; ConnectionError, если сервер не ответил"""
+        if case.operation.needs_session and (self.token is None or case.operation.consumes_session):
+            self.token = self.login()
+        method, path, headers, data = case.render(self.token)
+        while True:
+            reused = self.connection is not None
+            if not reused:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                try:
+                    self.connection.request(method, path, body=data, headers=headers)
+                except (BrokenPipeError, ConnectionResetError):
+                    # На слишком большое тело сервер отвечает 413 и закрывает
+                    # соединение, не дочитав его: ответ уже в сокете
+                    pass
+                response = self.connection.getresponse()
+                body = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                # Сервер закрыл простаивавшее соединение (--idle-timeout) -
+                # запрос повторяется на новом, как у обычного клиента
+                if reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError)):
+                    continue
+                raise ConnectionError(f"{type(e).__name__}: {e}") from None
+        if response.will_close:
+            self.close()
+        if case.operation.consumes_session:
+            self.token = None
+        return response.status, response.getheader('Content-Type', ''), body
+
+    def login(self):
+        login, password = self.credentials
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request('POST', '/api/auth/login', body=urlencode({'Login': login, 'Password': password}),
+                               headers={'Content-Type': FORM})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            raise ConnectionError(f"login: {type(e).__name__}: {e}") from None
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise ConnectionError(f"login as {login} failed: {response.status} {data[:200]!r}")
+        return json.loads(data)['sessionToken']
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class Fuzzer:
+    def __init__(self, base_url, spec, credentials, concurrency, timeout):
+        self.base_url = base_url.rstrip('/')
+        url = urlsplit(self.base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.components = spec.get('components', {}).get('schemas', {})
+        self.operations = [Operation(method.upper(), path, operation, self.components)
+                           for path, operations in spec.get('paths', {}).items()
+                           for method, operation in operations.items()]
+        self.credentials = credentials
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.failures = {}
+
+    def client(self):
+        return Client(self.host, self.port, self.timeout, self.credentials)
+
+    def run(self, cases, extra, deadline, max_requests):
+        """Отправка cases, затем случайных запросов extra() до deadline или max_requests"""
+        pending = queue.Queue()
+        for case in cases:
+            pending.put(case)
+        counter = [len(cases)]
+
+        def next_case():
+            try:
+                return pending.get_nowait()
+            except queue.Empty:
+                pass
+            if extra is None:
+                return None
+            with self.lock:
+                if (deadline and time.monotonic() >= deadline) or (max_requests and counter[0] >= max_requests):
+                    return None
+                counter[0] += 1
+            return extra()
+
+        def worker():
+            client = self.client()
+            try:
+                while True:
+                    case = next_case()
+                    if case is None:
+                        return
+                    self.check(client, case)
+            finally:
+                client.close()
+
+        threads = [threading.Thread(target=worker, name=f"fuzz-{i}") for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def check(self, client, case):
+        try:
+            status, content_type, data = client.send(case)
+            found = violations(case, status, content_type, data, self.components)
+        except ConnectionError as e:
+            status, found = None, [('connection error', str(e))]
+        with self.lock:
+            key = case.operation.key
+            self.sent[key] = self.sent.get(key, 0) + 1
+            for kind, detail in found:
+                # Первый пример каждого вида нарушения по операции; остальные считаются
+                entry = self.failures.setdefault((key, kind), {'count': 0, 'case': case, 'status': status,
+                                                               'detail': detail})
+                entry['count'] += 1
+
+    def reproduces(self, client, case, kind):
+        try:
+            status, content_type, data = client.send(case)
+        except ConnectionError:
+            return kind == 'connection error'
+        return any(found == kind for found, _ in violations(case, status, content_type, data, self.components))
+
+    def minimize(self, case, kind, budget):
+        """Наименьший запрос, на котором нарушение kind повторяется"""
+        client = self.client()
+        attempts = 0
+        try:
+            changed = True
+            while changed and attempts < budget:
+                changed = False
+                for candidate in shrink_candidates(case):
+                    if case.expect != ANY:
+                        # Уменьшенный запрос должен остаться таким же по спецификации
+                        candidate.expect = classify(candidate.operation, candidate.fields)
+                        if candidate.expect != case.expect:
+                            continue
+                    attempts += 1
+                    if self.reproduces(client, candidate, kind):
+                        case, changed = candidate, True
+                        break
+                    if attempts >= budget:
+                        break
+        finally:
+            client.close()
+        return case, attempts
+
+
+def shrink_candidates(case):
+    """Упрощения запроса: без поля, короче строка, проще число, тело формой"""
+    fields = case.fields
+    for name, (location, value) in fields.items():
+        if value is not None and value is not TOKEN and location != 'path':
+            yield case.replace(fields={**fields, name: (location, None)})
+    if case.encoding == 'json':
+        yield case.replace(encoding='form')
+    for name, (location, value) in fields.items():
+        if isinstance(value, str) and len(value) > 1:
+            yield case.replace(fields={**fields, name: (location, value[:len(value) // 2])})
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and value not in (0, 1):
+            simpler = int(value / 2) if abs(value) > 1 else 0
+            if simpler != value:
+                yield case.replace(fields={**fields, name: (location, simpler)})
+        elif isinstance(value, (list, dict)) and len(value) > 1:
+            yield case.replace(fields={**fields, name: (location, value[:1] if isinstance(value, list)
+                                                        else dict(list(value.items())[:1]))})
+
+
+def fetch_spec(base_url, timeout):
+    url = urlsplit(base_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    try:
+        connection.request('GET', '/swagger.json')
+        response = connection.getresponse()
+        if response.status != 200:
+            raise SystemExit(f"/swagger.json: status {response.status}")
+        return json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def fuzz(args, base_url):
+    spec = fetch_spec(base_url, args.timeout)
+    rng = random.Random(args.seed)
+    credentials = (args.login, args.password)
+    fuzzer = Fuzzer(base_url, spec, credentials, args.concurrency, args.timeout)
+    operations = [op for op in fuzzer.operations if not args.exclude or args.exclude not in op.key]
+    cases = [case for operation in operations for case in generate_cases(operation, rng, args.large_string)]
+    lock = threading.Lock()
+
+    def extra():
+        with lock:
+            return random_case(rng.choice(operations), rng, args.large_string)
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + args.duration if args.duration else None
+    fuzzer.run(cases, extra if (args.duration or args.requests) else None, deadline, args.requests)
+    elapsed = time.perf_counter() - started
+
+    failures = []
+    for (key, kind), entry in sorted(fuzzer.failures.items()):
+        case, attempts = fuzzer.minimize(entry['case'], kind, args.max_shrink)
+        failures.append({
+            'operation': key,
+            'kind': kind,
+            'count': entry['count'],
+            'status': entry['status'],
+            'detail': entry['detail'],
+            'case': entry['case'].label,
+            'minimized': case.curl(base_url, '$TOKEN'),
+            'fields': {name: _form_value(value) if value is not TOKEN else '$TOKEN'
+                       for name, (_, value) in case.fields.items() if value is not None},
+            'shrinkAttempts': attempts,
+        })
+    total = sum(fuzzer.sent.values())
+    return {
+        'meta': {
+            'baseUrl': base_url,
+            'operations': len(operations),
+            'generatedCases': len(cases),
+            'requests': total,
+            'elapsedSec': round(elapsed, 3),
+            'requestsPerSec': round(total / elapsed, 1) if elapsed else 0.0,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'sent': dict(sorted(fuzzer.sent.items())),
+        'failures': failures,
+    }
+
+
+def print_report(results):
+    meta = results['meta']
+    print(f"{meta['baseUrl']}  operations={meta['operations']}  requests={meta['requests']}  "
+          f"elapsed={meta['elapsedSec']}s  req/s={meta['requestsPerSec']}  seed={meta['seed']}")
+    failed = {}
+    for failure in results['failures']:
+        failed[failure['operation']] = failed.get(failure['operation'], 0) + failure['count']
+    print(f"{'operation':<44} {'sent':>7} {'failed':>7}")
+    for key, count in results['sent'].items():
+        print(f"{key[:44]:<44} {count:>7} {failed.get(key, 0):>7}")
+    for failure in results['failures']:
+        print(f"\n[{failure['kind']}] {failure['operation']} x{failure['count']}: {failure['detail']}")
+        print(f"  first seen: {failure['case']}; minimized ({failure['shrinkAttempts']} tries):")
+        print(f"  {failure['minimized']}")
+    print(f"\n{len(results['failures'])} contract violation(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:8000', help="адрес проверяемого сервера")
+    parser.add_argument('--spawn', metavar='MODE', default=None,
+                        help="запустить main.py в режиме MODE на свободном порту вместо --base-url")
+    parser.add_argument('--server-args', default='', help="дополнительные параметры main.py для --spawn")
+    parser.add_argument('--concurrency', type=int, default=16, help="число соединений")
+    parser.add_argument('--duration', type=float, default=0,
+                        help="после набора запросов по схемам слать случайные запросы столько секунд")
+    parser.add_argument('--requests', type=int, default=0, help="или до стольких запросов всего")
+    parser.add_argument('--seed', type=int, default=1, help="зерно генератора значений")
+    parser.add_argument('--large-string', type=int, default=64 * 1024, help="длина больших строк, байт")
+    parser.add_argument('--exclude', default=None, help="пропустить операции, содержащие подстроку")
+    parser.add_argument('--max-shrink', type=int, default=200, help="попыток уменьшения на нарушение")
+    parser.add_argument('--login', default=DEFAULT_USER['login'], help="пользователь для sessionToken")
+    parser.add_argument('--password', default=DEFAULT_USER['password'])
+    parser.add_argument('--timeout', type=float, default=10.0, help="таймаут запроса, сек")
+    parser.add_argument('--output', help="файл для результатов в JSON")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.spawn:
+        port = free_port()
+        server = start_server(port, '--mode', args.spawn, *shlex.split(args.server_args))
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        results = fuzz(args, base_url)
+    finally:
+        if server is not None:
+            stop_server(server)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if results['failures']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
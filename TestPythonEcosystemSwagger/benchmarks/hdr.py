@@ -0,0 +1,84 @@
+"""Гистограмма задержек с заданной относительной точностью (по схеме HdrHistogram).
+
+Значения - целые числа (микросекунды) от 1 до highest. Диапазон делится на
+корзины-степени двойки, каждая корзина - на 2^k равных подкорзин, где 2^k
+не меньше 2 * 10^significant_digits. Поэтому любое значение хранится с
+относительной ошибкой не более 10^-significant_digits (0.1% при трех знаках),
+а память не зависит от числа записей. Гистограммы складываются (merge),
+так что каждый поток нагрузки пишет в свою без блокировок.
+"""
+import math
+
+
+class HdrHistogram:
+    def __init__(self, highest=3600 * 1000 * 1000, significant_digits=3):
+        if not 1 <= significant_digits <= 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        self.highest = highest
+        self.significant_digits = significant_digits
+        largest_single_unit = 2 * 10 ** significant_digits
+        self._sub_bucket_magnitude = max(1, math.ceil(math.log2(largest_single_unit)))
+        self._sub_bucket_count = 1 << self._sub_bucket_magnitude
+        self._half_magnitude = self._sub_bucket_magnitude - 1
+        self._half_count = self._sub_bucket_count // 2
+        self._sub_bucket_mask = self._sub_bucket_count - 1
+        buckets = 1
+        smallest_untrackable = self._sub_bucket_count
+        while smallest_untrackable <= highest:
+            smallest_untrackable <<= 1
+            buckets += 1
+        self.counts = [0] * ((buckets + 1) * self._half_count)
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def _index(self, value):
+        bucket = (value | self._sub_bucket_mask).bit_length() - self._sub_bucket_magnitude
+        sub_bucket = value >> bucket
+        return ((bucket + 1) << self._half_magnitude) + sub_bucket - self._half_count
+
+    def _highest_equivalent(self, index):
+        bucket = (index >> self._half_magnitude) - 1
+        sub_bucket = (index & (self._half_count - 1)) + self._half_count
+        if bucket < 0:
+            sub_bucket -= self._half_count
+            bucket = 0
+        return ((sub_bucket + 1) << bucket) - 1
+
+    def record(self, value, count=1):
+        value = min(max(int(value), 0), self.highest)
+        self.counts[self._index(value)] += count
+        self.total += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if len(other.counts) != len(self.counts) or other.significant_digits != self.significant_digits:
+            raise ValueError("histograms have different layouts")
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Значение, не меньше которого percent процентов записей (с точностью гистограммы)"""
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(percent / 100 * self.total))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0.0
@@ -0,0 +1,397 @@
+"""Нагрузочный генератор: воспроизведение коллекций Postman против сервера.
+
+Каждый из --concurrency виртуальных пользователей держит свое keep-alive
+соединение, сначала выполняет запрос входа (запрос коллекции, тест-скрипт
+которого сохраняет sessionToken) и затем по кругу выполняет остальные
+запросы коллекций, подставляя полученный токен. Выход (logout) по умолчанию
+пропускается, с --logout он завершает каждый круг, а следующий круг
+начинается с нового входа. С --json-bodies тела форм отправляются как JSON.
+С --credentials (CSV login,password, создается python users.py) виртуальный
+пользователь i входит под i-й учетной записью файла (по кругу), а не под
+логином из коллекции. С --answer-length N запросы /api/chat/send просят
+ответ генератора из N символов: так проверяется клиент на больших телах.
+
+Без --rate пользователи шлют запросы без пауз (замкнутая модель). С --rate
+запросы стартуют по расписанию с общей частотой rate в секунду, и задержка
+считается от запланированного времени старта, а не от фактического: так
+очереди на стороне клиента не прячут медленные ответы (coordinated omission).
+
+Задержки пишутся в гистограммы HdrHistogram с точностью 3 значащих знака;
+итог - пропускная способность (запросы и МБ тел ответов в секунду) и
+p50/p95/p99/p99.9 по каждому запросу и в целом, в консоль и в JSON (--output). С --compare результаты сравниваются
+с прежним JSON, и при ухудшении больше --max-regression процентов
+команда завершается с кодом 1.
+
+Примеры:
+    python benchmarks/loadgen.py --base-url http://localhost:8000 --concurrency 16 --duration 30
+    python benchmarks/loadgen.py --spawn pool --rate 500 --duration 20 --output results.json
+    python benchmarks/loadgen.py --spawn asyncio --compare results.json --max-regression 10
+    python benchmarks/loadgen.py --spawn pool --server-args "--users-file users.json" --credentials credentials.csv
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import free_port, start_server, stop_server
+from hdr import HdrHistogram
+from postman import PostmanCollection
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_COLLECTIONS = [
+    os.path.join(PROJECT_DIR, 'EcosystemTestAPI.postman_collection.json'),
+    os.path.join(os.path.dirname(PROJECT_DIR), '🔐 AI Ecosystem Test API.postman_collection.json'),
+]
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+class Scenario:
+    """Порядок запросов одного виртуального пользователя"""
+
+    def __init__(self, collections, include_logout=False, json_bodies=False, answer_length=0):
+        self.json_bodies = json_bodies
+        self.variables = {}
+        self.login = None
+        self.logout = None
+        self.requests = []
+        for collection in collections:
+            for name, value in collection.variables.items():
+                self.variables.setdefault(name, value)
+            for request in collection.requests:
+                if request.captures:
+                    # Вход берется из первой коллекции, в которой он есть
+                    self.login = self.login or request
+                elif request.path.rstrip('/').endswith('/logout'):
+                    self.logout = self.logout or request
+                elif answer_length and request.path.rstrip('/').endswith('/chat/send'):
+                    # Ответ генератора заданной длины вместо короткого ответа по правилам
+                    self.requests.append(request.with_fields({'length': str(answer_length)}))
+                else:
+                    self.requests.append(request)
+        if include_logout and self.logout is not None:
+            self.requests.append(self.logout)
+        self.include_logout = include_logout and self.logout is not None
+
+
+class Pacer:
+    """Общий для пользователей счетчик запросов и расписание при заданной частоте"""
+
+    def __init__(self, rate, duration, max_requests, warmup):
+        self.rate = rate
+        self.max_requests = max_requests
+        self.started = time.perf_counter()
+        self.measure_from = self.started + warmup
+        self.deadline = self.started + warmup + duration if duration else None
+        self._issued = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        """Момент, когда запрос должен стартовать, или None, если нагрузка закончена"""
+        with self._lock:
+            if self.max_requests and self._issued >= self.max_requests:
+                return None
+            number = self._issued
+            self._issued += 1
+        if self.rate:
+            intended = self.started + number / self.rate
+        else:
+            intended = time.perf_counter()
+        if self.deadline is not None and intended >= self.deadline:
+            return None
+        return intended
+
+
+class RequestStats:
+    """Статистика одного запроса в одном потоке"""
+
+    __slots__ = ('histogram', 'statuses', 'errors', 'received')
+
+    def __init__(self):
+        self.histogram = HdrHistogram()
+        self.statuses = {}
+        self.errors = 0
+        # Байт тел ответов
+        self.received = 0
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.errors += other.errors
+        self.received += other.received
+
+    def summary(self, elapsed):
+        histogram = self.histogram
+        result = {
+            'count': histogram.total,
+            'errors': self.errors,
+            'statuses': {str(s): c for s, c in sorted(self.statuses.items())},
+            'throughput': round(histogram.total / elapsed, 2) if elapsed else 0.0,
+            'receivedBytes': self.received,
+            'receivedMBps': round(self.received / elapsed / 1e6, 3) if elapsed else 0.0,
+            'latencyMs': {
+                'min': (histogram.min or 0) / 1000,
+                'mean': round(histogram.mean() / 1000, 3),
+                'max': histogram.max / 1000,
+            },
+        }
+        for percent in PERCENTILES:
+            result['latencyMs'][f"p{percent:g}"] = histogram.percentile(percent) / 1000
+        return result
+
+
+class VirtualUser:
+    """Пользователь со своим соединением, сессией и статистикой"""
+
+    def __init__(self, scenario, host, port, timeout, pacer, credentials=None):
+        self.scenario = scenario
+        self.login = scenario.login
+        if credentials is not None and self.login is not None:
+            login, password = credentials
+            self.login = self.login.with_fields({'Login': login, 'Password': password})
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.pacer = pacer
+        self.variables = dict(scenario.variables)
+        self.stats = {}
+        self.connection = None
+
+    def run(self):
+        logged_in = False
+        position = 0
+        try:
+            while True:
+                if self.login is not None and not logged_in:
+                    request = self.login
+                else:
+                    request = self.scenario.requests[position]
+                    position = (position + 1) % len(self.scenario.requests)
+                intended = self.pacer.next()
+                if intended is None:
+                    return
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                ok, body = self._execute(request, intended)
+                if request is self.login:
+                    logged_in = ok
+                    self.variables.update(request.capture(body) if ok else {})
+                elif request is self.scenario.logout and self.scenario.include_logout:
+                    logged_in = False
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+
+    def _execute(self, request, intended):
+        method, target, headers, body = request.render(self.variables, self.scenario.json_bodies)
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.connection.request(method, target, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            if started >= self.pacer.measure_from:
+                self._stats(method, target).errors += 1
+            return False, b''
+        finished = time.perf_counter()
+        if started >= self.pacer.measure_from:
+            stats = self._stats(method, target)
+            # С заданной частотой задержка считается от запланированного старта
+            since = intended if self.pacer.rate else started
+            stats.histogram.record((finished - since) * 1000000)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.received += len(data)
+        return 200 <= status < 300, data
+
+
+    def _stats(self, method, target):
+        key = f"{method} {target.split('?', 1)[0]}"
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = RequestStats()
+        return stats
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def load_credentials(path):
+    """[(login, password)] из CSV; строка заголовка login,password пропускается"""
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = [row[:2] for row in csv.reader(f) if len(row) >= 2]
+    if rows and rows[0] == ['login', 'password']:
+        rows = rows[1:]
+    if not rows:
+        sys.exit(f"В {path} нет учетных записей")
+    return rows
+
+
+def run_load(args, base_url):
+    collections = [PostmanCollection.load(path) for path in args.collections]
+    scenario = Scenario(collections, include_logout=args.logout, json_bodies=args.json_bodies,
+                        answer_length=args.answer_length)
+    if not scenario.requests:
+        sys.exit("В коллекциях нет запросов для нагрузки")
+    url = urlsplit(base_url)
+    scenario.variables['baseUrl'] = base_url.rstrip('/')
+
+    credentials = load_credentials(args.credentials) if args.credentials else None
+
+    pacer = Pacer(args.rate, args.duration, args.requests, args.warmup)
+    users = [VirtualUser(scenario, url.hostname, url.port or 80, args.timeout, pacer,
+                         credentials[i % len(credentials)] if credentials else None)
+             for i in range(args.concurrency)]
+    threads = [threading.Thread(target=user.run, name=f"vu-{i}") for i, user in enumerate(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - max(pacer.measure_from, pacer.started)
+
+    total = RequestStats()
+    per_request = {}
+    for user in users:
+        for key, stats in user.stats.items():
+            per_request.setdefault(key, RequestStats()).merge(stats)
+            total.merge(stats)
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'baseUrl': base_url,
+            'collections': [c.name for c in collections],
+            'concurrency': args.concurrency,
+            'rate': args.rate,
+            'bodies': 'json' if args.json_bodies else 'collection',
+            'accounts': min(len(credentials), args.concurrency) if credentials else 1,
+            'answerLength': args.answer_length,
+            'latencyFrom': 'intended start' if args.rate else 'send',
+            'elapsedSec': round(elapsed, 3),
+        },
+        'total': total.summary(elapsed),
+        'requests': {key: stats.summary(elapsed) for key, stats in sorted(per_request.items())},
+    }
+
+
+def print_report(results):
+    meta = results['meta']
+    print(f"{meta['baseUrl']}  concurrency={meta['concurrency']}  rate={meta['rate'] or 'max'}  "
+          f"elapsed={meta['elapsedSec']}s  revision={meta['revision']}")
+    print_table(results)
+
+
+def print_table(results):
+    """Таблица задержек по запросам и в целом"""
+    header = f"{'request':<36} {'count':>8} {'err':>5} {'non2xx':>6} {'req/s':>9} {'MB/s':>8}"
+    header += ''.join(f" {f'p{p:g}':>8}" for p in PERCENTILES) + f" {'max':>8}"
+    print(header)
+    rows = list(results['requests'].items()) + [('TOTAL', results['total'])]
+    for key, summary in rows:
+        non2xx = sum(c for s, c in summary['statuses'].items() if not s.startswith('2'))
+        line = f"{key[:36]:<36} {summary['count']:>8} {summary['errors']:>5} {non2xx:>6} {summary['throughput']:>9.1f}"
+        line += f" {summary.get('receivedMBps', 0.0):>8.2f}"
+        line += ''.join(f" {summary['latencyMs'][f'p{p:g}']:>8.2f}" for p in PERCENTILES)
+        print(line + f" {summary['latencyMs']['max']:>8.2f}")
+
+
+def compare(results, baseline, max_regression):
+    """Сравнение с прежними результатами; возвращает список ухудшений"""
+    regressions = []
+    checks = [('TOTAL', results['total'], baseline['total'])]
+    checks += [(key, summary, baseline['requests'][key])
+               for key, summary in results['requests'].items() if key in baseline['requests']]
+    print(f"\nvs {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}):")
+    for key, current, previous in checks:
+        throughput = _change(current['throughput'], previous['throughput'])
+        p99 = _change(current['latencyMs']['p99'], previous['latencyMs']['p99'])
+        print(f"{key[:36]:<36} req/s {throughput:+7.1f}%   p99 {p99:+7.1f}%")
+        if key == 'TOTAL':
+            if throughput < -max_regression:
+                regressions.append(f"throughput {throughput:+.1f}%")
+            if p99 > max_regression:
+                regressions.append(f"p99 latency {p99:+.1f}%")
+    return regressions
+
+
+def _change(current, previous):
+    return (current - previous) / previous * 100 if previous else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('collections', nargs='*', default=DEFAULT_COLLECTIONS,
+                        help="файлы коллекций Postman (по умолчанию обе коллекции репозитория)")
+    parser.add_argument('--base-url', default='http://localhost:8000', help="адрес тестируемого сервера")
+    parser.add_argument('--spawn', metavar='MODE', default=None,
+                        help="запустить main.py в режиме MODE на свободном порту вместо --base-url")
+    parser.add_argument('--server-args', default='', help="дополнительные параметры main.py для --spawn")
+    parser.add_argument('--concurrency', type=int, default=16, help="число виртуальных пользователей")
+    parser.add_argument('--rate', type=float, default=0, help="общая частота запросов в секунду, 0 - максимум")
+    parser.add_argument('--duration', type=float, default=10.0, help="длительность замера, сек")
+    parser.add_argument('--requests', type=int, default=0, help="остановиться после N запросов, 0 - без лимита")
+    parser.add_argument('--warmup', type=float, default=1.0, help="прогрев, не входящий в замер, сек")
+    parser.add_argument('--timeout', type=float, default=10.0, help="таймаут запроса, сек")
+    parser.add_argument('--logout', action='store_true', help="завершать каждый круг выходом и входить заново")
+    parser.add_argument('--json-bodies', action='store_true',
+                        help="отправлять тела форм (urlencoded) объектами JSON")
+    parser.add_argument('--answer-length', type=int, default=0,
+                        help="длина ответа генератора в /api/chat/send, символов (0 - ответ по правилам)")
+    parser.add_argument('--credentials', help="CSV login,password: виртуальные пользователи входят "
+                                              "под разными учетными записями (python users.py --credentials)")
+    parser.add_argument('--output', help="файл для результатов в JSON")
+    parser.add_argument('--compare', help="JSON прежнего запуска для сравнения")
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help="допустимое ухудшение пропускной способности и p99, проценты")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.spawn:
+        port = free_port()
+        server = start_server(port, '--mode', args.spawn, *shlex.split(args.server_args))
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        results = run_load(args, base_url)
+    finally:
+        if server is not None:
+            stop_server(server)
+    if args.spawn:
+        results['meta']['mode'] = args.spawn
+        results['meta']['serverArgs'] = args.server_args
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("Regression: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Чтение коллекций Postman (формат v2.1) для нагрузочного генератора.
+
+Из коллекции берутся запросы (папки разворачиваются по порядку), их метод,
+путь с query-строкой, заголовки и тело (urlencoded или raw; raw с языком
+json получает Content-Type: application/json). Переменные
+{{name}} подставляются при каждом запросе: baseUrl заменяется адресом
+тестируемого сервера, sessionToken - токеном, полученным при входе.
+
+Тест-скрипты не выполняются. Из них извлекаются только присваивания вида
+pm.environment.set('sessionToken', json.sessionToken): такой запрос
+считается запросом входа, а поле ответа - источником переменной.
+"""
+import json
+import re
+from urllib.parse import quote, urlencode, urlsplit
+
+VARIABLE_RE = re.compile(r'\{\{([^{}]+)\}\}')
+SETTER_RE = re.compile(r"""\.set\(\s*['"]([\w.-]+)['"]\s*,\s*\w+\.([\w.]+)\s*\)""")
+
+
+def substitute(text, variables):
+    """Подстановка {{name}}; неизвестные переменные остаются как есть"""
+    return VARIABLE_RE.sub(lambda m: str(variables.get(m.group(1).strip(), m.group(0))), text)
+
+
+class PostmanRequest:
+    """Запрос коллекции с неподставленными переменными"""
+
+    __slots__ = ('name', 'method', 'url', 'headers', 'body_mode', 'body', 'captures')
+
+    def __init__(self, name, method, url, headers, body_mode, body, captures):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body_mode = body_mode
+        self.body = body
+        # Переменные, которые тест-скрипт берет из JSON-ответа: {переменная: поле}
+        self.captures = captures
+
+    @property
+    def path(self):
+        return urlsplit(self.url).path or '/'
+
+    def with_fields(self, fields):
+        """Копия запроса, в теле формы которой поля fields (без учета регистра) заменены, недостающие добавлены"""
+        values = {k.lower(): v for k, v in fields.items()}
+        body = self.body
+        if self.body_mode == 'urlencoded':
+            present = {k.lower() for k, _ in body}
+            body = [(k, values.get(k.lower(), v)) for k, v in body]
+            body += [(k, v) for k, v in fields.items() if k.lower() not in present]
+        return PostmanRequest(self.name, self.method, self.url, self.headers, self.body_mode, body, self.captures)
+
+    def render(self, variables, json_body=False):
+        """(метод, путь с query, заголовки, тело в байтах) с подставленными переменными.
+
+        json_body - тело urlencoded отправляется объектом JSON (повторяющиеся поля - списком).
+        """
+        parts = urlsplit(substitute(self.url, variables))
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        headers = {substitute(k, variables): substitute(v, variables) for k, v in self.headers}
+        body = None
+        if self.body_mode == 'urlencoded' and json_body:
+            fields = {}
+            for k, v in self.body:
+                k, v = substitute(k, variables), substitute(v, variables)
+                if k in fields:
+                    fields[k] = fields[k] + [v] if isinstance(fields[k], list) else [fields[k], v]
+                else:
+                    fields[k] = v
+            body = json.dumps(fields, ensure_ascii=False).encode('utf-8')
+            headers = {k: v for k, v in headers.items() if k.lower() != 'content-type'}
+            headers['Content-Type'] = 'application/json'
+        elif self.body_mode == 'urlencoded':
+            body = urlencode([(substitute(k, variables), substitute(v, variables)) for k, v in self.body],
+                             quote_via=quote).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+        elif self.body_mode == 'raw':
+            body = substitute(self.body, variables).encode('utf-8')
+        return self.method, target, headers, body
+
+    def capture(self, response_body):
+        """Значения переменных из ответа по правилам тест-скрипта"""
+        if not self.captures:
+            return {}
+        try:
+            data = json.loads(response_body)
+        except ValueError:
+            return {}
+        values = {}
+        for variable, field in self.captures.items():
+            value = data
+            for key in field.split('.'):
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None:
+                values[variable] = value
+        return values
+
+
+class PostmanCollection:
+    """Коллекция: список запросов и переменные по умолчанию"""
+
+    def __init__(self, name, requests, variables):
+        self.name = name
+        self.requests = requests
+        self.variables = variables
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8-sig') as f:
+            data = json.load(f)
+        variables = {v['key']: v.get('value', '') for v in data.get('variable', []) if not v.get('disabled')}
+        requests = []
+        cls._collect(data.get('item', []), requests)
+        return cls(data.get('info', {}).get('name', path), requests, variables)
+
+    @classmethod
+    def _collect(cls, items, requests):
+        for item in items:
+            if 'item' in item:
+                cls._collect(item['item'], requests)
+            elif 'request' in item:
+                requests.append(cls._parse_request(item))
+
+    @staticmethod
+    def _parse_request(item):
+        request = item['request']
+        url = request.get('url', '')
+        if isinstance(url, dict):
+            url = url.get('raw', '')
+        headers = [(h['key'], h.get('value', '')) for h in request.get('header', []) if not h.get('disabled')]
+        body = request.get('body') or {}
+        body_mode = body.get('mode')
+        if body_mode == 'urlencoded':
+            content = [(p['key'], p.get('value', '')) for p in body.get('urlencoded', []) if not p.get('disabled')]
+        elif body_mode == 'raw':
+            content = body.get('raw', '')
+            language = body.get('options', {}).get('raw', {}).get('language')
+            if language == 'json' and not any(k.lower() == 'content-type' for k, _ in headers):
+                headers.append(('Content-Type', 'application/json'))
+        else:
+            body_mode, content = None, None
+        captures = {}
+        for event in item.get('event', []):
+            if event.get('listen') != 'test':
+                continue
+            script = event.get('script', {}).get('exec', [])
+            for variable, field in SETTER_RE.findall('\n'.join(script) if isinstance(script, list) else script):
+                captures[variable] = field
+        return PostmanRequest(item.get('name', ''), request.get('method', 'GET').upper(), url,
+                              headers, body_mode, content, captures)
@@ -0,0 +1,370 @@
+"""Воспроизведение записанного трафика (main.py --capture-file) против сервера.
+
+Файл читается потоком, без загрузки в память: запросы раздаются
+--connections соединениям keep-alive через ограниченные очереди. Несколько
+файлов (prefork с {pid} в имени) сливаются по времени записи.
+
+Темп - --speed: 1 - как при записи, 10 - в десять раз быстрее, 0 -
+максимальная частота без пауз. При speed > 0 задержка считается от
+запланированного момента старта, как у loadgen.py с --rate: отставание
+сервера не прячется за очередью клиента.
+
+sessionToken записи принадлежат сессиям, которых на новом сервере нет.
+Каждый записанный токен при первой встрече заменяется токеном свежего
+входа: под владельцем сессии (поле user записи), если его пароль есть в
+--credentials, иначе под учетными записями файла по кругу или под
+встроенным пользователем; токен, который сервер отверг и при записи,
+остается прежним. Запросы одной записанной сессии идут по одному
+соединению в исходном порядке. Записанные входы повторяются как есть.
+
+Итог - таблица loadgen.py (p50/p95/p99/p99.9 по запросам) и число ответов,
+статус которых отличается от записанного; --output и --compare - как у
+loadgen.py.
+
+Примеры:
+    python main.py --mode pool --capture-file traffic.ndjson
+    python benchmarks/replay.py traffic.ndjson --base-url http://localhost:8000
+    python benchmarks/replay.py traffic.ndjson --speed 0 --connections 64 --spawn asyncio
+    python benchmarks/replay.py traffic-*.ndjson --speed 5 --credentials credentials.csv --output replay.json
+"""
+import argparse
+import base64
+import heapq
+import http.client
+import itertools
+import json
+import os
+import queue
+import shlex
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import free_port, start_server, stop_server
+from loadgen import RequestStats, compare, git_revision, load_credentials, print_table
+from request_body import BodyError, parse_body
+from users import DEFAULT_USER
+
+# Заголовки, которые относятся к записанному соединению, а не к запросу
+HOP_HEADERS = frozenset(('host', 'content-length', 'connection', 'keep-alive', 'transfer-encoding', 'expect'))
+# Записей в очереди одного соединения; больше - чтение файла ждет
+QUEUE_DEPTH = 1000
+# Пауза перед первым запросом, чтобы все соединения успели стартовать
+START_LEAD = 0.1
+
+
+class ReplayRequest:
+    """Запрос записи, подготовленный к отправке"""
+
+    __slots__ = ('ts', 'method', 'path', 'headers', 'body', 'token', 'user', 'status')
+
+    def __init__(self, record):
+        self.ts = record['ts']
+        self.method = record['method']
+        self.path = record['path']
+        self.headers = {name: value for name, value in record.get('headers', ())
+                        if name.lower() not in HOP_HEADERS}
+        if 'bodyBase64' in record:
+            self.body = base64.b64decode(record['bodyBase64'])
+        else:
+            self.body = record.get('body', '').encode('utf-8')
+        self.user = record.get('user')
+        self.status = record.get('status')
+        self.token = self._session_token()
+
+    def _session_token(self):
+        query = urlsplit(self.path).query
+        if 'sessionToken' in query:
+            return parse_qs(query).get('sessionToken', [None])[0]
+        if b'sessionToken' in self.body:
+            content_type = next((v for k, v in self.headers.items() if k.lower() == 'content-type'), None)
+            try:
+                return parse_body(self.body, content_type).get('sessionToken', [None])[0]
+            except BodyError:
+                return None
+        return None
+
+    def rendered(self, token):
+        """(путь, тело) с записанным токеном, замененным на token"""
+        if token is None or token == self.token:
+            return self.path, self.body
+        # Токены не содержат символов, которые экранируются в форме, query или JSON
+        return (self.path.replace(self.token, token),
+                self.body.replace(self.token.encode('ascii'), token.encode('ascii')))
+
+
+def read_records(path, skipped):
+    """Записи файла по одной; строки о потерях при записи считаются в skipped"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped['invalid'] += 1
+                continue
+            if 'dropped' in record:
+                skipped['dropped'] += record['dropped']
+            elif 'method' in record and 'path' in record and 'ts' in record:
+                yield record
+            else:
+                skipped['invalid'] += 1
+
+
+class Accounts:
+    """Учетные записи для свежих входов вместо записанных сессий"""
+
+    def __init__(self, credentials):
+        self.passwords = dict(credentials or ())
+        self._cycle = itertools.cycle(credentials or [(DEFAULT_USER['login'], DEFAULT_USER['password'])])
+        self._lock = threading.Lock()
+
+    def for_user(self, user):
+        password = self.passwords.get(user)
+        if password is not None:
+            return user, password
+        with self._lock:
+            return next(self._cycle)
+
+
+class Connection:
+    """Соединение со своей очередью, заменой токенов и статистикой"""
+
+    def __init__(self, host, port, timeout, accounts, clock):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.accounts = accounts
+        self.clock = clock
+        self.queue = queue.Queue(QUEUE_DEPTH)
+        # Записанный токен -> токен свежего входа (None, если вход не удался)
+        self.tokens = {}
+        self.stats = {}
+        self.mismatches = {}
+        self.login_failures = 0
+        self.connection = None
+
+    def run(self):
+        try:
+            while True:
+                request = self.queue.get()
+                if request is None:
+                    return
+                token = None
+                # Токен, отвергнутый и при записи (401 без владельца), отправляется как есть
+                if request.token is not None and (request.user is not None or request.status != 401):
+                    if request.token not in self.tokens:
+                        self.tokens[request.token] = self._login(*self.accounts.for_user(request.user))
+                    token = self.tokens[request.token]
+                intended = self.clock.intended(request.ts)
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self._execute(request, token, intended)
+        finally:
+            if self.connection is not None:
+                self.connection.close()
+
+    def _send(self, method, target, body, headers):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request(method, target, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+    def _login(self, login, password):
+        """Токен свежей сессии; вход не входит в статистику"""
+        body = urlencode({'Login': login, 'Password': password}).encode('ascii')
+        try:
+            status, data = self._send('POST', '/api/auth/login', body,
+                                      {'Content-Type': 'application/x-www-form-urlencoded'})
+            if status == 200:
+                return json.loads(data)['sessionToken']
+        except (OSError, http.client.HTTPException, ValueError, KeyError):
+            pass
+        self.login_failures += 1
+        return None
+
+    def _execute(self, request, token, intended):
+        target, body = request.rendered(token)
+        key = f"{request.method} {target.split('?', 1)[0]}"
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = RequestStats()
+        started = time.perf_counter()
+        try:
+            status, data = self._send(request.method, target, body or None, request.headers)
+        except (OSError, http.client.HTTPException):
+            stats.errors += 1
+            return
+        finished = time.perf_counter()
+        since = intended if self.clock.speed else started
+        stats.histogram.record((finished - since) * 1000000)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        stats.received += len(data)
+        if request.status is not None and status != request.status:
+            self.mismatches[key] = self.mismatches.get(key, 0) + 1
+
+
+class Clock:
+    """Перевод времени записи во время воспроизведения"""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.first_ts = None
+        self.started = None
+
+    def intended(self, ts):
+        if not self.speed:
+            return time.perf_counter()
+        return self.started + (ts - self.first_ts) / self.speed
+
+
+def replay(args, base_url):
+    skipped = {'dropped': 0, 'invalid': 0}
+    records = heapq.merge(*(read_records(path, skipped) for path in args.files), key=lambda r: r['ts'])
+    if args.limit:
+        records = itertools.islice(records, args.limit)
+    credentials = load_credentials(args.credentials) if args.credentials else None
+
+    url = urlsplit(base_url)
+    clock = Clock(args.speed)
+    accounts = Accounts(credentials)
+    connections = [Connection(url.hostname, url.port or 80, args.timeout, accounts, clock)
+                   for _ in range(args.connections)]
+    threads = [threading.Thread(target=c.run, name=f"replay-{i}") for i, c in enumerate(connections)]
+    for thread in threads:
+        thread.start()
+
+    count = 0
+    first_ts = last_ts = None
+    round_robin = itertools.cycle(connections)
+    started = time.perf_counter()
+    try:
+        for record in records:
+            request = ReplayRequest(record)
+            if first_ts is None:
+                first_ts = clock.first_ts = request.ts
+                # Без пауз ждать нечего; по расписанию соединениям дается время стартовать
+                clock.started = started = time.perf_counter() + (START_LEAD if clock.speed else 0.0)
+            last_ts = request.ts
+            # Запросы одной сессии - по одному соединению, чтобы сохранить их порядок
+            if request.token is not None:
+                connection = connections[hash(request.token) % len(connections)]
+            else:
+                connection = next(round_robin)
+            connection.queue.put(request)
+            count += 1
+    finally:
+        for connection in connections:
+            connection.queue.put(None)
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = RequestStats()
+    per_request = {}
+    mismatches = {}
+    for connection in connections:
+        for key, stats in connection.stats.items():
+            per_request.setdefault(key, RequestStats()).merge(stats)
+            total.merge(stats)
+        for key, number in connection.mismatches.items():
+            mismatches[key] = mismatches.get(key, 0) + number
+    requests = {key: stats.summary(elapsed) for key, stats in sorted(per_request.items())}
+    for key, summary in requests.items():
+        summary['statusMismatches'] = mismatches.get(key, 0)
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'baseUrl': base_url,
+            'files': args.files,
+            'connections': args.connections,
+            'speed': args.speed,
+            'records': count,
+            'capturedSpanSec': round(last_ts - first_ts, 3) if count else 0.0,
+            'droppedAtCapture': skipped['dropped'],
+            'invalidLines': skipped['invalid'],
+            'sessionsRewritten': sum(len(c.tokens) for c in connections),
+            'loginFailures': sum(c.login_failures for c in connections),
+            'elapsedSec': round(elapsed, 3),
+        },
+        'total': total.summary(elapsed),
+        'requests': requests,
+    }
+    results['total']['statusMismatches'] = sum(mismatches.values())
+    return results
+
+
+def print_report(results):
+    meta = results['meta']
+    print(f"{meta['baseUrl']}  records={meta['records']}  connections={meta['connections']}  "
+          f"speed={meta['speed'] or 'max'}  captured={meta['capturedSpanSec']}s  "
+          f"elapsed={meta['elapsedSec']}s  revision={meta['revision']}")
+    print_table(results)
+    print(f"status differs from capture: {results['total']['statusMismatches']}  "
+          f"sessions rewritten: {meta['sessionsRewritten']}  login failures: {meta['loginFailures']}  "
+          f"dropped at capture: {meta['droppedAtCapture']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='+', help="файлы записи (main.py --capture-file)")
+    parser.add_argument('--base-url', default='http://localhost:8000', help="адрес тестируемого сервера")
+    parser.add_argument('--spawn', metavar='MODE', default=None,
+                        help="запустить main.py в режиме MODE на свободном порту вместо --base-url")
+    parser.add_argument('--server-args', default='', help="дополнительные параметры main.py для --spawn")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="множитель темпа записи: 1 - исходный, 2 - вдвое быстрее, 0 - без пауз")
+    parser.add_argument('--connections', type=int, default=16, help="число соединений")
+    parser.add_argument('--limit', type=int, default=0, help="воспроизвести только первые N запросов")
+    parser.add_argument('--credentials', help="CSV login,password для свежих входов (python users.py --credentials)")
+    parser.add_argument('--timeout', type=float, default=10.0, help="таймаут запроса, сек")
+    parser.add_argument('--output', help="файл для результатов в JSON")
+    parser.add_argument('--compare', help="JSON прежнего запуска для сравнения")
+    parser.add_argument('--max-regression', type=float, default=10.0,
+                        help="допустимое ухудшение пропускной способности и p99, проценты")
+    args = parser.parse_args()
+    if args.speed < 0 or args.connections < 1:
+        parser.error("--speed must be >= 0 and --connections >= 1")
+
+    server = None
+    base_url = args.base_url
+    if args.spawn:
+        port = free_port()
+        server = start_server(port, '--mode', args.spawn, *shlex.split(args.server_args))
+        base_url = f"http://127.0.0.1:{port}"
+    try:
+        results = replay(args, base_url)
+    finally:
+        if server is not None:
+            stop_server(server)
+    if args.spawn:
+        results['meta']['mode'] = args.spawn
+        results['meta']['serverArgs'] = args.server_args
+
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("Regression: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""История сообщений чата и настройки модели по сессиям.
+
+Состояние переносится в новый процесс при перезапуске снимком (snapshot/restore).
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sessions import _SweeperMixin
+
+
+class Message:
+    """Сообщение чата; deleted - метка удаления в журнале"""
+
+    __slots__ = ('id', 'text', 'type', 'timestamp', 'deleted')
+
+    def __init__(self, message_id, text, message_type, timestamp):
+        self.id = message_id
+        self.text = text
+        self.type = message_type
+        self.timestamp = timestamp
+        self.deleted = False
+
+    def to_dict(self):
+        return {"id": self.id, "text": self.text, "type": self.type, "timestamp": self.timestamp}
+
+
+class ChatHistory:
+    """История одной сессии.
+
+    Сообщения только дописываются в конец журнала (_log) и получают
+    возрастающие id. Поиск по id - через словарь _index за O(1); удаление
+    ставит метку в журнале. Журнал упорядочен по id, поэтому страница
+    "после id" находится двоичным поиском, даже если это сообщение удалено.
+    При превышении max_messages вытесняются самые старые сообщения.
+    """
+
+    def __init__(self, max_messages, expires_at=None):
+        self.max_messages = max_messages
+        # Срок действия сессии-владельца; None - история не истекает
+        self.expires_at = expires_at
+        self._log = []
+        # Индекс первого непросмотренного элемента журнала: все, что левее, вытеснено
+        self._head = 0
+        self._index = {}
+        self._next_id = 1
+        self.evicted = 0
+        # Настройки модели сессии (temperature, topP); очистка истории их не сбрасывает
+        self.settings = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def append(self, text, message_type):
+        message = Message(self._next_id, text, message_type, datetime.now().isoformat(timespec='seconds'))
+        self._next_id += 1
+        self._log.append(message)
+        self._index[message.id] = message
+        while len(self._index) > self.max_messages:
+            self._evict_oldest()
+        self._compact()
+        return message
+
+    def get(self, message_id):
+        return self._index.get(message_id)
+
+    def update(self, message_id, text):
+        message = self._index.get(message_id)
+        if message is not None:
+            message.text = text
+        return message
+
+    def delete(self, message_id):
+        message = self._index.pop(message_id, None)
+        if message is None:
+            return False
+        message.deleted = True
+        self._compact()
+        return True
+
+    def clear(self):
+        count = len(self._index)
+        self._log = []
+        self._head = 0
+        self._index = {}
+        return count
+
+    def page(self, after=None, limit=50):
+        """До limit сообщений с id > after; возвращает (сообщения, есть ли еще)"""
+        log = self._log
+        start = self._head
+        if after is not None:
+            low, high = start, len(log)
+            while low < high:
+                middle = (low + high) // 2
+                if log[middle].id <= after:
+                    low = middle + 1
+                else:
+                    high = middle
+            start = low
+        messages = []
+        for position in range(start, len(log)):
+            message = log[position]
+            if message.deleted:
+                continue
+            if len(messages) == limit:
+                return messages, True
+            messages.append(message)
+        return messages, False
+
+    def snapshot(self):
+        """Состояние истории для переноса в другой процесс (JSON-совместимое)"""
+        messages = [[m.id, m.text, m.type, m.timestamp] for m in self._log[self._head:] if not m.deleted]
+        return {"nextId": self._next_id, "settings": dict(self.settings), "messages": messages,
+                "expiresAt": self.expires_at}
+
+    @classmethod
+    def from_snapshot(cls, max_messages, state):
+        history = cls(max_messages, state.get("expiresAt"))
+        for message_id, text, message_type, timestamp in state["messages"][-max_messages:]:
+            message = Message(message_id, text, message_type, timestamp)
+            history._log.append(message)
+            history._index[message_id] = message
+        history._next_id = state["nextId"]
+        history.settings = dict(state["settings"])
+        return history
+
+    def _evict_oldest(self):
+        log = self._log
+        while log[self._head].deleted:
+            self._head += 1
+        message = log[self._head]
+        self._head += 1
+        del self._index[message.id]
+        self.evicted += 1
+
+    def _compact(self):
+        # Удаленные и вытесненные записи выбрасываются из журнала, когда их
+        # становится больше, чем живых сообщений: амортизированно O(1)
+        garbage = len(self._log) - len(self._index)
+        if garbage > 64 and garbage > len(self._index):
+            self._log = [m for m in self._log[self._head:] if not m.deleted]
+            self._head = 0
+
+
+class ChatHistoryStore(_SweeperMixin):
+    """Истории и настройки модели всех сессий.
+
+    Методы принимают токен сессии и возвращают словари, а не объекты Message,
+    чтобы хранилище можно было вынести в процесс-менеджер (режим prefork).
+    Число историй ограничено max_sessions: дольше всех не использованная
+    история вытесняется вместе с настройками. История живет не дольше своей
+    сессии: срок сессии передается при создании истории, и истекшие истории
+    удаляет фоновый поток (start_sweeper, как у хранилищ сессий - по куче
+    сроков), а также создание новой истории.
+    """
+
+    sweeper_name = "chat-history-sweeper"
+
+    def __init__(self, max_messages=10000, max_sessions=None):
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self._histories = OrderedDict()
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def _history(self, token, create=False, expires_at=None):
+        history = self._histories.get(token)
+        if history is None:
+            if not create:
+                return None
+            # Истории истекших сессий удаляются до вытеснения живых
+            self._sweep(time.time())
+            if self.max_sessions and len(self._histories) >= self.max_sessions:
+                self._histories.popitem(last=False)
+            history = self._histories[token] = ChatHistory(self.max_messages, expires_at)
+            self._track(history, token)
+        else:
+            self._histories.move_to_end(token)
+        return history
+
+    def _track(self, history, token):
+        if history.expires_at is not None:
+            heapq.heappush(self._expiry_heap, (history.expires_at, token))
+            # Записи удаленных историй остаются в куче до своего срока
+            if len(self._expiry_heap) > 2 * len(self._histories) + 1024:
+                self._expiry_heap = [(h.expires_at, t) for t, h in self._histories.items()
+                                     if h.expires_at is not None]
+                heapq.heapify(self._expiry_heap)
+
+    def _sweep(self, now):
+        swept = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, token = heapq.heappop(heap)
+            history = self._histories.get(token)
+            # Запись в куче могла устареть: историю уже удалили или вытеснили
+            if history is not None and history.expires_at == expires_at:
+                del self._histories[token]
+                swept += 1
+        return swept
+
+    def sweep(self, now=None):
+        """Удаление историй истекших сессий; возвращает число удаленных"""
+        with self._lock:
+            return self._sweep(time.time() if now is None else now)
+
+    def append(self, token, text, message_type, expires_at=None):
+        """Новое сообщение; expires_at - срок сессии, если история создается"""
+        with self._lock:
+            return self._history(token, True, expires_at).append(text, message_type).to_dict()
+
+    def update(self, token, message_id, text):
+        with self._lock:
+            history = self._history(token)
+            message = history.update(message_id, text) if history else None
+            return message.to_dict() if message else None
+
+    def delete(self, token, message_id):
+        with self._lock:
+            history = self._history(token)
+            return history.delete(message_id) if history else False
+
+    def clear(self, token):
+        with self._lock:
+            history = self._history(token)
+            return history.clear() if history else 0
+
+    def page(self, token, after=None, limit=50):
+        """Страница истории: (список словарей, курсор следующей страницы или None)"""
+        with self._lock:
+            history = self._history(token)
+            if history is None:
+                return [], None
+            messages, has_more = history.page(after, limit)
+            return [m.to_dict() for m in messages], (messages[-1].id if has_more else None)
+
+    def settings(self, token):
+        """Настройки модели сессии: {"temperature": ..., "topP": ...}, заданные ранее"""
+        with self._lock:
+            history = self._history(token)
+            return dict(history.settings) if history else {}
+
+    def set_setting(self, token, name, value, expires_at=None):
+        with self._lock:
+            self._history(token, True, expires_at).settings[name] = value
+
+    def drop(self, token):
+        """Удаление истории вместе с сессией"""
+        with self._lock:
+            self._histories.pop(token, None)
+
+    def snapshot(self):
+        """Все истории: {токен: состояние} от давно не использованных к недавним"""
+        with self._lock:
+            return {token: history.snapshot() for token, history in self._histories.items()}
+
+    def restore(self, state):
+        """Загрузка снимка snapshot(); истекшие истории пропускаются. Возвращает число загруженных"""
+        now = time.time()
+        restored = 0
+        with self._lock:
+            for token, state_history in state.items():
+                expires_at = state_history.get("expiresAt")
+                if expires_at is not None and expires_at <= now:
+                    continue
+                if self.max_sessions and len(self._histories) >= self.max_sessions:
+                    self._histories.popitem(last=False)
+                history = self._histories[token] = ChatHistory.from_snapshot(self.max_messages, state_history)
+                self._histories.move_to_end(token)
+                self._track(history, token)
+                restored += 1
+            return restored
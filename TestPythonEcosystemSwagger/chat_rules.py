@@ -0,0 +1,179 @@
+"""Правила ответов чата: таблица "ключевые слова -> ответ", собранная в автомат Ахо-Корасик.
+
+Файл правил (JSON, либо YAML при установленном PyYAML):
+
+    {
+      "default": "Получил ваш запрос",
+      "rules": [
+        {"keywords": ["привет"], "answer": "Привет! Чем могу помочь?"},
+        {"keywords": ["время"], "answer": "Сейчас {time}"}
+      ]
+    }
+
+Правила проверяются в порядке файла: если в сообщении есть ключевые слова
+нескольких правил, срабатывает то, что записано выше. Поиск без учета регистра,
+за один проход по сообщению независимо от числа правил.
+В ответе доступна подстановка {time} - текущее время ЧЧ:ММ.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger(__name__)
+
+# Приоритет "нет совпадений": больше любого номера правила
+NO_MATCH = float('inf')
+
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик, возвращающий наименьший приоритет среди найденных слов"""
+
+    def __init__(self, patterns):
+        """patterns - пары (слово, приоритет); меньший приоритет важнее"""
+        # Узел i: переходы goto[i], суффиксная ссылка fail[i] и лучший приоритет
+        # среди слов, оканчивающихся в этом узле или в его суффиксах
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [NO_MATCH]
+        for word, priority in patterns:
+            if not word:
+                continue
+            node = 0
+            for char in word:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(NO_MATCH)
+                node = next_node
+            if priority < self.best[node]:
+                self.best[node] = priority
+        self._build_links()
+
+    def _build_links(self):
+        goto, fail, best = self.goto, self.fail, self.best
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                queue.append(child)
+                link = fail[node]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                fail[child] = goto[link].get(char, 0)
+                if best[fail[child]] < best[child]:
+                    best[child] = best[fail[child]]
+
+    def search(self, text):
+        """Наименьший приоритет среди слов, встречающихся в text, или NO_MATCH"""
+        goto, fail, best = self.goto, self.fail, self.best
+        root = goto[0]
+        result = NO_MATCH
+        node = 0
+        for char in text:
+            if node == 0:
+                node = root.get(char, 0)
+                if node == 0:
+                    continue
+            else:
+                transitions = goto[node]
+                while char not in transitions:
+                    node = fail[node]
+                    if node == 0:
+                        break
+                    transitions = goto[node]
+                node = goto[node].get(char, 0)
+            if best[node] < result:
+                result = best[node]
+                if result == 0:
+                    # Сильнее первого правила ничего нет
+                    break
+        return result
+
+
+class ChatRules:
+    """Скомпилированный набор правил"""
+
+    def __init__(self, rules, default):
+        self.answers = []
+        self.templated = []
+        patterns = []
+        for priority, rule in enumerate(rules):
+            answer = rule['answer']
+            self.answers.append(answer)
+            self.templated.append('{time}' in answer)
+            for keyword in rule['keywords']:
+                patterns.append((keyword.lower(), priority))
+        self.default = default
+        self.automaton = AhoCorasick(patterns)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            if path.endswith(('.yaml', '.yml')):
+                if yaml is None:
+                    raise RuntimeError("PyYAML is required to load YAML chat rules")
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        return cls(data.get('rules', []), data.get('default', ''))
+
+    def answer(self, message):
+        priority = self.automaton.search(message.lower()) if message else NO_MATCH
+        if priority is NO_MATCH:
+            return self.default
+        answer = self.answers[priority]
+        if self.templated[priority]:
+            answer = answer.replace('{time}', datetime.now().strftime('%H:%M'))
+        return answer
+
+
+class ChatResponder:
+    """Правила из файла с перезагрузкой при его изменении.
+
+    Время изменения файла проверяется не чаще раза в reload_interval секунд.
+    Если новый файл не читается или содержит ошибку, остаются прежние правила.
+    """
+
+    def __init__(self, path, reload_interval=1.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._mtime = os.stat(path).st_mtime_ns
+        self._rules = ChatRules.load(path)
+        self._checked_at = time.monotonic()
+        self._reload_lock = threading.Lock()
+
+    def answer(self, message):
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self._maybe_reload()
+        return self._rules.answer(message)
+
+    def _maybe_reload(self):
+        # Проверку выполняет один поток, остальные отвечают по текущим правилам
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self._mtime:
+                    return
+                # Запоминаем время и при ошибке: ошибка сообщается один раз на изменение файла
+                self._mtime = mtime
+                rules = ChatRules.load(self.path)
+            except Exception as e:
+                logger.error(f"Failed to reload chat rules from {self.path}: {e}")
+                return
+            self._rules = rules
+            logger.info(f"Chat rules reloaded: {len(rules.answers)} rules")
+        finally:
+            self._reload_lock.release()
@@ -0,0 +1,292 @@
+"""Имитация медленного и нестабильного AI-бэкенда: задержки, ошибки, медленная отдача.
+
+Профиль задается по маршрутам ("METHOD /path" из таблицы маршрутов, "*" -
+для остальных):
+
+    {
+      "seed": 42,
+      "routes": {
+        "POST /api/chat/send": {
+          "latency": {"distribution": "lognormal", "median_ms": 800, "sigma": 0.6, "max_ms": 20000},
+          "errors": [{"status": 503, "rate": 0.02}, {"status": 429, "rate": 0.01, "retryAfter": 2}],
+          "drip": {"bytes": 16, "interval_ms": 50}
+        },
+        "*": {"latency": {"distribution": "fixed", "ms": 20}}
+      }
+    }
+
+Распределения задержки: fixed (ms), normal (mean_ms, stddev_ms),
+lognormal (median_ms, sigma) и histogram - повтор записанной гистограммы:
+"buckets": [[верхняя граница, мс, число запросов], ...]; значение
+выбирается пропорционально числу запросов, внутри корзины - равномерно.
+max_ms ограничивает любое распределение сверху.
+
+errors - доли запросов, на которые вместо обработчика отвечает ошибка
+(5xx или 429 с Retry-After). drip - ответ уходит порциями по bytes байт
+каждые interval_ms.
+
+Задержки не занимают потоки обработки: готовый ответ передается
+DelayedSender - одному потоку с кучей сроков, который пишет в
+неблокирующие сокеты. В asyncio-движке ответ ждет в своей сопрограмме.
+"""
+import heapq
+import itertools
+import math
+import random
+import socket
+import threading
+import time
+from bisect import bisect_left
+from http import HTTPStatus
+
+from responses import EncodedResponse
+
+# Через сколько повторить запись, если буфер сокета полон
+RETRY_INTERVAL = 0.01
+
+
+def _number(spec, name, default=None, minimum=0.0):
+    value = spec.get(name, default)
+    if value is None:
+        raise ValueError(f"'{name}' is required")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < minimum:
+        raise ValueError(f"'{name}' must be a number >= {minimum:g}")
+    return float(value)
+
+
+def _section(spec, name, kind, description):
+    """Раздел настроек с проверкой типа: значение или None, если раздела нет"""
+    value = spec.get(name)
+    if value is not None and not isinstance(value, kind):
+        raise ValueError(f"'{name}' must be {description}")
+    return value
+
+
+def build_sampler(spec, rng):
+    """Функция без аргументов, возвращающая задержку в секундах"""
+    distribution = spec.get('distribution', 'fixed')
+    if distribution == 'fixed':
+        value = _number(spec, 'ms') / 1000
+        sample = lambda: value
+    elif distribution == 'normal':
+        mean, stddev = _number(spec, 'mean_ms') / 1000, _number(spec, 'stddev_ms') / 1000
+        sample = lambda: max(0.0, rng.gauss(mean, stddev))
+    elif distribution == 'lognormal':
+        mu, sigma = math.log(_number(spec, 'median_ms', minimum=0.001) / 1000), _number(spec, 'sigma')
+        sample = lambda: rng.lognormvariate(mu, sigma)
+    elif distribution == 'histogram':
+        buckets = spec.get('buckets')
+        if not isinstance(buckets, list) or not buckets:
+            raise ValueError("'buckets' must be a non-empty list of [upper_ms, count]")
+        try:
+            buckets = sorted((float(upper), float(count)) for upper, count in buckets)
+        except (TypeError, ValueError):
+            raise ValueError("'buckets' must be a non-empty list of [upper_ms, count]") from None
+        bounds = [0.0] + [upper / 1000 for upper, _ in buckets]
+        cumulative = list(itertools.accumulate(count for _, count in buckets))
+        total = cumulative[-1]
+        if total <= 0 or any(count < 0 for _, count in buckets):
+            raise ValueError("histogram counts must be non-negative with a positive sum")
+
+        def sample():
+            index = bisect_left(cumulative, rng.random() * total)
+            return rng.uniform(bounds[index], bounds[index + 1])
+    else:
+        raise ValueError(f"unknown distribution '{distribution}'")
+    if 'max_ms' in spec:
+        limit = _number(spec, 'max_ms') / 1000
+        unlimited = sample
+        sample = lambda: min(unlimited(), limit)
+    return sample
+
+
+class RouteFaults:
+    """Скомпилированные настройки одного маршрута"""
+
+    __slots__ = ('latency', 'errors', 'drip_bytes', 'drip_interval')
+
+    def __init__(self, spec, rng):
+        if not isinstance(spec, dict):
+            raise ValueError("route settings must be an object")
+        latency = _section(spec, 'latency', dict, "an object")
+        self.latency = build_sampler(latency, rng) if latency else None
+        # [(верхняя граница накопленной доли, ответ)]
+        self.errors = []
+        threshold = 0.0
+        for error in _section(spec, 'errors', list, "a list") or ():
+            if not isinstance(error, dict):
+                raise ValueError("each error must be an object")
+            status = error.get('status')
+            if status != 429 and not (isinstance(status, int) and 500 <= status <= 599):
+                raise ValueError("error status must be 429 or 5xx")
+            threshold += _number(error, 'rate')
+            headers = None
+            if status == 429 or 'retryAfter' in error:
+                headers = {'Retry-After': str(int(_number(error, 'retryAfter', 1)))}
+            response = EncodedResponse.from_json({"error": HTTPStatus(status).phrase}, status, headers=headers)
+            self.errors.append((threshold, response))
+        if threshold > 1:
+            raise ValueError("error rates must add up to at most 1")
+        drip = _section(spec, 'drip', dict, "an object")
+        self.drip_bytes = int(_number(drip, 'bytes', 0)) if drip else 0
+        self.drip_interval = _number(drip, 'interval_ms', 0) / 1000 if drip else 0.0
+
+
+class FaultInjector:
+    """Текущий профиль и выбор ошибки и задержки для запроса.
+
+    Профиль заменяется целиком (load/clear) одной записью атрибута, поэтому
+    потоки обработки читают его без блокировок.
+    """
+
+    def __init__(self):
+        self.profile = None
+        self._routes = {}
+        self._default = None
+        self._rng = random.Random()
+        self.active = False
+        self.injected_errors = 0
+        self.delayed_responses = 0
+
+    def load(self, profile):
+        """Проверка и применение профиля; ValueError - профиль некорректен"""
+        if not isinstance(profile, dict) or not isinstance(profile.get('routes'), dict):
+            raise ValueError("profile must be an object with 'routes'")
+        seed = profile.get('seed')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+            raise ValueError("'seed' must be an integer")
+        rng = random.Random(seed)
+        routes = {}
+        default = None
+        for key, spec in profile['routes'].items():
+            try:
+                faults = RouteFaults(spec, rng)
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{key}: {e}") from None
+            if key == '*':
+                default = faults
+            else:
+                method, _, path = key.partition(' ')
+                if not path.startswith('/'):
+                    raise ValueError(f"route key '{key}' must look like 'POST /api/chat/send'")
+                routes[(method.upper(), path)] = faults
+        self._routes, self._default, self._rng, self.profile = routes, default, rng, profile
+        self.active = bool(routes) or default is not None
+
+    def clear(self):
+        self.active = False
+        self._routes, self._default, self.profile = {}, None, None
+
+    def decide(self, route):
+        """(ответ с ошибкой или None, (задержка, порция, интервал) или None) для маршрута"""
+        faults = self._routes.get((route.method, route.path), self._default)
+        if faults is None:
+            return None, None
+        error = None
+        if faults.errors:
+            roll = self._rng.random()
+            for threshold, response in faults.errors:
+                if roll < threshold:
+                    error = response
+                    self.injected_errors += 1
+                    break
+        delay = faults.latency() if faults.latency is not None else 0.0
+        if not delay and not faults.drip_bytes:
+            return error, None
+        self.delayed_responses += 1
+        return error, (delay, faults.drip_bytes, faults.drip_interval)
+
+
+class _Delivery:
+    __slots__ = ('sock', 'data', 'position', 'drip_bytes', 'drip_interval', 'stalled_since')
+
+    def __init__(self, sock, data, drip_bytes, drip_interval):
+        self.sock = sock
+        self.data = memoryview(data)
+        self.position = 0
+        self.drip_bytes = drip_bytes
+        self.drip_interval = drip_interval
+        self.stalled_since = None
+
+
+class DelayedSender:
+    """Отдача готовых ответов в назначенное время из одного потока.
+
+    Соединение переходит сюда целиком: после ответа оно закрывается.
+    Поток запускается при первой отправке (в prefork - в своем процессе).
+    """
+
+    def __init__(self, write_timeout=10.0):
+        self.write_timeout = write_timeout
+        self._heap = []
+        self._sequence = itertools.count()
+        self._changed = threading.Condition()
+        self._thread = None
+        # Ответы, которые еще не отданы до конца (в куче или в записи)
+        self._pending = 0
+
+    def __len__(self):
+        return self._pending
+
+    def submit(self, sock, data, delay, drip_bytes=0, drip_interval=0.0):
+        sock.setblocking(False)
+        with self._changed:
+            self._pending += 1
+        self._schedule(time.monotonic() + delay, _Delivery(sock, data, drip_bytes, drip_interval))
+
+    def _schedule(self, due, delivery):
+        with self._changed:
+            heapq.heappush(self._heap, (due, next(self._sequence), delivery))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="delayed-sender")
+                self._thread.daemon = True
+                self._thread.start()
+            self._changed.notify()
+
+    def _run(self):
+        heap = self._heap
+        while True:
+            with self._changed:
+                while True:
+                    now = time.monotonic()
+                    if heap and heap[0][0] <= now:
+                        break
+                    self._changed.wait(heap[0][0] - now if heap else None)
+                _, _, delivery = heapq.heappop(heap)
+            self._step(delivery, now)
+
+    def _step(self, delivery, now):
+        data = delivery.data
+        end = len(data) if not delivery.drip_bytes else delivery.position + delivery.drip_bytes
+        try:
+            sent = delivery.sock.send(data[delivery.position:end])
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._close(delivery)
+            return
+        delivery.position += sent
+        if delivery.position >= len(data):
+            self._close(delivery)
+            return
+        if sent:
+            delivery.stalled_since = None
+            due = now + delivery.drip_interval if delivery.drip_bytes else now
+        else:
+            # Клиент не читает: ждем, но не дольше write_timeout
+            if delivery.stalled_since is None:
+                delivery.stalled_since = now
+            elif now - delivery.stalled_since > self.write_timeout:
+                self._close(delivery)
+                return
+            due = now + RETRY_INTERVAL
+        self._schedule(due, delivery)
+
+    def _close(self, delivery):
+        try:
+            delivery.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        delivery.sock.close()
+        with self._changed:
+            self._pending -= 1
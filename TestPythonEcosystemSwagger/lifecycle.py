@@ -0,0 +1,224 @@
+"""Корректная остановка и горячий перезапуск сервера.
+
+SIGTERM и SIGINT останавливают сервер без обрыва запросов: прием соединений
+прекращается, запросы в обработке завершаются, каждый ответ закрывает свое
+соединение. Сигналы принимает SignalWatcher, действия выполняет его поток.
+
+По SIGHUP сервер запускает свою новую копию (та же команда, sys.argv) и
+передает ей дескриптор слушающего сокета и один конец управляющего канала
+(socketpair); номера дескрипторов - в переменных окружения LISTEN_FD_ENV и
+CONTROL_FD_ENV. Порядок:
+
+1. новый процесс загружается, создает сервер на унаследованном сокете
+   и пишет в канал "ready";
+2. старый процесс перестает принимать соединения и дожидается запросов в
+   обработке; новые соединения тем временем ждут в очереди слушающего
+   сокета, который продолжает существовать;
+3. старый процесс пишет в канал снимок состояния (JSON) и закрывает канал;
+4. новый процесс загружает снимок и начинает принимать соединения, а
+   старый дожидается своих потоковых и отложенных ответов и завершается.
+
+Если новый процесс не сообщил о готовности за READY_TIMEOUT или завершился,
+старый продолжает работать. SO_REUSEPORT не используется: при закрытии
+одного из сокетов группы соединения из его очереди сбрасываются.
+"""
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LISTEN_FD_ENV = 'API_SERVER_LISTEN_FD'
+CONTROL_FD_ENV = 'API_SERVER_CONTROL_FD'
+
+# Сколько ждать готовности нового процесса, сек
+READY_TIMEOUT = 60.0
+READY = b'ready\n'
+
+
+class SignalWatcher:
+    """Обработка сигналов в отдельном потоке.
+
+    Обработчик сигнала только пишет номер сигнала в канал: логирование или
+    запуск потока прямо в нем может зависнуть на блокировке, которую держал
+    прерванный код. Действия выполняет поток signal-watcher. Повторный сигнал
+    остановки прерывает процесс сразу (KeyboardInterrupt в главном потоке).
+    """
+
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+        self._actions = {}
+        self._stopping = False
+        self._thread = None
+
+    def on(self, signum, action, stop=False):
+        """action(signum) в потоке watcher при сигнале signum; stop - сигнал остановки"""
+        self._actions[signum] = (action, stop)
+        signal.signal(signum, self._handle)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="signal-watcher", daemon=True)
+        self._thread.start()
+
+    def _handle(self, signum, frame):
+        if self._actions[signum][1]:
+            if self._stopping:
+                raise KeyboardInterrupt
+            self._stopping = True
+        os.write(self._write_fd, bytes((signum,)))
+
+    def _run(self):
+        while True:
+            for signum in os.read(self._read_fd, 64):
+                try:
+                    self._actions[signum][0](signum)
+                except Exception:
+                    logger.exception(f"Signal {signal.Signals(signum).name} handler failed")
+
+
+def _read_until(sock, done, timeout):
+    """Чтение из канала, пока done(данные) ложно, EOF или timeout; возвращает прочитанное"""
+    deadline = time.monotonic() + timeout
+    data = b''
+    while not done(data):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([sock], [], [], remaining)[0]:
+            break
+        try:
+            chunk = sock.recv(65536)
+        except InterruptedError:
+            continue
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def inherited_socket():
+    """Слушающий сокет, полученный от предыдущего процесса, или None.
+
+    Переменная окружения удаляется: следующий перезапуск передаст свою.
+    """
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is None:
+        return None
+    sock = socket.socket(fileno=int(fd))
+    sock.set_inheritable(False)
+    return sock
+
+
+class Predecessor:
+    """Управляющий канал к предыдущему процессу (в новом процессе)"""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    @classmethod
+    def from_environment(cls):
+        fd = os.environ.pop(CONTROL_FD_ENV, None)
+        if fd is None:
+            return None
+        sock = socket.socket(fileno=int(fd))
+        sock.set_inheritable(False)
+        return cls(sock)
+
+    def ready(self):
+        """Сообщение о готовности; False, если предыдущий процесс уже не ждет"""
+        try:
+            self.sock.sendall(READY)
+            return True
+        except OSError:
+            return False
+
+    def receive_state(self, timeout):
+        """Снимок состояния от предыдущего процесса или None, если его нет"""
+        try:
+            data = _read_until(self.sock, lambda data: False, timeout)
+        finally:
+            self.sock.close()
+        if not data:
+            return None
+        try:
+            return json.loads(data)
+        except ValueError:
+            logger.error("Handoff state is not valid JSON, starting without it")
+            return None
+
+
+class Successor:
+    """Новый процесс сервера (в старом процессе)"""
+
+    def __init__(self, listen_socket, argv=None):
+        self.listen_socket = listen_socket
+        self.argv = argv if argv is not None else [sys.executable] + sys.argv
+        self.process = None
+        self.sock = None
+
+    def start(self, timeout=READY_TIMEOUT):
+        """Запуск и ожидание готовности; False, если новый процесс не готов"""
+        ours, theirs = socket.socketpair()
+        env = dict(os.environ)
+        env[LISTEN_FD_ENV] = str(self.listen_socket.fileno())
+        env[CONTROL_FD_ENV] = str(theirs.fileno())
+        try:
+            self.process = subprocess.Popen(self.argv, env=env,
+                                            pass_fds=(self.listen_socket.fileno(), theirs.fileno()))
+        except OSError as e:
+            logger.error(f"Cannot start new server process: {e}")
+            ours.close()
+            return False
+        finally:
+            theirs.close()
+        self.sock = ours
+        if _read_until(ours, lambda data: READY in data, timeout) == READY:
+            logger.info(f"New server process {self.process.pid} is ready")
+            return True
+        logger.error(f"New server process {self.process.pid} did not become ready, keeping the old one")
+        self.abort()
+        return False
+
+    def hand_over(self, state):
+        """Передача снимка состояния; после нее новый процесс принимает соединения"""
+        try:
+            self.sock.sendall(json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        except OSError as e:
+            logger.error(f"Cannot send state to new server process: {e}")
+        finally:
+            self.sock.close()
+
+    def abort(self):
+        self.sock.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+
+def save_state(path, state):
+    """Запись снимка в файл: через временный файл, доступный только владельцу"""
+    temporary = f"{path}.tmp"
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def load_state(path):
+    """Снимок из файла или None, если файла нет; файл удаляется после чтения.
+
+    Удаление не дает вернуть к жизни сессии, завершенные после загрузки,
+    если следующий запуск пройдет без записи снимка.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    os.remove(path)
+    return state
@@ -1,125 +1,127 @@
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import json
-import uuid
-from datetime import datetime, timedelta
-from urllib.parse import urlparse, parse_qs
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs, unquote
+import argparse
+import gzip
+import hashlib
 import logging
+import math
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import socket
 import sys
 import webbrowser
 import threading
 import time
+import zlib
 
-# Настройка логирования
+from access_log import AccessLog, setup_logging
+from async_server import DRAIN_POLL_INTERVAL, AsyncHTTPServer
+from chat_history import ChatHistoryStore
+from chat_rules import ChatResponder
+from fault_injection import DelayedSender, FaultInjector
+from lifecycle import (Predecessor, SignalWatcher, Successor, inherited_socket, load_state, save_state)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics
+from rate_limit import TokenBucketLimiter
+from request_body import BodyError, RequestParams, content_length, read_body
+from responses import (CONNECTION_CLOSE, CONNECTION_KEEP_ALIVE, HAS_SENDMSG, JOIN_LIMIT, EncodedResponse,
+                       ResponseCache, date_header, encode_headers, encode_json, header_block, send_parts,
+                       status_line)
+from sessions import SessionManager, SessionStore, create_session_store, load_secret
+from text_generator import TextGenerator
+from traffic_capture import TrafficCapture
+from users import DEFAULT_WORK_FACTORS, UserStore
+from validation import compile_validators
+import streaming
+
+# Настройка логирования; run_server переводит запись журнала в фоновый поток
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Хранилище сессий (в памяти)
-active_sessions = {}
+# Журнал доступа: строка на запрос, с выборкой успешных запросов
+access_log = AccessLog()
+log_pipeline = None
+# Запись запросов в NDJSON для benchmarks/replay.py (--capture-file)
+traffic_capture = None
 
-class APIHandler(BaseHTTPRequestHandler):
-    
-    def _set_cors_headers(self):
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS, PUT, DELETE')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self._set_cors_headers()
-        self.end_headers()
-    
-    def _send_response(self, data, status_code=200, content_type='application/json'):
-        self.send_response(status_code)
-        self.send_header('Content-Type', content_type)
-        self._set_cors_headers()
-        self.end_headers()
-        if content_type == 'application/json':
-            self.wfile.write(json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'))
-        else:
-            self.wfile.write(data.encode('utf-8'))
-    
-    def _get_form_data(self):
-        content_length = int(self.headers.get('Content-Length', 0))
-        if content_length == 0:
-            return {}
-        
-        post_data = self.rfile.read(content_length).decode('utf-8')
-        if self.headers.get('Content-Type') == 'application/x-www-form-urlencoded':
-            return parse_qs(post_data)
-        return {}
-    
-    def _get_session(self, token):
-        if token not in active_sessions:
-            return None
-        session = active_sessions[token]
-        if datetime.now() > session["expiresAt"]:
-            del active_sessions[token]
-            return None
-        return session
-    
-    def _require_auth(self, form_data):
-        session_token = form_data.get('sessionToken', [None])[0]
-        if not session_token or not self._get_session(session_token):
-            self._send_response({"error": "Invalid session"}, 401)
-            return False
-        return True
+# Пользователи и хеши паролей; хранилище создает run_server (файл --users-file или
+# встроенный пользователь): хеш пароля не считается при каждом import main
+user_store = None
 
-    def do_GET(self):
-        parsed_path = urlparse(self.path)
-        
-        if parsed_path.path == '/':
-            self._send_swagger_ui()
-        
-        elif parsed_path.path == '/swagger.json':
-            self._send_swagger_spec()
-        
-        elif parsed_path.path == '/api/health':
-            self._send_response({"status": "OK"})
-        
-        elif parsed_path.path == '/api/info':
-            self._send_response({
-                "name": "AI Service", 
-                "version": "1.0.0"
-            })
-        
-        elif parsed_path.path == '/api/Root':
-            self._send_response({"message": "Service API"})
-        
-        elif parsed_path.path == '/api/profile':
-            # Проверяем сессию через query параметры
-            query_params = parse_qs(parsed_path.query)
-            session_token = query_params.get('sessionToken', [None])[0]
-            if not session_token or not self._get_session(session_token):
-                self._send_response({"error": "Invalid session"}, 401)
-                return
-            
-            self._send_response({
-                "username": "Vitaliy Shutenko",
-                "email": "v_shutenko@example.com",
-                "role": "User"
-            })
-        
-        elif parsed_path.path == '/api/chat/history':
-            # Проверяем сессию через query параметры
-            query_params = parse_qs(parsed_path.query)
-            session_token = query_params.get('sessionToken', [None])[0]
-            if not session_token or not self._get_session(session_token):
-                self._send_response({"error": "Invalid session"}, 401)
-                return
-            
-            self._send_response({
-                "messages": [
-                    {"id": 1, "text": "Hello, how are you?", "type": "user", "timestamp": "2024-01-15T10:30:00"},
-                    {"id": 2, "text": "I'm doing well, thank you!", "type": "assistant", "timestamp": "2024-01-15T10:30:05"}
-                ]
-            })
-        
-        else:
-            self._send_response({"error": "Endpoint not found"}, 404)
+# Хранилище сессий (в памяти); в режиме prefork заменяется прокси к общему хранилищу
+session_store = SessionStore(ttl=3600, max_sessions=100000)
 
-    def _send_swagger_ui(self):
-        """Отправка Swagger UI с включенной кнопкой Try it out"""
-        swagger_html = """
+session_backend = 'memory'
+
+# История сообщений чата по сессиям; в режиме prefork - прокси к общему хранилищу
+chat_history = ChatHistoryStore(max_messages=10000, max_sessions=100000)
+SessionManager.register('ChatHistoryStore', ChatHistoryStore)
+
+# Правила ответов чата; файл перечитывается при изменении
+CHAT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chat_rules.json')
+chat_responder = ChatResponder(CHAT_RULES_PATH)
+
+# Генератор длинных ответов чата по корпусу (text_generator.py)
+CHAT_CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chat_corpus.txt')
+text_generator = TextGenerator.load(CHAT_CORPUS_PATH)
+# Длина ответа, если запрос не задает length: 0 - ответ по правилам
+answer_length = 0
+MAX_ANSWER_LENGTH = 16 * 1024 * 1024
+# Ответ генератора попадает в историю чата только началом такой длины: иначе
+# нагрузка с --answer-length держала бы в памяти историй мегабайты на сообщение
+HISTORY_ANSWER_LENGTH = 4096
+# Настройки сессии по умолчанию в единицах API: temperature 100 = 1.0, topP 100 = 1.0
+DEFAULT_TEMPERATURE = 100
+DEFAULT_TOP_P = 100
+
+# Имитация задержек и ошибок AI-бэкенда; профиль задается --fault-profile и /api/admin/faults
+fault_injector = FaultInjector()
+# Профиль меняют только пользователи с этой ролью или любой вошедший при --fault-admin-any-user
+ADMIN_ROLE = 'Admin'
+fault_admin_any_user = False
+
+# Ограничение частоты запросов с одного адреса и в одной сессии; None - без ограничения
+ip_limiter = None
+session_limiter = None
+
+
+def _or_nan(value):
+    return value if value is not None else 'NaN'
+
+
+def _limiter_stat(name):
+    limiters = [limiter for limiter in (ip_limiter, session_limiter) if limiter is not None]
+    return sum(limiter.stats()[name] for limiter in limiters)
+
+
+# Метрики запросов для GET /metrics; запись идет в шард текущего потока
+metrics = Metrics()
+# Для подписанных токенов число сессий неизвестно: NaN
+metrics.add_gauge('sessions_active', "Live sessions in the session store.",
+                  lambda: _or_nan(session_store.stats()['live']))
+metrics.add_gauge('response_cache_entries', "Encoded JSON responses kept in the response cache.",
+                  lambda: len(response_cache))
+metrics.add_counter('rate_limit_ip_rejected_total', "Requests rejected with 429 by the per-address limit.",
+                    lambda: ip_limiter.stats()['limited'] if ip_limiter is not None else 0)
+metrics.add_counter('rate_limit_session_rejected_total', "Requests rejected with 429 by the per-session limit.",
+                    lambda: session_limiter.stats()['limited'] if session_limiter is not None else 0)
+metrics.add_counter('faults_injected_errors_total', "Error responses injected by the fault profile.",
+                    lambda: fault_injector.injected_errors)
+metrics.add_counter('faults_delayed_responses_total', "Responses delayed or dripped by the fault profile.",
+                    lambda: fault_injector.delayed_responses)
+metrics.add_gauge('rate_limit_buckets', "Token buckets held by the rate limiters.",
+                  lambda: _limiter_stat('buckets'))
+metrics.add_counter('log_messages_dropped_total', "Log messages dropped because the log queue was full.",
+                    lambda: log_pipeline.dropped if log_pipeline is not None else 0)
+metrics.add_counter('traffic_capture_dropped_total', "Requests not captured because the capture queue was full.",
+                    lambda: traffic_capture.dropped if traffic_capture is not None else 0)
+
+# Swagger UI: страница статична, поэтому хранится как константа
+SWAGGER_UI_HTML = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -162,540 +164,624 @@ class APIHandler(BaseHTTPRequestHandler):
 </body>
 </html>
         """
-        self._send_response(swagger_html, content_type='text/html')
 
-    def _send_swagger_spec(self):
-        """Swagger спецификация как в C# версии"""
-        swagger_spec = {
-            "openapi": "3.0.0",
-            "info": {
-                "title": "🔐 Ai ecosystem test API",
-                "version": "1.0.1",
-                "description": "<h3><strong>API для аутентификации и проверки функций</strong></h3>" +
-                              "<div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; border-left: 4px solid #3498db;'>" +
-                              "<h3 style='color: #2c3e50; margin-top: 0;'>Функциональность:</h3>" +
-                              "<ul style='color: #7f8c8d;'>" +
-                              "<strong><li>Аутентификация (Auth)</li></strong>" +
-                              "<li>Вход пользователя в систему</li>" +
-                              "<li>Выход пользователя из системы</li>" +
-                              "<li>Проверка валидности сессии</li><br>" +
-                              "<strong><li>Чат (Chat)</li></strong>" +
-                              "<li>Отправка сообщения в AI-чат</li>" +
-                              "<li>Очистка истории чата</li>" +
-                              "<li>Копирование текста ответа</li>" +
-                              "<li>Обновление сообщения</li>" +
-                              "<li>Получение истории чата</li><br>" +
-                              "<strong><li>Настройки модели (Settings)</li></strong>" +
-                              "<li>Установка параметра температуры AI-модели</li>" +
-                              "<li>Установка параметра Top-P AI-модели</li><br>" +
-                              "<strong><li>Профиль (Profile)</li></strong>" +
-                              "<li>Получение информации о профиле</li><br>" +
-                              "<strong><li>Системные (System)</li></strong>" +
-                              "<li>Проверка работоспособности сервера </li>" +
-                              "<li>Получение информации о сервере</li>" +
-                              "</ul>" +
-                              "</div>"
-            },
-            "servers": [
-                {
-                    "url": f"http://localhost:{self.server.server_port}",
-                    "description": "Локальный сервер"
-                }
-            ],
-            "paths": {
-                "/api/auth/login": {
-                    "post": {
-                        "tags": ["Auth"],
-                        "summary": "Вход пользователя в систему",
-                        "requestBody": {
+
+def build_swagger_spec(port):
+    """Swagger спецификация как в C# версии"""
+    spec = {
+        "openapi": "3.0.0",
+        "info": {
+            "title": "🔐 Ai ecosystem test API",
+            "version": "1.0.1",
+            "description": "<h3><strong>API для аутентификации и проверки функций</strong></h3>" +
+                          "<div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; border-left: 4px solid #3498db;'>" +
+                          "<h3 style='color: #2c3e50; margin-top: 0;'>Функциональность:</h3>" +
+                          "<ul style='color: #7f8c8d;'>" +
+                          "<strong><li>Аутентификация (Auth)</li></strong>" +
+                          "<li>Вход пользователя в систему</li>" +
+                          "<li>Выход пользователя из системы</li>" +
+                          "<li>Проверка валидности сессии</li><br>" +
+                          "<strong><li>Чат (Chat)</li></strong>" +
+                          "<li>Отправка сообщения в AI-чат</li>" +
+                          "<li>Очистка истории чата</li>" +
+                          "<li>Копирование текста ответа</li>" +
+                          "<li>Обновление сообщения</li>" +
+                          "<li>Получение истории чата</li><br>" +
+                          "<strong><li>Настройки модели (Settings)</li></strong>" +
+                          "<li>Установка параметра температуры AI-модели</li>" +
+                          "<li>Установка параметра Top-P AI-модели</li><br>" +
+                          "<strong><li>Профиль (Profile)</li></strong>" +
+                          "<li>Получение информации о профиле</li><br>" +
+                          "<strong><li>Системные (System)</li></strong>" +
+                          "<li>Проверка работоспособности сервера </li>" +
+                          "<li>Получение информации о сервере</li>" +
+                          "</ul>" +
+                          "</div>"
+        },
+        "servers": [
+            {
+                "url": f"http://localhost:{port}",
+                "description": "Локальный сервер"
+            }
+        ],
+        "paths": {
+            "/api/auth/login": {
+                "post": {
+                    "tags": ["Auth"],
+                    "summary": "Вход пользователя в систему",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "Login": {"type": "string"},
+                                        "Password": {"type": "string"}
+                                    },
+                                    "required": ["Login", "Password"]
+                                }
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Успешный вход",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "Login": {"type": "string"},
-                                            "Password": {"type": "string"}
-                                        },
-                                        "required": ["Login", "Password"]
+                                        "$ref": "#/components/schemas/LoginResponse"
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "Успешный вход",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/LoginResponse"
-                                        }
-                                    }
-                                }
-                            },
-                            "401": {
-                                "description": "Неверные учетные данные",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                        "401": {
+                            "description": "Неверные учетные данные",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/auth/logout": {
-                    "post": {
-                        "tags": ["Auth"],
-                        "summary": "Выход пользователя из системы",
-                        "requestBody": {
+                }
+            },
+            "/api/auth/logout": {
+                "post": {
+                    "tags": ["Auth"],
+                    "summary": "Выход пользователя из системы",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["sessionToken"]
+                                }
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Успешный выход",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["sessionToken"]
+                                        "$ref": "#/components/schemas/LogoutResponse"
                                     }
                                 }
                             }
-                        },
-                        "responses": {
-                            "200": {
-                                "description": "Успешный выход",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/LogoutResponse"
-                                        }
-                                    }
+                        }
+                    }
+                }
+            },
+            "/api/auth/check-session": {
+                "post": {
+                    "tags": ["Auth"],
+                    "summary": "Проверка валидности сессии",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["sessionToken"]
                                 }
                             }
                         }
-                    }
-                },
-                "/api/auth/check-session": {
-                    "post": {
-                        "tags": ["Auth"],
-                        "summary": "Проверка валидности сессии",
-                        "requestBody": {
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Информация о сессии",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["sessionToken"]
+                                        "$ref": "#/components/schemas/SessionInfoResponse"
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "Информация о сессии",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/SessionInfoResponse"
-                                        }
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
+                            }
+                        }
+                    }
+                }
+            },
+            "/api/chat/send": {
+                "post": {
+                    "tags": ["Chat"],
+                    "summary": "Отправка сообщения в AI-чат",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "message": {"type": "string"},
+                                        "sessionToken": {"type": "string"},
+                                        "stream": {
+                                            "type": "string",
+                                            "enum": ["sse", "chunked"],
+                                            "description": "Потоковый ответ: sse (text/event-stream) или chunked (text/plain)"
+                                        },
+                                        "tokenDelayMs": {"type": "number", "minimum": 0, "maximum": 10000},
+                                        "chunkSize": {"type": "integer", "minimum": 1, "maximum": 4096},
+                                        "length": {
+                                            "type": "integer",
+                                            "minimum": 0,
+                                            "maximum": MAX_ANSWER_LENGTH,
+                                            "description": "Длина ответа генератора в символах (temperature и "
+                                                           "top-p сессии); 0 - ответ по правилам"
+                                        },
+                                        "seed": {
+                                            "type": "integer",
+                                            "minimum": 0,
+                                            "description": "Зерно генератора: тот же seed дает тот же ответ"
                                         }
-                                    }
+                                    },
+                                    "required": ["message", "sessionToken"]
                                 }
                             }
                         }
-                    }
-                },
-                "/api/chat/send": {
-                    "post": {
-                        "tags": ["Chat"],
-                        "summary": "Отправка сообщения в AI-чат",
-                        "requestBody": {
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Ответ AI",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "message": {"type": "string"},
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["message", "sessionToken"]
+                                        "$ref": "#/components/schemas/ChatResponse"
                                     }
+                                },
+                                "text/event-stream": {
+                                    "schema": {"type": "string"}
+                                },
+                                "text/plain": {
+                                    "schema": {"type": "string"}
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "Ответ AI",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ChatResponse"
-                                        }
-                                    }
-                                }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/chat/clear": {
-                    "post": {
-                        "tags": ["Chat"],
-                        "summary": "Очистка истории чата",
-                        "requestBody": {
+                }
+            },
+            "/api/chat/clear": {
+                "post": {
+                    "tags": ["Chat"],
+                    "summary": "Очистка истории чата",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["sessionToken"]
+                                }
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "История очищена",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["sessionToken"]
+                                        "$ref": "#/components/schemas/ClearResponse"
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "История очищена",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ClearResponse"
-                                        }
-                                    }
-                                }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/chat/copy": {
-                    "post": {
-                        "tags": ["Chat"],
-                        "summary": "Копирование текста ответа",
-                        "requestBody": {
+                }
+            },
+            "/api/chat/copy": {
+                "post": {
+                    "tags": ["Chat"],
+                    "summary": "Копирование текста ответа",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "text": {"type": "string"},
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["text", "sessionToken"]
+                                }
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Текст скопирован",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "text": {"type": "string"},
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["text", "sessionToken"]
+                                        "$ref": "#/components/schemas/CopyResponse"
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "Текст скопирован",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/CopyResponse"
-                                        }
-                                    }
-                                }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/chat/update": {
-                    "put": {
-                        "tags": ["Chat"],
-                        "summary": "Обновление сообщения в чате",
-                        "requestBody": {
+                }
+            },
+            "/api/chat/update": {
+                "put": {
+                    "tags": ["Chat"],
+                    "summary": "Обновление сообщения в чате",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "messageId": {"type": "integer"},
+                                        "newMessage": {"type": "string"},
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["messageId", "newMessage", "sessionToken"]
+                                }
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Сообщение обновлено",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "messageId": {"type": "string"},
-                                            "newMessage": {"type": "string"},
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["messageId", "newMessage", "sessionToken"]
+                                        "$ref": "#/components/schemas/UpdateResponse"
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "Сообщение обновлено",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/UpdateResponse"
-                                        }
+                        "404": {
+                            "description": "Сообщение не найдено",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/chat/history": {
-                    "get": {
-                        "tags": ["Chat"],
-                        "summary": "Получение истории чата",
-                        "parameters": [
-                            {
-                                "name": "sessionToken",
-                                "in": "query",
-                                "required": True,
+                }
+            },
+            "/api/chat/message": {
+                "delete": {
+                    "tags": ["Chat"],
+                    "summary": "Удаление сообщения из чата",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
                                 "schema": {
-                                    "type": "string"
-                                }
-                            }
-                        ],
-                        "responses": {
-                            "200": {
-                                "description": "История чата",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ChatHistoryResponse"
-                                        }
-                                    }
-                                }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
-                                    }
+                                    "type": "object",
+                                    "properties": {
+                                        "messageId": {"type": "integer"},
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["messageId", "sessionToken"]
                                 }
                             }
                         }
-                    }
-                },
-                "/api/settings/temperature": {
-                    "post": {
-                        "tags": ["Settings"],
-                        "summary": "Установка параметра температуры AI-модели",
-                        "requestBody": {
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Сообщение удалено",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "value": {"type": "integer", "minimum": 0, "maximum": 200},
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["value", "sessionToken"]
+                                        "$ref": "#/components/schemas/DeleteResponse"
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "Температура установлена",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/TemperatureResponse"
-                                        }
+                        "404": {
+                            "description": "Сообщение не найдено",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/settings/topp": {
-                    "post": {
-                        "tags": ["Settings"],
-                        "summary": "Установка параметра Top-P AI-модели",
-                        "requestBody": {
+                }
+            },
+            "/api/chat/message/{messageId}": {
+                "delete": {
+                    "tags": ["Chat"],
+                    "summary": "Удаление сообщения из чата по идентификатору в пути",
+                    "parameters": [
+                        {
+                            "name": "messageId",
+                            "in": "path",
+                            "required": True,
+                            "schema": {
+                                "type": "integer"
+                            }
+                        }
+                    ],
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["sessionToken"]
+                                }
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Сообщение удалено",
                             "content": {
-                                "application/x-www-form-urlencoded": {
+                                "application/json": {
                                     "schema": {
-                                        "type": "object",
-                                        "properties": {
-                                            "value": {"type": "integer", "minimum": 0, "maximum": 100},
-                                            "sessionToken": {"type": "string"}
-                                        },
-                                        "required": ["value", "sessionToken"]
+                                        "$ref": "#/components/schemas/DeleteResponse"
                                     }
                                 }
                             }
                         },
-                        "responses": {
-                            "200": {
-                                "description": "Top-P установлен",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/TopPResponse"
-                                        }
+                        "404": {
+                            "description": "Сообщение не найдено",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/profile": {
-                    "get": {
-                        "tags": ["Profile"],
-                        "summary": "Получение информации о профиле пользователя",
-                        "parameters": [
-                            {
-                                "name": "sessionToken",
-                                "in": "query",
-                                "required": True,
-                                "schema": {
-                                    "type": "string"
-                                }
+                }
+            },
+            "/api/chat/history": {
+                "get": {
+                    "tags": ["Chat"],
+                    "summary": "Получение истории чата",
+                    "parameters": [
+                        {
+                            "name": "sessionToken",
+                            "in": "query",
+                            "required": True,
+                            "schema": {
+                                "type": "string"
                             }
-                        ],
-                        "responses": {
-                            "200": {
-                                "description": "Информация о профиле",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ProfileResponse"
-                                        }
+                        },
+                        {
+                            "name": "limit",
+                            "in": "query",
+                            "required": False,
+                            "description": "Размер страницы",
+                            "schema": {
+                                "type": "integer",
+                                "minimum": 1,
+                                "maximum": 1000,
+                                "default": 50
+                            }
+                        },
+                        {
+                            "name": "after",
+                            "in": "query",
+                            "required": False,
+                            "description": "Курсор: id последнего полученного сообщения (nextCursor)",
+                            "schema": {
+                                "type": "integer"
+                            }
+                        }
+                    ],
+                    "responses": {
+                        "200": {
+                            "description": "История чата",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ChatHistoryResponse"
                                     }
                                 }
-                            },
-                            "401": {
-                                "description": "Неверная сессия",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ErrorResponse"
-                                        }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/health": {
-                    "get": {
-                        "tags": ["System"],
-                        "summary": "Проверка работоспособности сервера",
-                        "responses": {
-                            "200": {
-                                "description": "Статус сервера",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/HealthResponse"
-                                        }
-                                    }
+                }
+            },
+            "/api/settings/temperature": {
+                "post": {
+                    "tags": ["Settings"],
+                    "summary": "Установка параметра температуры AI-модели",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "value": {
+                                            "type": "integer",
+                                            "minimum": 0,
+                                            "maximum": 200,
+                                            "description": "Температура сессии в сотых: 100 = 1.0, 0 - "
+                                                           "всегда самое вероятное слово"
+                                        },
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["value", "sessionToken"]
                                 }
                             }
                         }
-                    }
-                },
-                "/api/info": {
-                    "get": {
-                        "tags": ["System"],
-                        "summary": "Получение информации о сервере",
-                        "responses": {
-                            "200": {
-                                "description": "Информация о сервере",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "$ref": "#/components/schemas/ServerInfoResponse"
-                                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Температура установлена",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/TemperatureResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
                         }
                     }
-                },
-                "/api/Root": {
-                    "get": {
-                        "tags": ["System"],
-                        "summary": "Корневой эндпоинт",
-                        "responses": {
-                            "200": {
-                                "description": "Сообщение сервиса",
-                                "content": {
-                                    "application/json": {
-                                        "schema": {
-                                            "type": "object",
-                                            "properties": {
-                                                "message": {"type": "string"}
-                                            }
-                                        }
+                }
+            },
+            "/api/settings/topp": {
+                "post": {
+                    "tags": ["Settings"],
+                    "summary": "Установка параметра Top-P AI-модели",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "value": {
+                                            "type": "integer",
+                                            "minimum": 0,
+                                            "maximum": 100,
+                                            "description": "Top-P сессии в процентах вероятности"
+                                        },
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["value", "sessionToken"]
+                                }
+                            }
+                        }
+                    },
+                    "responses": {
+                        "200": {
+                            "description": "Top-P установлен",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/TopPResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
                                     }
                                 }
                             }
@@ -703,314 +789,2052 @@ class APIHandler(BaseHTTPRequestHandler):
                     }
                 }
             },
-            "components": {
-                "schemas": {
-                    "LoginResponse": {
-                        "type": "object",
-                        "properties": {
-                            "message": {"type": "string"},
-                            "redirectUrl": {"type": "string"},
-                            "sessionToken": {"type": "string"}
+            "/api/profile": {
+                "get": {
+                    "tags": ["Profile"],
+                    "summary": "Получение информации о профиле пользователя",
+                    "parameters": [
+                        {
+                            "name": "sessionToken",
+                            "in": "query",
+                            "required": True,
+                            "schema": {
+                                "type": "string"
+                            }
                         }
-                    },
-                    "ErrorResponse": {
-                        "type": "object",
-                        "properties": {
-                            "error": {"type": "string"}
+                    ],
+                    "responses": {
+                        "200": {
+                            "description": "Информация о профиле",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ProfileResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "404": {
+                            "description": "Пользователь сессии удален из файла пользователей",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "LogoutResponse": {
-                        "type": "object",
-                        "properties": {
-                            "message": {"type": "string"}
+                    }
+                }
+            },
+            "/api/health": {
+                "get": {
+                    "tags": ["System"],
+                    "summary": "Проверка работоспособности сервера",
+                    "responses": {
+                        "200": {
+                            "description": "Статус сервера",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/HealthResponse"
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "SessionInfoResponse": {
-                        "type": "object",
-                        "properties": {
-                            "valid": {"type": "boolean"},
-                            "userLogin": {"type": "string"},
-                            "expiresAt": {"type": "string", "format": "date-time"}
+                    }
+                }
+            },
+            "/api/info": {
+                "get": {
+                    "tags": ["System"],
+                    "summary": "Получение информации о сервере",
+                    "responses": {
+                        "200": {
+                            "description": "Информация о сервере",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ServerInfoResponse"
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "ChatResponse": {
-                        "type": "object",
-                        "properties": {
-                            "answer": {"type": "string"}
+                    }
+                }
+            },
+            "/api/sessions/stats": {
+                "get": {
+                    "tags": ["System"],
+                    "summary": "Статистика хранилища сессий",
+                    "responses": {
+                        "200": {
+                            "description": "Число активных сессий и счетчики удалений",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/SessionStatsResponse"
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "TemperatureResponse": {
-                        "type": "object",
-                        "properties": {
-                            "value": {"type": "integer"}
+                    }
+                }
+            },
+            "/metrics": {
+                "get": {
+                    "tags": ["System"],
+                    "summary": "Метрики в формате Prometheus",
+                    "responses": {
+                        "200": {
+                            "description": "Счетчики и гистограммы задержек по маршрутам, запросы в работе, "
+                                           "отправленные байты, число сессий",
+                            "content": {
+                                "text/plain": {
+                                    "schema": {"type": "string"}
+                                }
+                            }
                         }
-                    },
-                    "TopPResponse": {
-                        "type": "object",
-                        "properties": {
-                            "value": {"type": "integer"}
+                    }
+                }
+            },
+            "/api/admin/faults": {
+                "get": {
+                    "tags": ["Admin"],
+                    "summary": "Текущий профиль задержек и ошибок",
+                    "parameters": [
+                        {
+                            "name": "sessionToken",
+                            "in": "query",
+                            "required": True,
+                            "schema": {
+                                "type": "string"
+                            }
                         }
-                    },
-                    "ClearResponse": {
-                        "type": "object",
-                        "properties": {
-                            "message": {"type": "string"}
+                    ],
+                    "responses": {
+                        "200": {
+                            "description": "Профиль (null - сбои не имитируются) и счетчики",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/FaultProfileResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "CopyResponse": {
-                        "type": "object",
-                        "properties": {
-                            "message": {"type": "string"}
+                    }
+                },
+                "put": {
+                    "tags": ["Admin"],
+                    "summary": "Замена профиля задержек и ошибок",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "profile": {
+                                            "type": "string",
+                                            "description": "Профиль в JSON: {\"routes\": {\"POST /api/chat/send\": "
+                                                           "{\"latency\": {...}, \"errors\": [...], \"drip\": {...}}}}"
+                                        },
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["profile", "sessionToken"]
+                                }
+                            }
                         }
                     },
-                    "UpdateResponse": {
-                        "type": "object",
-                        "properties": {
-                            "message": {"type": "string"},
-                            "messageId": {"type": "string"},
-                            "newMessage": {"type": "string"}
+                    "responses": {
+                        "200": {
+                            "description": "Профиль применен",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/AdminResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "400": {
+                            "description": "Некорректный профиль",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "403": {
+                            "description": "Нет роли Admin (и сервер запущен без --fault-admin-any-user)",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "ChatHistoryResponse": {
-                        "type": "object",
-                        "properties": {
-                            "messages": {
-                                "type": "array",
-                                "items": {
+                    }
+                },
+                "delete": {
+                    "tags": ["Admin"],
+                    "summary": "Отключение имитации сбоев",
+                    "requestBody": {
+                        "content": {
+                            "application/x-www-form-urlencoded": {
+                                "schema": {
                                     "type": "object",
                                     "properties": {
-                                        "id": {"type": "integer"},
-                                        "text": {"type": "string"},
-                                        "type": {"type": "string"},
-                                        "timestamp": {"type": "string", "format": "date-time"}
-                                    }
+                                        "sessionToken": {"type": "string"}
+                                    },
+                                    "required": ["sessionToken"]
                                 }
                             }
                         }
                     },
-                    "ProfileResponse": {
-                        "type": "object",
-                        "properties": {
-                            "username": {"type": "string"},
-                            "email": {"type": "string"},
-                            "role": {"type": "string"}
+                    "responses": {
+                        "200": {
+                            "description": "Профиль удален",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/AdminResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "401": {
+                            "description": "Неверная сессия",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
+                        },
+                        "403": {
+                            "description": "Нет роли Admin (и сервер запущен без --fault-admin-any-user)",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "$ref": "#/components/schemas/ErrorResponse"
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "HealthResponse": {
-                        "type": "object",
-                        "properties": {
-                            "status": {"type": "string"}
+                    }
+                }
+            },
+            "/api/Root": {
+                "get": {
+                    "tags": ["System"],
+                    "summary": "Корневой эндпоинт",
+                    "responses": {
+                        "200": {
+                            "description": "Сообщение сервиса",
+                            "content": {
+                                "application/json": {
+                                    "schema": {
+                                        "type": "object",
+                                        "properties": {
+                                            "message": {"type": "string"}
+                                        }
+                                    }
+                                }
+                            }
                         }
-                    },
-                    "ServerInfoResponse": {
-                        "type": "object",
-                        "properties": {
-                            "name": {"type": "string"},
-                            "version": {"type": "string"}
+                    }
+                }
+            }
+        },
+        "components": {
+            "schemas": {
+                "LoginResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string"},
+                        "redirectUrl": {"type": "string"},
+                        "sessionToken": {"type": "string"}
+                    }
+                },
+                "ErrorResponse": {
+                    "type": "object",
+                    "properties": {
+                        "error": {"type": "string"},
+                        "details": {
+                            "type": "array",
+                            "description": "Ошибки проверки параметров (только в ответах 400 на некорректные поля)",
+                            "items": {"$ref": "#/components/schemas/ValidationProblem"}
                         }
                     }
+                },
+                "ValidationProblem": {
+                    "type": "object",
+                    "properties": {
+                        "field": {"type": "string"},
+                        "in": {"type": "string", "enum": ["query", "path", "body"]},
+                        "message": {"type": "string"}
+                    }
+                },
+                "LogoutResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string"}
+                    }
+                },
+                "SessionInfoResponse": {
+                    "type": "object",
+                    "properties": {
+                        "valid": {"type": "boolean"},
+                        "userLogin": {"type": "string"},
+                        "expiresAt": {"type": "string", "format": "date-time"}
+                    }
+                },
+                "ChatResponse": {
+                    "type": "object",
+                    "properties": {
+                        "answer": {"type": "string"},
+                        "seed": {"type": "integer", "description": "Зерно сгенерированного ответа"}
+                    }
+                },
+                "TemperatureResponse": {
+                    "type": "object",
+                    "properties": {
+                        "value": {"type": "integer"}
+                    }
+                },
+                "TopPResponse": {
+                    "type": "object",
+                    "properties": {
+                        "value": {"type": "integer"}
+                    }
+                },
+                "ClearResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string"}
+                    }
+                },
+                "CopyResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string"}
+                    }
+                },
+                "UpdateResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string"},
+                        "messageId": {"type": "integer"},
+                        "newMessage": {"type": "string"}
+                    }
+                },
+                "DeleteResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string"},
+                        "messageId": {"type": "integer"}
+                    }
+                },
+                "ChatHistoryResponse": {
+                    "type": "object",
+                    "properties": {
+                        "messages": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "id": {"type": "integer"},
+                                    "text": {"type": "string"},
+                                    "type": {"type": "string"},
+                                    "timestamp": {"type": "string", "format": "date-time"}
+                                }
+                            }
+                        },
+                        "nextCursor": {"type": "integer", "nullable": True},
+                        "hasMore": {"type": "boolean"}
+                    }
+                },
+                "ProfileResponse": {
+                    "type": "object",
+                    "properties": {
+                        "username": {"type": "string"},
+                        "email": {"type": "string", "nullable": True},
+                        "role": {"type": "string"}
+                    }
+                },
+                "HealthResponse": {
+                    "type": "object",
+                    "properties": {
+                        "status": {"type": "string"}
+                    }
+                },
+                "SessionStatsResponse": {
+                    "type": "object",
+                    "properties": {
+                        "live": {"type": "integer", "nullable": True},
+                        "maxSessions": {"type": "integer", "nullable": True},
+                        "created": {"type": "integer"},
+                        "expired": {"type": "integer"},
+                        "evicted": {"type": "integer"},
+                        "removed": {"type": "integer"}
+                    }
+                },
+                "FaultProfileResponse": {
+                    "type": "object",
+                    "properties": {
+                        "profile": {"type": "object", "nullable": True},
+                        "injectedErrors": {"type": "integer"},
+                        "delayedResponses": {"type": "integer"}
+                    }
+                },
+                "AdminResponse": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string"}
+                    }
+                },
+                "ServerInfoResponse": {
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string"},
+                        "version": {"type": "string"}
+                    }
                 }
             }
         }
-        self._send_response(swagger_spec)
+    }
+    # Тело принимается и формой, и объектом JSON с теми же полями
+    for operations in spec["paths"].values():
+        for operation in operations.values():
+            content = operation.get("requestBody", {}).get("content", {})
+            if "application/x-www-form-urlencoded" in content:
+                content.setdefault("application/json", content["application/x-www-form-urlencoded"])
+            # Параметры проверяются по этой же спецификации (validation.py)
+            if content or operation.get("parameters"):
+                operation["responses"].setdefault("400", {
+                    "description": "Параметры не прошли проверку",
+                    "content": {"application/json": {"schema": {"$ref": "#/components/schemas/ErrorResponse"}}}
+                })
+    return spec
 
-    def do_POST(self):
-        parsed_path = urlparse(self.path)
-        form_data = self._get_form_data()
-        
+
+class PrecomputedResponse:
+    """Неизменяемый ответ, сериализованный и сжатый один раз при старте сервера.
+
+    Хранит тело без сжатия, в gzip и в deflate (формат zlib, RFC 9110) и
+    сильный ETag для каждого варианта: у разных кодировок разные байты.
+    """
+
+    ENCODINGS = ('gzip', 'deflate', 'identity')
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {'identity': body}
+        compressed = {
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+            'deflate': zlib.compress(body, 9),
+        }
+        for encoding, data in compressed.items():
+            # Сжатый вариант хранится, только если он действительно меньше
+            if len(data) < len(body):
+                self.bodies[encoding] = data
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+            for encoding in self.bodies
+        }
+        self._known_etags = frozenset(self.etags.values())
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+    def choose_encoding(self, accept_encoding):
+        """Выбор кодировки по заголовку Accept-Encoding с учетом q-значений"""
+        if not accept_encoding:
+            return 'identity'
+        weights = {}
+        for item in accept_encoding.split(','):
+            name, _, params = item.strip().partition(';')
+            name = name.strip().lower()
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            weights[name] = quality
+        wildcard = weights.get('*')
+        best, best_quality = 'identity', 0.0
+        # Порядок ENCODINGS задает предпочтение при равных q
+        for encoding in self.ENCODINGS:
+            if encoding not in self.bodies:
+                continue
+            if encoding in weights:
+                quality = weights[encoding]
+            elif wildcard is not None:
+                quality = wildcard
+            else:
+                quality = 1.0 if encoding == 'identity' else 0.0
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def matches(self, if_none_match):
+        """Проверка заголовка If-None-Match (слабое сравнение, RFC 9110 13.1.2)"""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag in self._known_etags:
+                return True
+        return False
+
+
+def attach_precomputed_responses(httpd):
+    """Сборка Swagger UI и спецификации один раз на сервер"""
+    httpd.swagger_ui = PrecomputedResponse(SWAGGER_UI_HTML.encode('utf-8'), 'text/html; charset=utf-8')
+    httpd.swagger_spec = PrecomputedResponse.from_json(build_swagger_spec(httpd.server_port))
+
+
+class Route:
+    """Описание маршрута: обработчик и требования к запросу.
+
+    validator - проверка параметров, скомпилированная из спецификации
+    (attach_validators); None - проверять нечего.
+    """
+
+    __slots__ = ('method', 'path', 'handler', 'auth', 'validator')
+
+    def __init__(self, method, path, handler, auth=False):
+        self.method = method
+        self.path = path
+        self.handler = handler
+        self.auth = auth
+        self.validator = None
+
+
+class Router:
+    """Таблица маршрутов (метод, путь) -> Route.
+
+    Статические пути ищутся одним обращением к словарю. Пути с параметрами
+    вида /api/chat/message/{messageId} хранятся в дереве по сегментам пути,
+    поэтому поиск не зависит от общего числа маршрутов.
+    """
+
+    def __init__(self):
+        self._static = {}
+        # Узел дерева: [литеральные сегменты, (имя параметра, узел), {метод: Route}]
+        self._tree = [{}, None, None]
+
+    def add(self, method, path, handler, auth=False):
+        route = Route(method, path, handler, auth)
+        if '{' not in path:
+            self._static.setdefault(path, {})[method] = route
+            return route
+        node = self._tree
+        for segment in path.strip('/').split('/'):
+            if segment.startswith('{') and segment.endswith('}'):
+                name = segment[1:-1]
+                if node[1] is None:
+                    node[1] = (name, [{}, None, None])
+                elif node[1][0] != name:
+                    raise ValueError(f"Conflicting path parameter names in {path}")
+                node = node[1][1]
+            else:
+                node = node[0].setdefault(segment, [{}, None, None])
+        if node[2] is None:
+            node[2] = {}
+        node[2][method] = route
+        return route
+
+    def routes(self):
+        """Все маршруты таблицы"""
+        for methods in self._static.values():
+            yield from methods.values()
+        stack = [self._tree]
+        while stack:
+            node = stack.pop()
+            stack.extend(node[0].values())
+            if node[1] is not None:
+                stack.append(node[1][1])
+            if node[2] is not None:
+                yield from node[2].values()
+
+    def resolve(self, method, path):
+        """Поиск маршрута.
+
+        Возвращает (Route, параметры пути). Если путь известен, но метод не
+        поддерживается, возвращает (None, список допустимых методов); если путь
+        неизвестен - (None, {}).
+        """
+        methods = self._static.get(path)
+        path_params = {}
+        if methods is None:
+            methods = self._match_tree(path, path_params)
+            if methods is None:
+                return None, {}
+        route = methods.get(method)
+        if route is None:
+            return None, sorted(methods) + ['OPTIONS']
+        return route, path_params
+
+    def _match_tree(self, path, path_params):
+        node = self._tree
+        for segment in path.strip('/').split('/'):
+            child = node[0].get(segment)
+            if child is not None:
+                node = child
+            elif node[1] is not None and segment:
+                name, node = node[1]
+                path_params[name] = unquote(segment)
+            else:
+                return None
+        return node[2]
+
+
+# Ответы с постоянным телом: тело и заголовки закодированы при загрузке модуля
+HEALTH_RESPONSE = EncodedResponse.from_json({"status": "OK"})
+INFO_RESPONSE = EncodedResponse.from_json({"name": "AI Service", "version": "1.0.0"})
+ROOT_RESPONSE = EncodedResponse.from_json({"message": "Service API"})
+OPTIONS_RESPONSE = EncodedResponse(b'', content_type=None)
+
+# Повторяющиеся JSON-ответы; частые ошибки закодированы заранее: 401 от клиентов
+# с истекшими токенами идут мимо сериализации с первого запроса
+response_cache = ResponseCache()
+for status, message in (
+    (400, "Invalid JSON body"),
+    (401, "Invalid session"),
+    (401, "Invalid credentials"),
+    (404, "Endpoint not found"),
+    (404, "Message not found"),
+    (500, "Internal server error"),
+    (503, "Too many active streams"),
+):
+    response_cache.add({"error": message}, status)
+
+# Ответы 429 по значению Retry-After, сек
+RATE_LIMITED_RESPONSES = {}
+
+
+class APIHandler(BaseHTTPRequestHandler):
+
+    # Постоянные соединения: несколько запросов (в том числе конвейером) по одному TCP
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят одной записью при wfile.flush() в конце запроса:
+    # иначе на keep-alive соединении второй пакет ждет ACK (Nagle + delayed ACK)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # Таймаут сокета - это и таймаут ожидания следующего запроса
+        self.timeout = self.server.idle_timeout
+        self.requests_served = 0
+        super().setup()
+
+    def handle_one_request(self):
+        # Ожидание запроса: при остановке сервер закроет простаивающее соединение
+        self.server.connection_idle(self.connection)
+        super().handle_one_request()
+
+    def parse_request(self):
+        self.server.connection_busy(self.connection)
+        if not super().parse_request():
+            return False
+        self.requests_served += 1
+        return True
+
+    # Статус и байты ответа для метрик
+    status_code = 0
+    in_dispatch = False
+    bytes_written = 0
+    # Тело текущего запроса для записи трафика
+    request_body = b''
+
+    # Задержка и порционная отдача ответа по профилю сбоев: (задержка, байт в порции, интервал);
+    # ответ с задержкой отдает DelayedSender сервера и закрывает соединение
+    pending_delivery = None
+    delivery_closes_connection = True
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def flush_headers(self):
+        if hasattr(self, '_headers_buffer'):
+            self.bytes_written += sum(map(len, self._headers_buffer))
+        super().flush_headers()
+
+    def _write_body(self, body):
+        self.wfile.write(body)
+        self.bytes_written += len(body)
+
+    def _connection_header(self):
+        """Заголовок Connection, если он нужен: закрытие по лимиту или остановке, keep-alive для HTTP/1.0"""
+        if self.close_connection:
+            return b''
+        limit = self.server.max_keepalive_requests
+        if (not self.server.keep_alive or self.server.draining or (limit and self.requests_served >= limit)
+                or (self.pending_delivery is not None and self.delivery_closes_connection)
+                or (not self.server.wait_for_idle and not self._request_pending())):
+            self.close_connection = True
+            return CONNECTION_CLOSE
+        if self.request_version == 'HTTP/1.0':
+            return CONNECTION_KEEP_ALIVE
+        return b''
+
+    def _request_pending(self):
+        """Пришел ли уже следующий запрос (конвейер): проверка без ожидания"""
+        self.connection.settimeout(0)
         try:
-            # Аутентификация
-            if parsed_path.path == '/api/auth/login':
-                login = form_data.get('Login', [None])[0]
-                password = form_data.get('Password', [None])[0]
-                
-                if login != "v_shutenko" or password != "8nEThznM":
-                    self._send_response({"error": "Invalid credentials"}, 401)
-                    return
-                
-                session_token = str(uuid.uuid4())
-                active_sessions[session_token] = {
-                    "userLogin": login,
-                    "expiresAt": datetime.now() + timedelta(hours=1)
-                }
-                
-                self._send_response({
-                    "message": "Success",
-                    "redirectUrl": "/request/model.html",
-                    "sessionToken": session_token
-                })
-            
-            elif parsed_path.path == '/api/auth/logout':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if session_token in active_sessions:
-                    del active_sessions[session_token]
-                self._send_response({"message": "Logged out"})
-            
-            elif parsed_path.path == '/api/auth/check-session':
-                session_token = form_data.get('sessionToken', [None])[0]
-                session = self._get_session(session_token)
-                
-                if not session:
-                    self._send_response({"error": "Invalid session"}, 401)
+            # peek отдает буфер rfile, а если он пуст - то, что уже лежит в сокете
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def end_headers(self):
+        header = self._connection_header()
+        if header and hasattr(self, '_headers_buffer'):
+            self._headers_buffer.append(header)
+        super().end_headers()
+
+    # Заголовок Server, закодированный при первом ответе
+    _server_header = None
+
+    def _write_response(self, status, headers, body):
+        """Ответ целиком одной записью.
+
+        headers - закодированные заголовки ответа, включая Content-Length;
+        Server, Date и Connection добавляются здесь.
+        """
+        self.status_code = status
+        if not self.in_dispatch:
+            self.log_request(status, len(body))
+        if self.request_version == 'HTTP/0.9':
+            parts = [body]
+        else:
+            server = self._server_header
+            if server is None:
+                server = type(self)._server_header = f"Server: {self.version_string()}\r\n".encode('latin-1')
+            parts = [status_line(self.protocol_version, status), server, date_header(), headers,
+                     self._connection_header(), b'\r\n', body]
+        if self.pending_delivery is not None:
+            self._deliver_later(parts)
+            self.bytes_written += sum(map(len, parts))
+        elif len(body) <= JOIN_LIMIT:
+            data = b''.join(parts)
+            self.wfile.write(data)
+            self.bytes_written += len(data)
+        else:
+            self._write_parts(parts)
+            self.bytes_written += sum(map(len, parts))
+
+    def _write_parts(self, parts):
+        """Большой ответ: заголовки и тело одним sendmsg, без склеивания"""
+        if HAS_SENDMSG:
+            # Все, что уже лежит в буфере wfile, должно уйти раньше
+            self.wfile.flush()
+            send_parts(self.connection, parts)
+        else:
+            self.wfile.write(b''.join(parts[:-1]))
+            self.wfile.write(parts[-1])
+
+    def _deliver_later(self, parts):
+        """Ответ с задержкой: соединение переходит к DelayedSender, поток свободен сразу"""
+        self.wfile.flush()
+        self.close_connection = True
+        connection = self.connection
+        self.server.detach_request(connection)
+        self.server.delayed_sender.submit(connection, b''.join(parts), *self.pending_delivery)
+
+    def _send_encoded(self, response):
+        """Отправка ответа с постоянным телом (EncodedResponse)"""
+        self._write_response(response.status, response.headers, response.body)
+
+    def _set_cors_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS, PUT, DELETE')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+    
+    def do_OPTIONS(self):
+        self._send_encoded(OPTIONS_RESPONSE)
+    
+    def _send_response(self, data, status_code=200, content_type='application/json', headers=None):
+        if content_type == 'application/json':
+            if headers is None:
+                cached = response_cache.get(data, status_code)
+                if cached is not None:
+                    self._send_encoded(cached)
                     return
-                
-                self._send_response({
-                    "valid": True,
-                    "userLogin": session["userLogin"],
-                    "expiresAt": session["expiresAt"]
-                })
-            
-            # Функции чата
-            elif parsed_path.path == '/api/chat/send':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if not session_token or not self._get_session(session_token):
-                    self._send_response({"error": "Invalid session"}, 401)
+            body = encode_json(data).encode('utf-8')
+        else:
+            body = data.encode('utf-8')
+        block = header_block(content_type)
+        if headers:
+            if headers.get('Connection', '').lower() == 'close':
+                self.close_connection = True
+            block += encode_headers(headers)
+        self._write_response(status_code, block + b"Content-Length: %d\r\n" % len(body), body)
+    
+    def _read_body(self):
+        try:
+            return read_body(self.rfile, self.headers, self.server.max_body_size)
+        except BodyError:
+            # Тело не дочитано: следующий запрос на соединении не найти
+            self.close_connection = True
+            raise
+
+    def handle_expect_100(self):
+        # Слишком большое тело отклоняется до того, как клиент начнет его слать
+        try:
+            content_length(self.headers, self.server.max_body_size)
+        except BodyError as e:
+            self._send_response({"error": e.message}, e.status, headers={'Connection': 'close'})
+            return False
+        return super().handle_expect_100()
+
+    def _get_session(self, token):
+        return session_store.get(token)
+    
+    def _get_params(self, method, parsed_path):
+        """Параметры запроса: для GET из query-строки, для остальных методов из тела.
+
+        Тело читается сразу, а разбирается при первом обращении к его полям.
+        """
+        body = self.request_body = self._read_body()
+        if method == 'GET':
+            # Тело GET не используется, но его нужно было дочитать: иначе следующий
+            # запрос на keep-alive соединении начнется с середины этого тела
+            return RequestParams(parse_qs(parsed_path.query))
+        return RequestParams(body=body, content_type=self.headers.get('Content-Type'))
+
+    def _dispatch(self, method):
+        """Общая точка входа: поиск маршрута в таблице и вызов обработчика"""
+        shard = metrics.request_started()
+        started = time.perf_counter()
+        written_before = self.bytes_written
+        self.route = None
+        self.pending_delivery = None
+        self.request_body = b''
+        self.in_dispatch = True
+        try:
+            self._route_request(method)
+        finally:
+            self.in_dispatch = False
+            duration = time.perf_counter() - started
+            written = self.bytes_written - written_before
+            # Метка маршрута - шаблон пути; неизвестные пути сводятся в одну серию
+            shard.record(self.route or UNMATCHED_ROUTES[method], self.status_code, duration, written)
+            access_log.log(self.client_address[0], method, self.path, self.request_version,
+                           self.status_code, written, duration)
+            if traffic_capture is not None:
+                route = self.route
+                user = self.session.user_login if route is not None and route.auth and self.session else None
+                traffic_capture.record(self.client_address[0], method, self.path, self.headers,
+                                       self.request_body, self.status_code, duration, user)
+
+    def _route_request(self, method):
+        parsed_path = urlparse(self.path)
+
+        try:
+            params = self._get_params(method, parsed_path)
+            if ip_limiter is not None:
+                retry_after = ip_limiter.acquire(self.client_address[0])
+                if retry_after:
+                    self._send_rate_limited(retry_after)
                     return
-                
-                message = form_data.get('message', [None])[0]
-                
-                # Простой ответ
-                if message and "привет" in message.lower():
-                    response = "Привет! Чем могу помочь?"
-                elif message and "погода" in message.lower():
-                    response = "Погода хорошая"
-                elif message and "время" in message.lower():
-                    response = f"Сейчас {datetime.now().strftime('%H:%M')}"
-                elif message and "hello" in message.lower():
-                    response = "Hello! How can I assist you today?"
-                elif message and "weather" in message.lower():
-                    response = "The weather is nice today"
-                elif message and "capital of france" in message.lower():
-                    response = "The capital of France is Paris"
-                elif message and "artificial intelligence" in message.lower():
-                    response = "Artificial Intelligence is the simulation of human intelligence processes by machines"
+            route, path_params = self.router.resolve(method, parsed_path.path)
+            if route is None:
+                if path_params:
+                    # Путь существует, но не поддерживает этот метод
+                    self._send_response({"error": "Method not allowed"}, 405,
+                                        headers={'Allow': ', '.join(path_params)})
                 else:
-                    response = "Получил ваш запрос"
-                
-                self._send_response({"answer": response})
-            
-            elif parsed_path.path == '/api/chat/clear':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if not session_token or not self._get_session(session_token):
-                    self._send_response({"error": "Invalid session"}, 401)
-                    return
-                self._send_response({"message": "Chat cleared"})
-            
-            elif parsed_path.path == '/api/chat/copy':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if not session_token or not self._get_session(session_token):
-                    self._send_response({"error": "Invalid session"}, 401)
-                    return
-                self._send_response({"message": "Text copied"})
-            
-            # Настройки модели
-            elif parsed_path.path == '/api/settings/temperature':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if not session_token or not self._get_session(session_token):
+                    self._send_response({"error": "Endpoint not found"}, 404)
+                return
+            self.route = route
+
+            for name, value in path_params.items():
+                params[name] = [value]
+
+            self.session = None
+            if route.auth:
+                session_token = params.get('sessionToken', [None])[0]
+                self.session = self._get_session(session_token) if session_token else None
+                if not self.session:
                     self._send_response({"error": "Invalid session"}, 401)
                     return
-                
-                value = int(form_data.get('value', [0])[0])
-                if value < 0 or value > 200:
-                    self._send_response({"error": "Value must be between 0 and 200"}, 400)
-                    return
-                
-                self._send_response({"value": value})
-            
-            elif parsed_path.path == '/api/settings/topp':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if not session_token or not self._get_session(session_token):
-                    self._send_response({"error": "Invalid session"}, 401)
+                if session_limiter is not None:
+                    retry_after = session_limiter.acquire(self.session.token)
+                    if retry_after:
+                        self._send_rate_limited(retry_after)
+                        return
+
+            if route.validator is not None:
+                problems = route.validator(params)
+                if problems:
+                    self._send_response({"error": problems[0]["message"], "details": problems}, 400)
                     return
-                
-                value = int(form_data.get('value', [0])[0])
-                if value < 0 or value > 100:
-                    self._send_response({"error": "Value must be between 0 and 100"}, 400)
+
+            if fault_injector.active and route.path not in FAULT_EXEMPT_PATHS:
+                error, self.pending_delivery = fault_injector.decide(route)
+                if error is not None:
+                    self._send_encoded(error)
                     return
-                
-                self._send_response({"value": value})
-            
-            else:
-                self._send_response({"error": "Endpoint not found"}, 404)
-                
+
+            route.handler(self, params)
+
+        except BodyError as e:
+            self._send_response({"error": e.message}, e.status,
+                                headers={'Connection': 'close'} if self.close_connection else None)
         except Exception as e:
-            logger.error(f"Error processing request: {e}")
+            logger.error(f"Error processing {method} request: {e}")
             self._send_response({"error": "Internal server error"}, 500)
 
+    def _send_rate_limited(self, retry_after):
+        seconds = max(1, math.ceil(retry_after))
+        response = RATE_LIMITED_RESPONSES.get(seconds)
+        if response is None:
+            response = RATE_LIMITED_RESPONSES[seconds] = EncodedResponse.from_json(
+                {"error": "Too many requests"}, 429, headers={'Retry-After': str(seconds)})
+        self._send_encoded(response)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
     def do_PUT(self):
         """Обработка PUT запросов"""
-        parsed_path = urlparse(self.path)
-        form_data = self._get_form_data()
-        
-        try:
-            if parsed_path.path == '/api/chat/update':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if not session_token or not self._get_session(session_token):
-                    self._send_response({"error": "Invalid session"}, 401)
-                    return
-                
-                message_id = form_data.get('messageId', [None])[0]
-                new_message = form_data.get('newMessage', [None])[0]
-                
-                self._send_response({
-                    "message": "Message updated",
-                    "messageId": message_id,
-                    "newMessage": new_message
-                })
-            
-            else:
-                self._send_response({"error": "Endpoint not found"}, 404)
-                
-        except Exception as e:
-            logger.error(f"Error processing PUT request: {e}")
-            self._send_response({"error": "Internal server error"}, 500)
+        self._dispatch('PUT')
 
     def do_DELETE(self):
         """Обработка DELETE запросов"""
-        parsed_path = urlparse(self.path)
-        form_data = self._get_form_data()
+        self._dispatch('DELETE')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def _send_swagger_ui(self, params):
+        """Отправка Swagger UI с включенной кнопкой Try it out"""
+        self._send_precomputed(self.server.swagger_ui)
+
+    def _send_swagger_spec(self, params):
+        """Swagger спецификация как в C# версии"""
+        self._send_precomputed(self.server.swagger_spec)
+
+    def _send_precomputed(self, response):
+        """Отправка заранее сериализованного ответа с учетом ETag и Accept-Encoding"""
+        encoding = response.choose_encoding(self.headers.get('Accept-Encoding', ''))
+        etag = response.etags[encoding]
+        if response.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self._set_cors_headers()
+            self.end_headers()
+            return
+        body = response.bodies[encoding]
+        self.send_response(200)
+        self.send_header('Content-Type', response.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Cache-Control', 'no-cache')
+        self._set_cors_headers()
+        self.end_headers()
+        self._write_body(body)
+
+    # Системные
+
+    def _handle_metrics(self, params):
+        self._send_response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+    def _handle_health(self, params):
+        self._send_encoded(HEALTH_RESPONSE)
+
+    def _handle_info(self, params):
+        self._send_encoded(INFO_RESPONSE)
+
+    def _handle_root(self, params):
+        self._send_encoded(ROOT_RESPONSE)
+
+    def _handle_session_stats(self, params):
+        self._send_response(session_store.stats())
+
+    def _handle_profile(self, params):
+        user = user_store.get(self.session.user_login)
+        if user is None:
+            # Сессия пережила перезагрузку файла пользователей без этого логина
+            self._send_response({"error": "User not found"}, 404)
+            return
+        self._send_response(user.profile())
+
+    # Аутентификация
+
+    def _handle_login(self, params):
+        login = params.get('Login', [None])[0]
+        password = params.get('Password', [None])[0]
         
+        user = user_store.authenticate(login, password)
+        if user is None:
+            self._send_response({"error": "Invalid credentials"}, 401)
+            return
+        
+        session = session_store.create(user.login)
+        
+        self._send_response({
+            "message": "Success",
+            "redirectUrl": "/request/model.html",
+            "sessionToken": session.token
+        })
+
+    def _handle_logout(self, params):
+        session_token = params.get('sessionToken', [None])[0]
+        if session_token:
+            session_store.remove(session_token)
+            chat_history.drop(session_token)
+        self._send_response({"message": "Logged out"})
+
+    def _handle_check_session(self, params):
+        self._send_response({
+            "valid": True,
+            "userLogin": self.session.user_login,
+            # Тот же вид, что у str(datetime): "2026-01-01 12:00:00.123456"
+            "expiresAt": datetime.fromtimestamp(self.session.expires_at).isoformat(sep=' ')
+        })
+
+    # Функции чата
+
+    def _handle_chat_send(self, params):
+        message = params.get('message', [None])[0]
+        length = params.get('length', [answer_length])[0]
+        seed = None
+        if length:
+            # Ответ генератора заданной длины с temperature и top-p сессии;
+            # seed возвращается клиенту, чтобы ответ можно было повторить
+            settings = chat_history.settings(self.session.token)
+            seed = params.get('seed', [None])[0]
+            if seed is None:
+                seed = random.getrandbits(32)
+            answer = text_generator.generate(length, settings.get('temperature', DEFAULT_TEMPERATURE) / 100,
+                                             settings.get('topP', DEFAULT_TOP_P) / 100, seed, message)
+        else:
+            # Ответ по таблице правил (chat_rules.json)
+            answer = chat_responder.answer(message)
+        chat_history.append(self.session.token, message, "user", self.session.expires_at)
+        recorded = answer if len(answer) <= HISTORY_ANSWER_LENGTH else answer[:HISTORY_ANSWER_LENGTH - 1] + '…'
+        chat_history.append(self.session.token, recorded, "assistant", self.session.expires_at)
+
+        stream_format = self._stream_format(params)
+        if stream_format:
+            self._send_stream(answer, stream_format, params)
+            return
+        response = {"answer": answer}
+        if seed is not None:
+            response["seed"] = seed
+        self._send_response(response)
+
+    def _stream_format(self, params):
+        """Формат потоковой отдачи: поле stream или Accept: text/event-stream"""
+        # Значение уже проверено по enum спецификации: sse или chunked
+        stream = params.get('stream', [None])[0]
+        if stream == 'sse' or 'text/event-stream' in self.headers.get('Accept', ''):
+            return 'sse'
+        if stream == 'chunked':
+            return 'chunked'
+        return None
+
+    def _send_stream(self, text, stream_format, params):
+        """Потоковый ответ: заголовки здесь, тело - в отдельном потоке"""
+        # Типы и диапазоны tokenDelayMs и chunkSize проверены по спецификации
+        delay = params.get('tokenDelayMs', [self.server.stream_delay * 1000])[0] / 1000
+        chunk_size = params.get('chunkSize', [self.server.stream_chunk_size])[0]
+        # Темп потокового ответа задает tokenDelayMs, профиль сбоев его не задерживает
+        self.pending_delivery = None
+        if not self.server.stream_slots.acquire():
+            self._send_response({"error": "Too many active streams"}, 503, headers={'Retry-After': '1'})
+            return
+
+        # Чанки есть только в HTTP/1.1; клиенту HTTP/1.0 тело отдается до закрытия соединения
+        chunked = self.request_version == 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-Type', streaming.CONTENT_TYPES[stream_format])
+        self.send_header('Cache-Control', 'no-cache')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self._set_cors_headers()
+        self.end_headers()
+        self._begin_stream(text, stream_format, chunked, delay, chunk_size)
+
+    def _begin_stream(self, text, stream_format, chunked, delay, chunk_size):
+        """Отдача тела потокового ответа в отдельном потоке, владеющем соединением"""
+        self.wfile.flush()
+        connection = self.connection
+        self.server.detach_request(connection)
+        thread = threading.Thread(target=self._run_stream,
+                                  args=(connection, text, stream_format, chunked, delay, chunk_size),
+                                  name="chat-stream")
+        thread.daemon = True
+        thread.start()
+
+    def _run_stream(self, connection, text, stream_format, chunked, delay, chunk_size):
         try:
-            if parsed_path.path == '/api/chat/message':
-                session_token = form_data.get('sessionToken', [None])[0]
-                if not session_token or not self._get_session(session_token):
-                    self._send_response({"error": "Invalid session"}, 401)
-                    return
-                
-                message_id = form_data.get('messageId', [None])[0]
-                
-                self._send_response({
-                    "message": "Message deleted",
-                    "messageId": message_id
-                })
-            
-            else:
-                self._send_response({"error": "Endpoint not found"}, 404)
-                
-        except Exception as e:
-            logger.error(f"Error processing DELETE request: {e}")
-            self._send_response({"error": "Internal server error"}, 500)
+            completed, sent = streaming.stream_to_socket(connection, text, stream_format, chunked,
+                                                         delay, chunk_size, self.server.stream_write_timeout)
+            metrics.add_bytes(sent)
+            if not completed:
+                logger.warning(f"{self.client_address[0]} - chat stream aborted: client is too slow or gone")
+        finally:
+            self.server.stream_slots.release()
+
+    def _handle_chat_clear(self, params):
+        chat_history.clear(self.session.token)
+        self._send_response({"message": "Chat cleared"})
+
+    def _handle_chat_copy(self, params):
+        self._send_response({"message": "Text copied"})
+
+    def _handle_chat_update(self, params):
+        message_id = params['messageId'][0]
+        new_message = params.get('newMessage', [None])[0]
+        if chat_history.update(self.session.token, message_id, new_message) is None:
+            self._send_response({"error": "Message not found"}, 404)
+            return
+        
+        self._send_response({
+            "message": "Message updated",
+            "messageId": message_id,
+            "newMessage": new_message
+        })
+
+    def _handle_chat_history(self, params):
+        # Постраничная выдача: limit сообщений после курсора after (id сообщения)
+        limit = params.get('limit', [50])[0]
+        after = params.get('after', [None])[0]
+
+        messages, next_cursor = chat_history.page(self.session.token, after, limit)
+        self._send_response({
+            "messages": messages,
+            "nextCursor": next_cursor,
+            "hasMore": next_cursor is not None
+        })
+
+    def _handle_chat_delete(self, params):
+        message_id = params['messageId'][0]
+        if not chat_history.delete(self.session.token, message_id):
+            self._send_response({"error": "Message not found"}, 404)
+            return
+        
+        self._send_response({
+            "message": "Message deleted",
+            "messageId": message_id
+        })
+
+    # Администрирование
+
+    def _handle_faults_get(self, params):
+        self._send_response({
+            "profile": fault_injector.profile,
+            "injectedErrors": fault_injector.injected_errors,
+            "delayedResponses": fault_injector.delayed_responses
+        })
+
+    def _require_admin(self):
+        """True, если пользователь сессии может менять профиль сбоев; иначе отправлен 403"""
+        if fault_admin_any_user:
+            return True
+        user = user_store.get(self.session.user_login)
+        if user is not None and user.role == ADMIN_ROLE:
+            return True
+        self._send_response({"error": "Admin role required"}, 403)
+        return False
+
+    def _handle_faults_put(self, params):
+        if not self._require_admin():
+            return
+        # В режиме prefork профиль меняется только в процессе, принявшем запрос
+        try:
+            fault_injector.load(json.loads(params['profile'][0]))
+        except ValueError as e:
+            self._send_response({"error": f"Invalid fault profile: {e}"}, 400)
+            return
+        self._send_response({"message": "Fault profile updated"})
+
+    def _handle_faults_delete(self, params):
+        if not self._require_admin():
+            return
+        fault_injector.clear()
+        self._send_response({"message": "Fault profile cleared"})
+
+    # Настройки модели
+
+    # Значение уже целое и в диапазоне из спецификации (0-200 и 0-100); оно
+    # хранится в сессии и задает выборку генератора ответов (value / 100)
+
+    def _handle_temperature(self, params):
+        value = params['value'][0]
+        chat_history.set_setting(self.session.token, 'temperature', value, self.session.expires_at)
+        self._send_response({"value": value})
+
+    def _handle_topp(self, params):
+        value = params['value'][0]
+        chat_history.set_setting(self.session.token, 'topP', value, self.session.expires_at)
+        self._send_response({"value": value})
+
+    def log_request(self, code='-', size='-'):
+        # Запросы, прошедшие через _dispatch, попадают в журнал доступа оттуда,
+        # с длительностью и числом байт; здесь - OPTIONS и отказы до разбора запроса
+        if not self.in_dispatch:
+            access_log.log(self.client_address[0], self.command or '-', getattr(self, 'path', '-'),
+                           self.request_version, int(code) if code != '-' else 0,
+                           size if size != '-' else None)
 
     def log_message(self, format, *args):
-        logger.info(f"{self.client_address[0]} - {format % args}")
+        # Строка собирается в потоке записи журнала, а не в потоке запроса
+        logger.info("%s - " + format, self.client_address[0], *args)
+
+def build_router():
+    """Таблица маршрутов API; строится один раз при загрузке модуля"""
+    router = Router()
+    # Swagger
+    router.add('GET', '/', APIHandler._send_swagger_ui)
+    router.add('GET', '/swagger.json', APIHandler._send_swagger_spec)
+    # Системные
+    router.add('GET', '/api/health', APIHandler._handle_health)
+    router.add('GET', '/api/info', APIHandler._handle_info)
+    router.add('GET', '/api/Root', APIHandler._handle_root)
+    router.add('GET', '/api/sessions/stats', APIHandler._handle_session_stats)
+    router.add('GET', '/metrics', APIHandler._handle_metrics)
+    router.add('GET', '/api/profile', APIHandler._handle_profile, auth=True)
+    # Аутентификация
+    router.add('POST', '/api/auth/login', APIHandler._handle_login)
+    router.add('POST', '/api/auth/logout', APIHandler._handle_logout)
+    router.add('POST', '/api/auth/check-session', APIHandler._handle_check_session, auth=True)
+    # Чат
+    router.add('POST', '/api/chat/send', APIHandler._handle_chat_send, auth=True)
+    router.add('POST', '/api/chat/clear', APIHandler._handle_chat_clear, auth=True)
+    router.add('POST', '/api/chat/copy', APIHandler._handle_chat_copy, auth=True)
+    router.add('PUT', '/api/chat/update', APIHandler._handle_chat_update, auth=True)
+    router.add('GET', '/api/chat/history', APIHandler._handle_chat_history, auth=True)
+    router.add('DELETE', '/api/chat/message', APIHandler._handle_chat_delete, auth=True)
+    router.add('DELETE', '/api/chat/message/{messageId}', APIHandler._handle_chat_delete, auth=True)
+    # Настройки модели
+    router.add('POST', '/api/settings/temperature', APIHandler._handle_temperature, auth=True)
+    router.add('POST', '/api/settings/topp', APIHandler._handle_topp, auth=True)
+    # Администрирование
+    router.add('GET', '/api/admin/faults', APIHandler._handle_faults_get, auth=True)
+    router.add('PUT', '/api/admin/faults', APIHandler._handle_faults_put, auth=True)
+    router.add('DELETE', '/api/admin/faults', APIHandler._handle_faults_delete, auth=True)
+    return router
+
+
+def attach_validators(router, spec):
+    """Проверки параметров маршрутов, скомпилированные из спецификации OpenAPI.
+
+    sessionToken не проверяется здесь: его наличие и действительность проверяет
+    аутентификация маршрута (401), а выход допускает запрос без токена.
+    """
+    validators = compile_validators(spec, skip=('sessionToken',))
+    for route in router.routes():
+        route.validator = validators.get((route.method, route.path))
+
+
+APIHandler.router = build_router()
+# Порт в спецификации влияет только на адрес сервера, не на параметры
+attach_validators(APIHandler.router, build_swagger_spec(8000))
+
+# Маршруты, на которые профиль сбоев не действует: документация, метрики и
+# сам эндпоинт профиля (иначе сбой мешал бы его отключить)
+FAULT_EXEMPT_PATHS = frozenset(('/', '/swagger.json', '/metrics', '/api/admin/faults'))
+
+# Маршруты-заглушки для метрик запросов, не нашедших маршрута
+UNMATCHED_ROUTES = {method: Route(method, 'unmatched', None)
+                    for method in ('GET', 'POST', 'PUT', 'DELETE', 'PATCH')}
+
+
+class AsyncAPIHandler(APIHandler):
+    """APIHandler для asyncio-движка: ответ пишется в буфер, поток отдает цикл событий"""
+
+    protocol_version = 'HTTP/1.1'
+
+    # Ответ с задержкой ждет в сопрограмме соединения, keep-alive сохраняется
+    delivery_closes_connection = False
+
+    def _begin_stream(self, text, stream_format, chunked, delay, chunk_size):
+        self.close_connection = True
+        self.pending_stream = (text, stream_format, chunked, delay, chunk_size)
+
+    def stream_finished(self, sent):
+        metrics.add_bytes(sent)
+
+    def _read_body(self):
+        # Цикл событий уже прочитал тело целиком и проверил его размер
+        return self.rfile.getvalue()
+
+    def _write_parts(self, parts):
+        # wfile - буфер в памяти, сокет пишет цикл событий
+        self.wfile.writelines(parts)
+
+    def _deliver_later(self, parts):
+        # Цикл событий отдаст буфер по pending_delivery
+        self.wfile.writelines(parts)
+
+
+# Ответ, который получает клиент, если очередь пула переполнена
+OVERLOADED_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 30\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b'{"error": "Server overloaded"}'
+)
+
+
+class APIServer(HTTPServer):
+    """HTTPServer, у которого обработчик может забрать соединение себе.
+
+    Потоковые ответы чата отдаются из отдельного потока: обработчик отправляет
+    заголовки, вызывает detach_request() и сразу освобождается, а сервер не
+    закрывает такое соединение после обработки. Число одновременных потоков
+    ограничено max_streams.
+
+    Остановка без обрыва запросов: begin_drain() прекращает прием соединений
+    (serve_forever возвращается), drain() дожидается ответов в обработке.
+    sock - готовый слушающий сокет (унаследованный при горячем перезапуске)
+    вместо нового на server_address.
+    """
+
+    # Слушающая очередь по умолчанию (5) мала для клиентов с keep-alive и конвейером
+    request_queue_size = 128
+
+    # Keep-alive: сколько ждать следующего запроса и сколько запросов обслужить
+    # на одном соединении (0 - без ограничения)
+    keep_alive = True
+    idle_timeout = 5.0
+    max_keepalive_requests = 1000
+    # False - соединение остается открытым, только если следующий запрос уже пришел
+    # (конвейер): поток не ждет простаивающего клиента
+    wait_for_idle = True
+
+    # Предел тела запроса, байт (больше - 413)
+    max_body_size = 1024 * 1024
+
+    # Остановка: новые соединения не принимаются, ответы закрывают соединение
+    draining = False
+    # Соединение без запроса закрывается при остановке, если клиент молчит дольше, сек;
+    # активный клиент за это время пришлет запрос и получит ответ с Connection: close
+    drain_idle_grace = 1.0
+
+    def __init__(self, server_address, handler_class, bind_and_activate=True, max_streams=256, sock=None):
+        self._detached = set()
+        # Принятые и еще не закрытые соединения, кроме переданных потоковым и отложенным ответам
+        self._connections = set()
+        # Соединения, ждущие запроса: сокет -> когда его можно закрыть при остановке
+        self._idle = {}
+        self._connections_lock = threading.Lock()
+        self.stream_slots = streaming.StreamSlots(max_streams)
+        # Ответы с задержкой по профилю сбоев: соединения отдаются ему, как потоковые
+        self.delayed_sender = DelayedSender()
+        super().__init__(server_address, handler_class, bind_and_activate and sock is None)
+        if sock is not None:
+            self.socket.close()
+            self.socket = sock
+            self.server_address = sock.getsockname()
+            self.server_name = socket.getfqdn(self.server_address[0])
+            self.server_port = self.server_address[1]
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        with self._connections_lock:
+            self._connections.add(request)
+        return request, client_address
+
+    def detach_request(self, request):
+        with self._connections_lock:
+            self._detached.add(request)
+
+    def connection_idle(self, request):
+        """Соединение ждет запроса: при остановке его можно закрыть через drain_idle_grace"""
+        closable_at = time.monotonic() + self.drain_idle_grace
+        with self._connections_lock:
+            self._idle[request] = closable_at
+
+    def connection_busy(self, request):
+        with self._connections_lock:
+            self._idle.pop(request, None)
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            # Соединение считается, пока обработчик не закончил: потоковый или
+            # отложенный ответ к этому времени уже учтен в stream_slots или delayed_sender
+            self._connections.discard(request)
+            self._idle.pop(request, None)
+            if request in self._detached:
+                self._detached.discard(request)
+                return
+        super().shutdown_request(request)
+
+    def begin_drain(self):
+        """Прекращение приема соединений; можно вызывать из любого потока, кроме serve_forever"""
+        if self.draining:
+            return
+        self.draining = True
+        # shutdown() ждет выхода из serve_forever: в своем потоке, чтобы не ждать вызывающего
+        threading.Thread(target=self.shutdown, name="http-shutdown", daemon=True).start()
+
+    def drain(self, timeout, on_quiesced=None):
+        """Ожидание ответов после begin_drain() не дольше timeout сек.
+
+        Простаивающие соединения закрываются на чтение: запрос, уже пришедший
+        в сокет, обработчик дочитает и ответит. on_quiesced() вызывается, когда
+        запросов в обработке не осталось (только потоковые и отложенные ответы)
+        или истек timeout. Возвращает число соединений, оборванных по timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            with self._connections_lock:
+                idle = [request for request, closable_at in self._idle.items() if closable_at <= now]
+                for request in idle:
+                    del self._idle[request]
+                busy = len(self._connections)
+            for request in idle:
+                try:
+                    request.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+            if on_quiesced is not None and not busy:
+                on_quiesced()
+                on_quiesced = None
+            remaining = busy + self.stream_slots.active + len(self.delayed_sender)
+            if not remaining or now >= deadline:
+                break
+            time.sleep(DRAIN_POLL_INTERVAL)
+        if on_quiesced is not None:
+            on_quiesced()
+        return remaining
+
+
+class BoundedThreadPoolHTTPServer(APIServer):
+    """HTTP-сервер с фиксированным пулом потоков и ограниченной очередью соединений.
+
+    В отличие от ThreadingHTTPServer не создает поток на каждое соединение:
+    принятые сокеты попадают в очередь, которую разбирают workers потоков.
+    Если очередь заполнена, клиент сразу получает 503.
+
+    При accept_when_busy=False сервер не принимает новые соединения, пока все
+    потоки заняты: в режиме prefork их забирает менее загруженный процесс.
+    """
+
+    def __init__(self, server_address, handler_class, workers=8, queue_size=64,
+                 accept_when_busy=True, bind_and_activate=True, max_streams=256, sock=None):
+        self.workers = workers
+        self.accept_when_busy = accept_when_busy
+        self.rejected_requests = 0
+        self._requests = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._idle_workers = 0
+        self._idle_changed = threading.Condition()
+        super().__init__(server_address, handler_class, bind_and_activate, max_streams, sock)
 
-def open_browser():
+    def serve_forever(self, poll_interval=0.5):
+        # Потоки создаются здесь, а не в __init__: в режиме prefork сервер
+        # создается до fork, а потоки в дочерние процессы не наследуются
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"http-worker-{i}")
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        super().serve_forever(poll_interval)
+
+    def get_request(self):
+        if not self.accept_when_busy:
+            with self._idle_changed:
+                if not self._idle_changed.wait_for(self._has_capacity, timeout=0.05):
+                    # Соединение остается в backlog для другого процесса
+                    raise BlockingIOError("all workers are busy")
+        return super().get_request()
+
+    def _has_capacity(self):
+        return self._idle_workers > self._requests.qsize()
+
+    def process_request(self, request, client_address):
+        try:
+            self._requests.put_nowait((request, client_address))
+        except queue.Full:
+            self.rejected_requests += 1
+            try:
+                request.sendall(OVERLOADED_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def _worker(self):
+        while True:
+            with self._idle_changed:
+                self._idle_workers += 1
+                self._idle_changed.notify()
+            item = self._requests.get()
+            with self._idle_changed:
+                self._idle_workers -= 1
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._requests.put(None)
+
+
+def create_server(options, sock=None):
+    """Создание HTTP-сервера в выбранном режиме; sock - унаследованный слушающий сокет"""
+    server_address = (options.host, options.port)
+    if options.mode == 'asyncio':
+        # Обработчики с файловым хранилищем сессий блокируют, их место - в пуле потоков
+        httpd = AsyncHTTPServer(server_address, AsyncAPIHandler,
+                                max_streams=options.max_streams or 10000,
+                                blocking_handlers=options.session_backend not in ('memory', 'signed'),
+                                # Проверка хеша пароля ждет пул процессов, а длинный ответ
+                                # генератора занимает процессор: не в цикле событий
+                                blocking_paths=('/api/auth/login', '/api/chat/send'), sock=sock)
+    elif options.mode == 'single':
+        httpd = APIServer(server_address, APIHandler, max_streams=options.max_streams or 256, sock=sock)
+        # Единственный поток, ждущий следующего запроса на соединении, не обслуживал бы
+        # остальных клиентов: соединение закрывается после ответа, если клиент
+        # не прислал следующий запрос конвейером
+        httpd.wait_for_idle = False
+    else:
+        httpd = BoundedThreadPoolHTTPServer(server_address, APIHandler,
+                                            workers=options.workers,
+                                            queue_size=options.queue_size,
+                                            accept_when_busy=options.mode != 'prefork',
+                                            max_streams=options.max_streams or 256, sock=sock)
+    httpd.idle_timeout = options.idle_timeout
+    httpd.max_body_size = options.max_body_size
+    httpd.max_keepalive_requests = options.max_keepalive_requests
+    httpd.stream_delay = options.stream_delay_ms / 1000
+    httpd.stream_chunk_size = options.stream_chunk_size
+    httpd.stream_write_timeout = options.stream_write_timeout
+    if options.mode != 'asyncio':
+        httpd.delayed_sender.write_timeout = options.stream_write_timeout
+    attach_precomputed_responses(httpd)
+    return httpd
+
+
+def serve(httpd, drain_timeout, restart=False):
+    """Обслуживание до SIGTERM/SIGINT или горячего перезапуска по SIGHUP.
+
+    После сигнала прием соединений прекращается и сервер ждет ответов в
+    обработке не дольше drain_timeout. Возвращает Successor - новый процесс,
+    которому передан слушающий сокет и которому run_server отдаст состояние,
+    или None. restart=False - SIGHUP игнорируется (процессы prefork).
+    """
+    successor = None
+    restarting = False
+    lock = threading.Lock()
+
+    def stop(signum):
+        logger.info(f"{signal.Signals(signum).name} received, draining connections")
+        httpd.begin_drain()
+
+    def start_successor():
+        nonlocal successor, restarting
+        candidate = Successor(httpd.socket)
+        ready = candidate.start()
+        with lock:
+            restarting = False
+            if ready and not httpd.draining:
+                successor = candidate
+                httpd.begin_drain()
+                return
+        if ready:
+            # Сервер уже останавливается по SIGTERM: новый процесс не нужен
+            candidate.abort()
+
+    def hot_restart(signum):
+        nonlocal restarting
+        with lock:
+            # Повторный SIGHUP, пока новый процесс запускается, ничего не меняет
+            if httpd.draining or restarting:
+                return
+            restarting = True
+        logger.info("SIGHUP received, starting new server process")
+        threading.Thread(target=start_successor, name="hot-restart", daemon=True).start()
+
+    watcher = SignalWatcher()
+    watcher.on(signal.SIGTERM, stop, stop=True)
+    watcher.on(signal.SIGINT, stop, stop=True)
+    if hasattr(signal, 'SIGHUP'):
+        if restart:
+            watcher.on(signal.SIGHUP, hot_restart)
+        else:
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    watcher.start()
+    httpd.serve_forever()
+    with lock:
+        # Новый процесс, готовый после этого момента, будет остановлен
+        httpd.draining = True
+    if successor is None:
+        # Новые клиенты получают отказ сразу, а не ждут в очереди сокета до выхода
+        httpd.socket.close()
+
+    def hand_over():
+        if successor is not None:
+            successor.hand_over(collect_state())
+            logger.info(f"Handed over to process {successor.process.pid}")
+
+    remaining = httpd.drain(drain_timeout, hand_over)
+    if remaining:
+        logger.warning(f"Drain timeout: {remaining} connections cut off")
+    return successor
+
+
+def _prefork_worker(httpd, drain_timeout):
+    """Цикл обработки запросов в дочернем процессе prefork"""
+    # Общий слушающий сокет неблокирующий: процесс, проигравший гонку за accept,
+    # просто возвращается в select, а не зависает в accept
+    httpd.socket.setblocking(False)
+    try:
+        # Перезапуском управляет главный процесс, он же пересылает SIGTERM
+        serve(httpd, drain_timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        # Процессы пула хешей этого процесса: выход multiprocessing ждет их без
+        # ограничения, поэтому не завершившиеся за секунду завершаются сигналом
+        user_store.close()
+        for process in multiprocessing.active_children():
+            process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+        if traffic_capture is not None:
+            traffic_capture.stop()
+        if log_pipeline is not None:
+            log_pipeline.stop()
+
+
+def serve_prefork(httpd, processes, drain_timeout):
+    """Запуск нескольких процессов, принимающих соединения с одного сокета.
+
+    SIGTERM и SIGINT пересылаются процессам как SIGTERM: каждый дожидается своих
+    ответов. По SIGHUP, когда новый главный процесс готов, процессы тоже
+    останавливаются, и его Successor возвращается, как у serve().
+    """
+    context = multiprocessing.get_context('fork')
+    children = []
+    for i in range(processes):
+        child = context.Process(target=_prefork_worker, args=(httpd, drain_timeout), name=f"http-process-{i}")
+        child.start()
+        children.append(child)
+    successor = None
+    restarting = False
+    deadline = None
+    lock = threading.Lock()
+
+    def stop_children():
+        nonlocal deadline
+        if deadline is not None:
+            return
+        # Процессам - время на их собственный drain и на выход
+        deadline = time.monotonic() + drain_timeout + 5
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    def stop(signum):
+        logger.info(f"{signal.Signals(signum).name} received, draining connections")
+        with lock:
+            stop_children()
+            httpd.socket.close()
+
+    def start_successor():
+        nonlocal successor, restarting
+        candidate = Successor(httpd.socket)
+        ready = candidate.start()
+        with lock:
+            restarting = False
+            if ready and deadline is None:
+                successor = candidate
+                stop_children()
+                return
+        if ready:
+            candidate.abort()
+
+    def hot_restart(signum):
+        nonlocal restarting
+        with lock:
+            if deadline is not None or restarting:
+                return
+            restarting = True
+        logger.info("SIGHUP received, starting new server process")
+        threading.Thread(target=start_successor, name="hot-restart", daemon=True).start()
+
+    watcher = SignalWatcher()
+    watcher.on(signal.SIGTERM, stop, stop=True)
+    watcher.on(signal.SIGINT, stop, stop=True)
+    watcher.on(signal.SIGHUP, hot_restart)
+    watcher.start()
+    try:
+        while True:
+            alive = [child for child in children if child.is_alive()]
+            if not alive:
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                for child in alive:
+                    child.kill()
+            alive[0].join(DRAIN_POLL_INTERVAL)
+    finally:
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+            child.join()
+    with lock:
+        # Новый процесс, готовый после этого момента, будет остановлен
+        deadline = deadline or time.monotonic()
+    if successor is not None:
+        successor.hand_over(collect_state())
+        logger.info(f"Handed over to process {successor.process.pid}")
+    return successor
+
+
+# Версия формата снимка состояния
+STATE_VERSION = 1
+
+
+def collect_state():
+    """Снимок сессий и истории чата для нового процесса или файла --state-file"""
+    return {
+        "version": STATE_VERSION,
+        "savedAt": time.time(),
+        "sessionBackend": session_backend,
+        "sessions": session_store.snapshot(),
+        "chatHistory": chat_history.snapshot(),
+    }
+
+
+def restore_state(state):
+    """Загрузка снимка collect_state(); снимок другого бэкенда сессий пропускается"""
+    if state.get("version") != STATE_VERSION:
+        logger.warning(f"Unsupported state version {state.get('version')}, starting without it")
+        return
+    sessions = 0
+    if state.get("sessionBackend") == session_backend and state.get("sessions") is not None:
+        sessions = session_store.restore(state["sessions"])
+    histories = chat_history.restore(state.get("chatHistory") or {})
+    logger.info(f"Restored {sessions} sessions and {histories} chat histories")
+
+
+def parse_args(argv=None):
+    """Разбор параметров командной строки"""
+    parser = argparse.ArgumentParser(description="AI Ecosystem Test API Server")
+    parser.add_argument('--host', default='', help="адрес для прослушивания (по умолчанию все интерфейсы)")
+    parser.add_argument('--port', type=int, default=8000, help="порт сервера")
+    parser.add_argument('--mode', choices=['single', 'pool', 'prefork', 'asyncio'], default='single',
+                        help="single - один поток (keep-alive только для запросов, уже присланных "
+                             "конвейером); pool - ограниченный пул потоков; "
+                             "prefork - несколько процессов с пулом потоков в каждом; "
+                             "asyncio - цикл событий, keep-alive и тысячи соединений в одном потоке")
+    parser.add_argument('--idle-timeout', type=float, default=5.0,
+                        help="сколько ждать следующего запроса в keep-alive соединении, сек "
+                             "(в режимах pool и prefork соединение все это время занимает поток)")
+    parser.add_argument('--max-keepalive-requests', type=int, default=1000,
+                        help="после скольких запросов закрывать keep-alive соединение, 0 - без ограничения")
+    parser.add_argument('--max-body-size', type=int, default=1024 * 1024,
+                        help="максимальный размер тела запроса, байт (больше - ответ 413)")
+    parser.add_argument('--workers', type=int, default=8, help="размер пула потоков (на процесс)")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="максимум соединений, ожидающих свободный поток")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help="число процессов в режиме prefork")
+    parser.add_argument('--session-ttl', type=int, default=3600, help="время жизни сессии, сек")
+    parser.add_argument('--max-sessions', type=int, default=100000,
+                        help="максимум одновременных сессий, 0 - без ограничения; "
+                             "при переполнении вытесняются давно не использованные; "
+                             "для signed - размер журнала отозванных токенов")
+    parser.add_argument('--sweep-interval', type=float, default=1.0,
+                        help="период удаления истекших сессий и их историй чата, сек")
+    parser.add_argument('--session-backend', choices=['memory', 'sqlite', 'mmap', 'signed'], default='memory',
+                        help="memory - в памяти процесса; sqlite - база SQLite в режиме WAL; "
+                             "mmap - файл фиксированных записей (только POSIX); "
+                             "signed - подписанные HMAC токены без хранилища. "
+                             "sqlite и mmap сохраняют сессии между перезапусками")
+    parser.add_argument('--session-file', default=None,
+                        help="файл хранилища сессий (по умолчанию sessions.db или sessions.mmap)")
+    parser.add_argument('--session-secret-file', default=None,
+                        help="ключ подписи токенов для --session-backend signed; если файла нет, он "
+                             "создается. С общим ключом токены принимают все процессы и хосты; "
+                             "без него ключ случайный и токены не переживают перезапуск")
+    parser.add_argument('--users-file', default=None,
+                        help="файл пользователей (JSON, создается python users.py); "
+                             "по умолчанию - один встроенный пользователь")
+    parser.add_argument('--password-algorithm', choices=sorted(DEFAULT_WORK_FACTORS), default='pbkdf2_sha256',
+                        help="алгоритм хеша пароля встроенного пользователя")
+    parser.add_argument('--password-work-factor', type=int, default=None,
+                        help="цена хеша встроенного пользователя: итерации PBKDF2 (по умолчанию 10000) "
+                             "или n scrypt (16384); задает задержку входа. У файла пользователей "
+                             "цена записана в хешах")
+    parser.add_argument('--hash-workers', type=int, default=None,
+                        help="процессов для проверки паролей, 0 - в потоке запроса "
+                             "(по умолчанию число ядер, в prefork - 1 на процесс)")
+    parser.add_argument('--max-history', type=int, default=10000,
+                        help="максимум сообщений в истории чата одной сессии; старые вытесняются")
+    parser.add_argument('--chat-rules', default=CHAT_RULES_PATH,
+                        help="файл правил ответов чата (JSON или YAML)")
+    parser.add_argument('--chat-rules-reload', type=float, default=1.0,
+                        help="как часто проверять изменение файла правил, сек")
+    parser.add_argument('--chat-corpus', default=CHAT_CORPUS_PATH,
+                        help="текстовый корпус генератора ответов чата (UTF-8)")
+    parser.add_argument('--chat-order', type=int, default=1,
+                        help="порядок цепи генератора: сколько последних слов определяют следующее")
+    parser.add_argument('--answer-length', type=int, default=0,
+                        help="длина ответа генератора, если запрос не задает length, символов; "
+                             "0 - ответы по правилам")
+    parser.add_argument('--stream-delay-ms', type=float, default=50,
+                        help="пауза перед каждой порцией потокового ответа чата, мс")
+    parser.add_argument('--stream-chunk-size', type=int, default=1,
+                        help="число токенов в одной порции потокового ответа")
+    parser.add_argument('--stream-write-timeout', type=float, default=10,
+                        help="сколько ждать медленного клиента при потоковой отдаче, сек")
+    parser.add_argument('--max-streams', type=int, default=None,
+                        help="максимум одновременных потоковых ответов "
+                             "(по умолчанию 256, в режиме asyncio 10000)")
+    parser.add_argument('--fault-profile', default=None,
+                        help="профиль задержек и ошибок по маршрутам (JSON, см. fault_injection.py); "
+                             "меняется на лету через /api/admin/faults")
+    parser.add_argument('--fault-admin-any-user', action='store_true',
+                        help="разрешить менять профиль сбоев любому вошедшему пользователю, "
+                             "а не только с ролью Admin")
+    parser.add_argument('--rate-limit-ip', type=float, default=0,
+                        help="запросов в секунду с одного адреса, 0 - без ограничения (сверх - ответ 429)")
+    parser.add_argument('--rate-limit-ip-burst', type=int, default=None,
+                        help="сколько запросов с адреса можно сделать подряд (по умолчанию - число в секунду)")
+    parser.add_argument('--rate-limit-session', type=float, default=0,
+                        help="запросов в секунду в одной сессии, 0 - без ограничения")
+    parser.add_argument('--rate-limit-session-burst', type=int, default=None,
+                        help="сколько запросов в сессии можно сделать подряд")
+    parser.add_argument('--rate-limit-max-keys', type=int, default=100000,
+                        help="максимум адресов и сессий, которые помнит ограничитель")
+    parser.add_argument('--drain-timeout', type=float, default=30,
+                        help="сколько при остановке (SIGTERM, SIGINT) или перезапуске (SIGHUP) ждать "
+                             "ответов в обработке, сек; затем соединения обрываются")
+    parser.add_argument('--state-file', default=None,
+                        help="файл снимка сессий и истории чата: пишется при остановке, читается и "
+                             "удаляется при запуске. При перезапуске по SIGHUP снимок передается "
+                             "новому процессу напрямую")
+    parser.add_argument('--pid-file', default=None,
+                        help="файл с номером процесса сервера; после перезапуска по SIGHUP "
+                             "в нем номер нового процесса")
+    parser.add_argument('--log-file', default=None,
+                        help="файл журнала (по умолчанию stderr); {pid} в имени заменяется "
+                             "номером процесса; в режиме prefork {pid} обязателен - у каждого "
+                             "процесса свой файл")
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text',
+                        help="text - строки как раньше; json - объект JSON на строку")
+    parser.add_argument('--log-max-bytes', type=int, default=10 * 1024 * 1024,
+                        help="размер файла журнала, после которого он поворачивается, 0 - без поворота")
+    parser.add_argument('--log-backups', type=int, default=5, help="сколько старых файлов журнала хранить")
+    parser.add_argument('--log-queue-size', type=int, default=10000,
+                        help="максимум записей журнала, ожидающих записи; сверх него записи отбрасываются")
+    parser.add_argument('--capture-file', default=None,
+                        help="записывать каждый запрос (метод, путь, заголовки, тело, время) в NDJSON "
+                             "для benchmarks/replay.py; {pid} в имени - свой файл у процесса prefork")
+    parser.add_argument('--capture-max-body', type=int, default=64 * 1024,
+                        help="тело длиннее стольких байт записывается обрезанным")
+    parser.add_argument('--access-log-sample', type=int, default=1,
+                        help="писать в журнал доступа каждый N-й успешный запрос (ошибки пишутся все)")
+    parser.add_argument('--no-access-log', action='store_true', help="не вести журнал доступа")
+    parser.add_argument('--no-metrics', action='store_true',
+                        help="не собирать метрики запросов (GET /metrics отдаст только общие значения)")
+    parser.add_argument('--no-browser', action='store_true', help="не открывать браузер при запуске")
+    options = parser.parse_args(argv)
+    # Процессы prefork поворачивали бы один файл каждый по своему счетчику размера,
+    # затирая друг другу старые файлы и продолжая писать в переименованный
+    if options.mode == 'prefork' and options.log_file and '{pid}' not in options.log_file:
+        parser.error("--log-file в режиме prefork должен содержать {pid}, например access-{pid}.log")
+    return options
+
+
+def open_browser(port=8000):
     """Функция для открытия браузера"""
     time.sleep(2)
-    url = "http://localhost:8000"
+    url = f"http://localhost:{port}"
     webbrowser.open(url)
     print(f"🌐 Браузер открыт: {url}")
 
-def run_server():
-    port = 8000
-    server_address = ('', port)
-    httpd = HTTPServer(server_address, APIHandler)
+def run_server(options=None):
+    global session_store, chat_history, chat_responder, log_pipeline, ip_limiter, session_limiter, user_store
+    global traffic_capture, text_generator, answer_length, session_backend, fault_admin_any_user
+    if options is None:
+        options = parse_args([])
+    # При горячем перезапуске слушающий сокет и канал к старому процессу передаются в окружении
+    inherited = inherited_socket()
+    predecessor = Predecessor.from_environment()
+    port = options.port
+
+    if options.mode == 'prefork' and not hasattr(os, 'fork'):
+        sys.exit("Режим prefork доступен только на POSIX-системах")
+    max_sessions = options.max_sessions or None
+    session_manager = None
+    if options.mode == 'prefork':
+        # Состояние в памяти должно быть видно всем процессам: оно живет в
+        # процессе-менеджере. Менеджер запускается до создания сокета, чтобы
+        # не унаследовать его
+        session_manager = SessionManager(ctx=multiprocessing.get_context('fork'))
+        session_manager.start()
+        chat_history = session_manager.ChatHistoryStore(max_messages=options.max_history,
+                                                        max_sessions=max_sessions)
+    else:
+        chat_history = ChatHistoryStore(max_messages=options.max_history, max_sessions=max_sessions)
+    if session_manager is not None and options.session_backend == 'memory':
+        session_store = session_manager.SessionStore(ttl=options.session_ttl, max_sessions=max_sessions)
+    else:
+        # Файловые хранилища процессы prefork открывают каждый сам после fork;
+        # журнал отзывов подписанных токенов создается здесь и общий для них
+        secret = None
+        if options.session_backend == 'signed' and options.session_secret_file:
+            try:
+                secret = load_secret(options.session_secret_file)
+            except (OSError, ValueError) as e:
+                sys.exit(f"Не удалось загрузить ключ подписи сессий: {e}")
+        session_store = create_session_store(options.session_backend, options.session_file,
+                                             ttl=options.session_ttl, max_sessions=max_sessions, secret=secret)
+    session_backend = options.session_backend
+    session_store.start_sweeper(options.sweep_interval)
+    # Истории истекших сессий удаляются с тем же интервалом; в prefork - в процессе-менеджере
+    chat_history.start_sweeper(options.sweep_interval)
+    hash_workers = options.hash_workers
+    if hash_workers is None:
+        hash_workers = 1 if options.mode == 'prefork' else os.cpu_count() or 1
+    try:
+        if options.users_file:
+            user_store = UserStore.load(options.users_file, hash_workers=hash_workers)
+        else:
+            user_store = UserStore.default(options.password_algorithm, options.password_work_factor,
+                                           hash_workers=hash_workers)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Не удалось загрузить пользователей: {e}")
+    if options.mode != 'prefork':
+        # В prefork пул создает каждый процесс при первом входе
+        user_store.warm_up()
+    metrics.enabled = not options.no_metrics
+    metrics.per_process = options.mode == 'prefork'
+    chat_responder = ChatResponder(options.chat_rules, reload_interval=options.chat_rules_reload)
+    try:
+        text_generator = TextGenerator.load(options.chat_corpus, options.chat_order)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Не удалось загрузить корпус генератора {options.chat_corpus}: {e}")
+    answer_length = min(max(0, options.answer_length), MAX_ANSWER_LENGTH)
+    # В режиме prefork у каждого процесса свои корзины
+    if options.rate_limit_ip > 0:
+        ip_limiter = TokenBucketLimiter(options.rate_limit_ip, options.rate_limit_ip_burst,
+                                        max_keys=options.rate_limit_max_keys)
+    if options.rate_limit_session > 0:
+        session_limiter = TokenBucketLimiter(options.rate_limit_session, options.rate_limit_session_burst,
+                                             max_keys=options.rate_limit_max_keys)
+    if options.fault_profile:
+        try:
+            with open(options.fault_profile, encoding='utf-8') as f:
+                fault_injector.load(json.load(f))
+        except (OSError, ValueError) as e:
+            sys.exit(f"Не удалось загрузить профиль сбоев {options.fault_profile}: {e}")
+    fault_admin_any_user = options.fault_admin_any_user
+    access_log.enabled = not options.no_access_log
+    access_log.sample_rate = max(1, options.access_log_sample)
+    log_pipeline = setup_logging(access_log, options.log_file, json_format=options.log_format == 'json',
+                                 max_bytes=options.log_max_bytes, backups=options.log_backups,
+                                 queue_size=options.log_queue_size)
+    if options.capture_file:
+        try:
+            traffic_capture = TrafficCapture(options.capture_file, max_body=options.capture_max_body)
+        except OSError as e:
+            sys.exit(f"Не удалось открыть файл записи трафика: {e}")
+        traffic_capture.start()
+
+    try:
+        httpd = create_server(options, inherited)
+    except OSError as e:
+        sys.exit(f"Не удалось открыть порт {port}: {e}")
+    port = httpd.server_port
     
     print("=" * 60)
     print("🔐 AI Ecosystem Test API Server")
     print("=" * 60)
     print(f"🚀 Сервер запущен: http://localhost:{port}")
     print(f"📚 Swagger UI: http://localhost:{port}")
+    if options.mode == 'single':
+        print("⚙️  Режим: один поток")
+    elif options.mode == 'asyncio':
+        print("⚙️  Режим: asyncio (один цикл событий)")
+    elif options.mode == 'pool':
+        print(f"⚙️  Режим: пул потоков ({options.workers} потоков, очередь {options.queue_size})")
+    else:
+        print(f"⚙️  Режим: prefork ({options.processes} процессов по {options.workers} потоков)")
+    if fault_injector.active:
+        print(f"🐢 Профиль сбоев: {options.fault_profile}")
+    if traffic_capture is not None:
+        print(f"📼 Запись трафика: {options.capture_file}")
+    if answer_length:
+        print(f"💬 Ответы генератора: {answer_length} символов, корпус {text_generator.corpus_words} слов")
+    if inherited is not None:
+        print("♻️  Горячий перезапуск: сокет получен от предыдущего процесса")
     print("=" * 60)
     print("Доступные эндпоинты:")
     print("POST /api/auth/login")
@@ -1028,22 +2852,76 @@ def run_server():
     print("GET  /api/health")
     print("GET  /api/info")
     print("GET  /api/Root")
+    print("GET  /metrics")
+    print("GET/PUT/DELETE /api/admin/faults")
     print("=" * 60)
     print("🔄 Открываю браузер автоматически...")
     print("=" * 60)
-    print("👤 Логин: v_shutenko")
-    print("🔑 Пароль: 8nEThznM")
+    if options.users_file:
+        print(f"👤 Пользователи: {len(user_store)} из {options.users_file}")
+    else:
+        print("👤 Логин: v_shutenko")
+        print("🔑 Пароль: 8nEThznM")
     print("=" * 60)
     
-    # Запускаем открытие браузера в отдельном потоке
-    browser_thread = threading.Thread(target=open_browser)
-    browser_thread.daemon = True
-    browser_thread.start()
+    if predecessor is not None:
+        # Старый процесс перестает принимать соединения и передает состояние
+        if predecessor.ready():
+            state = predecessor.receive_state(options.drain_timeout + 10)
+        else:
+            state = None
+    elif options.state_file:
+        try:
+            state = load_state(options.state_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot load state from {options.state_file}: {e}")
+            state = None
+    else:
+        state = None
+    if state is not None:
+        restore_state(state)
+    if options.pid_file:
+        with open(options.pid_file, 'w') as f:
+            f.write(f"{os.getpid()}\n")
+
+    if not options.no_browser and inherited is None:
+        # Запускаем открытие браузера в отдельном потоке
+        browser_thread = threading.Thread(target=open_browser, args=(port,))
+        browser_thread.daemon = True
+        browser_thread.start()
     
     try:
-        httpd.serve_forever()
+        if options.mode == 'prefork':
+            successor = serve_prefork(httpd, options.processes, options.drain_timeout)
+        else:
+            successor = serve(httpd, options.drain_timeout, restart=True)
+        if successor is not None:
+            print(f"\n♻️  Работу продолжает процесс {successor.process.pid}")
+        else:
+            if options.state_file:
+                save_state(options.state_file, collect_state())
+            print("\n🛑 Сервер остановлен")
     except KeyboardInterrupt:
         print("\n🛑 Сервер остановлен")
+    finally:
+        httpd.server_close()
+        user_store.close()
+        if traffic_capture is not None:
+            traffic_capture.stop()
+        log_pipeline.stop()
+        if options.pid_file:
+            _remove_pid_file(options.pid_file)
+
+
+def _remove_pid_file(path):
+    """Удаление файла, если в нем еще номер этого процесса (а не нового после перезапуска)"""
+    try:
+        with open(path) as f:
+            if f.read().strip() != str(os.getpid()):
+                return
+        os.remove(path)
+    except OSError:
+        pass
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    run_server(parse_args())
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""Метрики запросов в текстовом формате Prometheus (GET /metrics).
+
+Каждый поток пишет в свой "шард" - словарь серий без блокировок: запись
+запроса - это несколько сложений в списке, найденном по ключу
+(маршрут, метод, статус). Шарды складываются только при чтении /metrics.
+Шарды завершившихся потоков (например, потоков потоковой отдачи чата)
+сливаются в общий при очередном чтении, поэтому их число не растет.
+
+Маршрут в метках - шаблон пути из таблицы маршрутов (/api/chat/message/{messageId}),
+а не сам путь: число серий не зависит от запросов клиентов.
+
+В режиме prefork у каждого процесса свои метрики; к сериям добавляется метка pid.
+"""
+import os
+import threading
+from bisect import bisect_left
+
+# Границы корзин гистограммы задержек, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Shard:
+    """Счетчики одного потока"""
+
+    __slots__ = ('series', 'in_flight', 'bytes_written', 'width', 'buckets')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        # маршрут -> {статус: [счетчики корзин..., +Inf, сумма длительностей]}
+        self.series = {}
+        self.in_flight = 0
+        self.bytes_written = 0
+        self.buckets = buckets
+        self.width = len(buckets) + 2
+
+    def record(self, route, status, duration, bytes_written):
+        """Завершение запроса, начатого Metrics.request_started().
+
+        route - объект с атрибутами path и method (Route): ключом служит сам
+        объект, его хеш не вычисляется заново, в отличие от кортежа меток.
+        """
+        statuses = self.series.get(route)
+        if statuses is None:
+            statuses = self.series[route] = {}
+        values = statuses.get(status)
+        if values is None:
+            values = statuses[status] = [0] * self.width
+        values[bisect_left(self.buckets, duration)] += 1
+        values[-1] += duration
+        self.in_flight -= 1
+        self.bytes_written += bytes_written
+
+
+class _Totals:
+    """Сумма шардов с сериями по меткам (путь, метод, статус)"""
+
+    __slots__ = ('series', 'in_flight', 'bytes_written', 'width')
+
+    def __init__(self, width):
+        self.series = {}
+        self.in_flight = 0
+        self.bytes_written = 0
+        self.width = width
+
+    def _add_series(self, key, values):
+        target = self.series.get(key)
+        if target is None:
+            target = self.series[key] = [0] * self.width
+        for i, value in enumerate(values):
+            target[i] += value
+
+    def add_shard(self, shard):
+        for route, statuses in shard.series.items():
+            for status, values in statuses.items():
+                self._add_series((route.path, route.method, status), values)
+        self.in_flight += shard.in_flight
+        self.bytes_written += shard.bytes_written
+
+    def add_totals(self, other):
+        for key, values in other.series.items():
+            self._add_series(key, values)
+        self.in_flight += other.in_flight
+        self.bytes_written += other.bytes_written
+
+
+class _DisabledShard:
+    """Шард выключенных метрик: запись ничего не делает"""
+
+    def record(self, route, status, duration, bytes_written):
+        pass
+
+
+_DISABLED = _DisabledShard()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS, enabled=True):
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self.per_process = False
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Totals(len(self.buckets) + 2)
+        self._lock = threading.Lock()
+        self._gauges = []
+
+    def add_gauge(self, name, help_text, callback):
+        """Значение, вычисляемое при чтении метрик (например, число сессий)"""
+        self._gauges.append((name, help_text, callback, 'gauge'))
+
+    def add_counter(self, name, help_text, callback):
+        """Счетчик, который ведет другой объект; значение читается при выдаче метрик"""
+        self._gauges.append((name, help_text, callback, 'counter'))
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard(self.buckets)
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def request_started(self):
+        """Начало запроса; возвращает шард, в который запрос записывается вызовом record()"""
+        if not self.enabled:
+            return _DISABLED
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self.shard()
+        shard.in_flight += 1
+        return shard
+
+    def add_bytes(self, count):
+        """Байты, отправленные вне обработки запроса (тело потокового ответа)"""
+        if self.enabled:
+            self.shard().bytes_written += count
+
+    def collect(self):
+        """Сумма всех шардов"""
+        total = _Totals(len(self.buckets) + 2)
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._retired.add_shard(shard)
+            self._shards = alive
+            total.add_totals(self._retired)
+            for _, shard in alive:
+                total.add_shard(shard)
+        return total
+
+    def render(self):
+        """Текст в формате Prometheus exposition 0.0.4"""
+        total = self.collect()
+        extra = f',pid="{os.getpid()}"' if self.per_process else ''
+        lines = [
+            "# HELP http_requests_total Requests by route, method and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        histograms = {}
+        for (route, method, status), values in sorted(total.series.items()):
+            count = sum(values[:-1])
+            lines.append(f'http_requests_total{{route="{_escape(route)}",method="{method}",'
+                         f'status="{status}"{extra}}} {count}')
+            merged = histograms.get((route, method))
+            if merged is None:
+                histograms[(route, method)] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    merged[i] += value
+
+        lines.append("# HELP http_request_duration_seconds Request handling time by route and method.")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (route, method), values in sorted(histograms.items()):
+            labels = f'route="{_escape(route)}",method="{method}"{extra}'
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {values[-1]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        labels = f'{{{extra[1:]}}}' if extra else ''
+        lines += [
+            "# HELP http_requests_in_flight Requests being handled right now.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight{labels} {total.in_flight}",
+            "# HELP http_response_bytes_total Bytes written to clients, headers included.",
+            "# TYPE http_response_bytes_total counter",
+            f"http_response_bytes_total{labels} {total.bytes_written}",
+        ]
+        for name, help_text, callback, kind in self._gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{labels} {callback()}")
+        return '\n'.join(lines) + '\n'
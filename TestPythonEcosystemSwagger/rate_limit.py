@@ -0,0 +1,86 @@
+"""Ограничение частоты запросов: token bucket на ключ (адрес клиента или сессию).
+
+У каждого ключа своя корзина на burst токенов, которая пополняется со
+скоростью rate токенов в секунду; запрос забирает один токен. Если токенов
+нет, запрос отклоняется, а acquire() возвращает, через сколько секунд
+появится следующий токен (для Retry-After).
+
+Корзины разложены по шардам по хешу ключа, у каждого шарда своя
+блокировка: проверка - O(1) и не ждет запросов с другими ключами.
+Шард - OrderedDict в порядке последнего обращения, поэтому простаивающие
+корзины всегда в его начале. Корзина, которая простаивала burst / rate
+секунд, снова полна и ничем не отличается от новой: такие корзины
+удаляются при добавлении новых, а при достижении max_keys удаляются самые
+давно не использованные. Память ограничена max_keys корзинами.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Shard:
+    __slots__ = ('lock', 'buckets', 'allowed', 'limited', 'evicted')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # ключ -> [токены, время последнего обращения]
+        self.buckets = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate, burst=None, max_keys=100000, shards=16):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if shards & (shards - 1):
+            raise ValueError("shards must be a power of two")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self.idle_after = self.burst / self.rate
+        self._shards = [_Shard() for _ in range(shards)]
+        self._mask = shards - 1
+        self._max_per_shard = max(1, max_keys // shards)
+
+    def acquire(self, key):
+        """0.0, если запрос разрешен; иначе сколько секунд ждать следующего токена"""
+        now = time.monotonic()
+        shard = self._shards[hash(key) & self._mask]
+        with shard.lock:
+            buckets = shard.buckets
+            bucket = buckets.get(key)
+            if bucket is None:
+                self._evict(shard, now)
+                bucket = buckets[key] = [self.burst, now]
+            else:
+                buckets.move_to_end(key)
+                tokens = bucket[0] + (now - bucket[1]) * self.rate
+                bucket[0] = tokens if tokens < self.burst else self.burst
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                shard.allowed += 1
+                return 0.0
+            shard.limited += 1
+            return (1 - bucket[0]) / self.rate
+
+    def _evict(self, shard, now):
+        """Удаление полных (давно простаивающих) корзин и, при переполнении, самых старых"""
+        buckets = shard.buckets
+        while buckets:
+            key, (_, last_used) = next(iter(buckets.items()))
+            if len(buckets) < self._max_per_shard and now - last_used < self.idle_after:
+                return
+            del buckets[key]
+            shard.evicted += 1
+
+    def stats(self):
+        totals = {"buckets": 0, "allowed": 0, "limited": 0, "evicted": 0}
+        for shard in self._shards:
+            with shard.lock:
+                totals["buckets"] += len(shard.buckets)
+                totals["allowed"] += shard.allowed
+                totals["limited"] += shard.limited
+                totals["evicted"] += shard.evicted
+        return totals
@@ -0,0 +1,236 @@
+"""Тело запроса: чтение с ограничением размера и разбор по Content-Type.
+
+Тело читается сразу (на keep-alive соединении за ним идет следующий
+запрос), а разбирается только при первом обращении обработчика к полю,
+которого нет среди параметров пути. Небольшие тела читаются одним read,
+большие - порциями по READ_CHUNK в буфер потока, который переиспользуется
+от запроса к запросу.
+
+Поддерживаются application/x-www-form-urlencoded (с параметром charset)
+и application/json: JSON разбирается прямо из байтов, без промежуточной
+строки. Значения полей в обоих случаях - списки строк, как у parse_qs,
+поэтому обработчикам все равно, в каком виде пришло тело.
+"""
+import json
+import threading
+from collections.abc import MutableMapping
+from urllib.parse import parse_qs
+
+FORM = 'application/x-www-form-urlencoded'
+JSON = 'application/json'
+
+# Тела не больше этого размера читаются одним вызовом read
+READ_CHUNK = 64 * 1024
+# Предел строки размера порции и строки завершающих заголовков тела chunked
+MAX_CHUNK_LINE = 8192
+
+_buffers = threading.local()
+
+
+class BodyError(Exception):
+    """Тело запроса нельзя принять; status - код ответа (400, 413, 415, 501)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_media_type(value):
+    """'Application/JSON; charset=UTF-8' -> ('application/json', {'charset': 'UTF-8'})"""
+    media_type, _, rest = (value or '').partition(';')
+    parameters = {}
+    for parameter in rest.split(';'):
+        name, sep, parameter_value = parameter.partition('=')
+        if sep:
+            parameters[name.strip().lower()] = parameter_value.strip().strip('"')
+    return media_type.strip().lower(), parameters
+
+
+def content_length(headers, max_size):
+    """Длина тела из Content-Length с проверкой предела (0, если заголовка нет)"""
+    value = headers.get('Content-Length')
+    if value is None:
+        return 0
+    try:
+        length = int(value)
+        if length < 0:
+            raise ValueError(value)
+    except ValueError:
+        raise BodyError(400, "Invalid Content-Length") from None
+    if max_size and length > max_size:
+        raise BodyError(413, f"Request body is larger than {max_size} bytes")
+    return length
+
+
+def read_body(rfile, headers, max_size):
+    """Чтение тела запроса целиком.
+
+    Большое тело возвращается как bytearray буфера текущего потока: оно
+    действительно до следующего вызова read_body в этом потоке. Тело
+    Transfer-Encoding: chunked собирается из порций, а заголовки заменяются
+    на Content-Length, как в asyncio-движке.
+    """
+    transfer_encoding = headers.get('Transfer-Encoding')
+    if transfer_encoding is not None:
+        if transfer_encoding.strip().lower() != 'chunked':
+            raise BodyError(501, "Unsupported Transfer-Encoding")
+        body = read_chunked(rfile, max_size)
+        del headers['Transfer-Encoding']
+        del headers['Content-Length']
+        headers['Content-Length'] = str(len(body))
+        return body
+    length = content_length(headers, max_size)
+    if length <= READ_CHUNK:
+        body = rfile.read(length) if length else b''
+        if len(body) < length:
+            raise BodyError(400, "Incomplete request body")
+        return body
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray()
+    if len(buffer) > length:
+        del buffer[length:]
+    elif len(buffer) < length:
+        buffer.extend(bytes(length - len(buffer)))
+    with memoryview(buffer) as view:
+        offset = 0
+        while offset < length:
+            count = rfile.readinto(view[offset:offset + READ_CHUNK])
+            if not count:
+                raise BodyError(400, "Incomplete request body")
+            offset += count
+    return buffer
+
+
+def read_chunked(rfile, max_size):
+    """Тело Transfer-Encoding: chunked; завершающие заголовки (trailers) пропускаются"""
+    parts = []
+    size = 0
+    while True:
+        chunk_size = _chunk_size(_read_line(rfile))
+        if chunk_size == 0:
+            while _read_line(rfile) not in (b'\r\n', b'\n'):
+                pass
+            return b''.join(parts)
+        size += chunk_size
+        if max_size and size > max_size:
+            raise BodyError(413, f"Request body is larger than {max_size} bytes")
+        chunk = rfile.read(chunk_size)
+        if len(chunk) < chunk_size:
+            raise BodyError(400, "Incomplete request body")
+        parts.append(chunk)
+        if _read_line(rfile) not in (b'\r\n', b'\n'):
+            raise BodyError(400, "Bad chunk")
+
+
+def _read_line(rfile):
+    line = rfile.readline(MAX_CHUNK_LINE + 1)
+    if len(line) > MAX_CHUNK_LINE:
+        raise BodyError(400, "Chunk line too long")
+    if not line.endswith(b'\n'):
+        raise BodyError(400, "Incomplete request body")
+    return line
+
+
+def _chunk_size(line):
+    """Размер порции из строки вида 1e;расширения - только шестнадцатеричные цифры"""
+    digits = line.split(b';', 1)[0].strip()
+    if not digits or digits.strip(b'0123456789abcdefABCDEF'):
+        raise BodyError(400, "Bad chunk size")
+    return int(digits, 16)
+
+
+def _json_value(value):
+    """Значение JSON в виде строки поля формы"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse_body(body, content_type):
+    """Поля тела в виде {имя: [значения]}"""
+    media_type, parameters = parse_media_type(content_type)
+    if media_type == JSON:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise BodyError(400, "Invalid JSON body") from None
+        if not isinstance(data, dict):
+            raise BodyError(400, "JSON body must be an object")
+        fields = {}
+        for name, value in data.items():
+            if value is None:
+                continue
+            values = value if isinstance(value, list) else [value]
+            fields[name] = [_json_value(item) for item in values if item is not None]
+        return fields
+    # Без Content-Type тело считается формой, как его шлет curl -d
+    if media_type in (FORM, ''):
+        charset = parameters.get('charset', 'utf-8')
+        try:
+            return parse_qs(body.decode(charset), encoding=charset)
+        except LookupError:
+            raise BodyError(415, f"Unsupported charset: {charset}") from None
+        except UnicodeDecodeError:
+            raise BodyError(400, f"Request body is not valid {charset}") from None
+    raise BodyError(415, f"Unsupported Content-Type: {media_type}")
+
+
+class RequestParams(MutableMapping):
+    """Параметры запроса с интерфейсом словаря parse_qs.
+
+    Явно заданные поля (query-строка, параметры пути) важнее полей тела;
+    тело разбирается при первом обращении к полю, которого среди них нет.
+    """
+
+    __slots__ = ('_fields', '_body', '_content_type', '_parsed')
+
+    def __init__(self, fields=None, body=b'', content_type=None):
+        self._fields = fields if fields is not None else {}
+        self._body = body
+        self._content_type = content_type
+        self._parsed = None if body else {}
+
+    def _body_fields(self):
+        if self._parsed is None:
+            self._parsed = parse_body(self._body, self._content_type)
+            self._body = b''
+        return self._parsed
+
+    def __getitem__(self, name):
+        try:
+            return self._fields[name]
+        except KeyError:
+            return self._body_fields()[name]
+
+    def get(self, name, default=None):
+        value = self._fields.get(name)
+        if value is None:
+            value = self._body_fields().get(name, default)
+        return value
+
+    def __contains__(self, name):
+        return name in self._fields or name in self._body_fields()
+
+    def __setitem__(self, name, value):
+        self._fields[name] = value
+
+    def __delitem__(self, name):
+        found = self._fields.pop(name, None) is not None
+        found = self._body_fields().pop(name, None) is not None or found
+        if not found:
+            raise KeyError(name)
+
+    def __iter__(self):
+        yield from self._fields
+        for name in self._body_fields():
+            if name not in self._fields:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
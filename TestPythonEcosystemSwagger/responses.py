@@ -0,0 +1,175 @@
+"""Сборка HTTP-ответа из заранее закодированных частей.
+
+BaseHTTPRequestHandler форматирует и кодирует каждый заголовок отдельным
+вызовом send_header. Здесь неизменные части закодированы один раз:
+строки статуса, Server, блоки Content-Type + CORS, а заголовок Date
+кодируется не чаще раза в секунду. Ответ - это список bytes-частей; он
+отправляется одной записью: небольшой склеивается, большой уходит через
+sendmsg (writev) без копирования тела.
+
+EncodedResponse - ответ с постоянным телом (например, GET /api/health):
+тело и его заголовки закодированы при создании. ResponseCache сам находит
+повторяющиеся небольшие JSON-ответы ({"error": "Invalid session"},
+{"message": "Chat cleared"}) и хранит их как EncodedResponse.
+
+encode_json - сериализатор без default=str: значения ответов должны быть
+типами JSON (даты форматируются обработчиком), а кодировщик создается один
+раз, а не при каждом вызове json.dumps с параметрами.
+"""
+import json
+import socket
+import time
+from email.utils import formatdate
+from http import HTTPStatus
+
+# Тела не больше этого размера склеиваются с заголовками в один буфер,
+# большие отправляются отдельной частью sendmsg
+JOIN_LIMIT = 16 * 1024
+
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+
+CORS_HEADERS = (
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Access-Control-Allow-Methods: GET, POST, OPTIONS, PUT, DELETE\r\n"
+    b"Access-Control-Allow-Headers: Content-Type\r\n"
+)
+
+CONNECTION_CLOSE = b"Connection: close\r\n"
+CONNECTION_KEEP_ALIVE = b"Connection: keep-alive\r\n"
+
+# Общий кодировщик: json.dumps с ensure_ascii=False создает новый на каждый вызов
+encode_json = json.JSONEncoder(ensure_ascii=False).encode
+
+_status_lines = {}
+_header_blocks = {}
+_date = [0, b'']
+
+
+def status_line(protocol, code):
+    """b'HTTP/1.1 200 OK\\r\\n' для версии протокола и кода"""
+    key = (protocol, code)
+    line = _status_lines.get(key)
+    if line is None:
+        try:
+            phrase = HTTPStatus(code).phrase
+        except ValueError:
+            phrase = ''
+        line = _status_lines[key] = f"{protocol} {code} {phrase}\r\n".encode('latin-1')
+    return line
+
+
+def date_header():
+    """Заголовок Date; строка пересобирается раз в секунду"""
+    now = int(time.time())
+    if _date[0] != now:
+        _date[1] = f"Date: {formatdate(now, usegmt=True)}\r\n".encode('latin-1')
+        _date[0] = now
+    return _date[1]
+
+
+def header_block(content_type):
+    """Content-Type и CORS одним блоком bytes"""
+    block = _header_blocks.get(content_type)
+    if block is None:
+        content_type_header = f"Content-Type: {content_type}\r\n".encode('latin-1') if content_type else b''
+        block = _header_blocks[content_type] = content_type_header + CORS_HEADERS
+    return block
+
+
+def encode_headers(headers):
+    """Произвольные заголовки {имя: значение} в bytes"""
+    return ''.join(f"{name}: {value}\r\n" for name, value in headers.items()).encode('latin-1')
+
+
+def send_parts(sock, parts):
+    """Отправка частей одним sendmsg; недописанный остаток досылается"""
+    total = sum(map(len, parts))
+    sent = sock.sendmsg(parts)
+    if sent == total:
+        return
+    # Частичная отправка (медленный клиент): остаток по частям
+    for part in parts:
+        if sent >= len(part):
+            sent -= len(part)
+            continue
+        sock.sendall(memoryview(part)[sent:])
+        sent = 0
+
+
+class EncodedResponse:
+    """Ответ с постоянным телом: тело и заголовки закодированы один раз"""
+
+    __slots__ = ('status', 'body', 'headers')
+
+    def __init__(self, body, content_type='application/json', status=200, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = header_block(content_type) + f"Content-Length: {len(body)}\r\n".encode('latin-1')
+        if headers:
+            self.headers += encode_headers(headers)
+
+    @classmethod
+    def from_json(cls, data, status=200, headers=None):
+        return cls(encode_json(data).encode('utf-8'), status=status, headers=headers)
+
+
+# Типы значений, по которым объект можно узнать: у bool и float хеш и
+# равенство совпадают с int (True == 1 == 1.0), а тела ответов - разные
+_KEY_TYPES = frozenset((str, int, type(None)))
+
+
+class ResponseCache:
+    """Закодированные ответы для повторяющихся небольших JSON-объектов.
+
+    Подходят плоские объекты до max_fields полей со строками (до
+    max_value_length символов), целыми и null; ключ - статус и пары полей.
+    Ответ попадает в кэш, когда встречается второй раз за окно из window
+    разных ответов: уникальные ответы (токены входа) кэш не засоряют.
+    Заполнившись (max_entries), кэш перестает принимать новые ответы.
+    Обращения из разных потоков - отдельные операции со словарем и
+    множеством; гонка приводит самое большее к повторной сериализации.
+    """
+
+    def __init__(self, max_entries=1024, max_fields=4, max_value_length=256, window=4096):
+        self.max_entries = max_entries
+        self.max_fields = max_fields
+        self.max_value_length = max_value_length
+        self.window = window
+        self._entries = {}
+        self._seen = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, data, status):
+        if type(data) is not dict or len(data) > self.max_fields:
+            return None
+        for value in data.values():
+            if type(value) not in _KEY_TYPES:
+                return None
+            if type(value) is str and len(value) > self.max_value_length:
+                return None
+        return (status, *data.items())
+
+    def add(self, data, status=200):
+        """Ответ, закодированный заранее, без ожидания повторов"""
+        response = EncodedResponse.from_json(data, status)
+        self._entries[self._key(data, status)] = response
+        return response
+
+    def get(self, data, status=200):
+        """EncodedResponse для data, если такой ответ повторяется; иначе None"""
+        key = self._key(data, status)
+        if key is None:
+            return None
+        response = self._entries.get(key)
+        if response is not None or len(self._entries) >= self.max_entries:
+            return response
+        if key not in self._seen:
+            if len(self._seen) >= self.window:
+                self._seen.clear()
+            self._seen.add(key)
+            return None
+        self._seen.discard(key)
+        response = self._entries[key] = EncodedResponse.from_json(data, status)
+        return response
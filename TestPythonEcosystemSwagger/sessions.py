@@ -0,0 +1,950 @@
+"""Хранилища сессий: в памяти, в SQLite (WAL), в отображаемом в память файле и
+подписанные токены без хранилища.
+
+Все хранилища имеют одинаковый интерфейс: create, get, remove, sweep, stats,
+snapshot, restore, start_sweeper, stop_sweeper. SQLite- и mmap-хранилища
+переживают перезапуск сервера и могут использоваться несколькими процессами
+одновременно. Остальные переносятся в новый процесс снимком: snapshot()
+возвращает JSON-совместимое состояние, restore() загружает его.
+"""
+import heapq
+import hmac
+import math
+import mmap
+import multiprocessing
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from multiprocessing.managers import BaseManager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: межпроцессные блокировки файла недоступны
+    fcntl = None
+
+
+class Session:
+    """Запись о сессии. __slots__ вместо dict: на миллионе сессий экономит память"""
+
+    __slots__ = ('token', 'user_login', 'expires_at')
+
+    def __init__(self, token, user_login, expires_at):
+        self.token = token
+        self.user_login = user_login
+        # Время истечения в секундах Unix (time.time())
+        self.expires_at = expires_at
+
+
+class _SweeperMixin:
+    """Фоновый поток, периодически вызывающий sweep()"""
+
+    sweeper_name = "session-sweeper"
+
+    def start_sweeper(self, interval=1.0):
+        """Запуск фонового потока, удаляющего истекшие сессии"""
+        if self._sweeper is not None:
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, args=(interval,), name=self.sweeper_name)
+        self._sweeper.daemon = True
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        if self._sweeper is None:
+            return
+        self._stop.set()
+        self._sweeper.join()
+        self._sweeper = None
+
+    def _sweep_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.sweep()
+
+
+class _PersistentMixin:
+    """Хранилище в файле: сессии переживают перезапуск сами, снимок не нужен"""
+
+    def snapshot(self):
+        return None
+
+    def restore(self, state):
+        return 0
+
+
+class SessionStore(_SweeperMixin):
+    """Потокобезопасное хранилище сессий.
+
+    - Истекшие сессии удаляет фоновый поток: куча (expires_at, token) отдает их
+      в порядке истечения, поэтому проход стоит O(истекших * log n), а не O(n).
+    - Число сессий ограничено max_sessions: при переполнении вытесняется
+      сессия, к которой дольше всего не обращались (LRU).
+    - Счетчики created/expired/evicted/removed доступны через stats().
+    """
+
+    def __init__(self, ttl=3600, max_sessions=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._expiry_heap = []
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.removed = 0
+
+    def create(self, user_login):
+        """Новая сессия для пользователя"""
+        now = time.time()
+        session = Session(str(uuid.uuid4()), user_login, now + self.ttl)
+        with self._lock:
+            if self.max_sessions and len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+            self._sessions[session.token] = session
+            heapq.heappush(self._expiry_heap, (session.expires_at, session.token))
+            self.created += 1
+            self._compact_heap()
+        return session
+
+    def get(self, token):
+        """Действующая сессия по токену или None"""
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if time.time() > session.expires_at:
+                del self._sessions[token]
+                self.expired += 1
+                return None
+            self._sessions.move_to_end(token)
+            return session
+
+    def remove(self, token):
+        """Удаление сессии (выход пользователя); True, если сессия была"""
+        with self._lock:
+            if self._sessions.pop(token, None) is None:
+                return False
+            self.removed += 1
+            return True
+
+    def sweep(self, now=None):
+        """Удаление истекших сессий; возвращает число удаленных"""
+        if now is None:
+            now = time.time()
+        swept = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expires_at, token = heapq.heappop(heap)
+                session = self._sessions.get(token)
+                # Запись в куче могла устареть: сессию уже удалили или вытеснили
+                if session is not None and session.expires_at == expires_at:
+                    del self._sessions[token]
+                    swept += 1
+            self.expired += swept
+        return swept
+
+    def _compact_heap(self):
+        # Записи удаленных сессий остаются в куче до своего срока; если их
+        # накопилось больше, чем живых сессий, куча перестраивается
+        if len(self._expiry_heap) > 2 * len(self._sessions) + 1024:
+            self._expiry_heap = [(s.expires_at, s.token) for s in self._sessions.values()]
+            heapq.heapify(self._expiry_heap)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def snapshot(self):
+        """Действующие сессии [[токен, логин, срок], ...] от давно не использованных к недавним"""
+        now = time.time()
+        with self._lock:
+            return [[s.token, s.user_login, s.expires_at] for s in self._sessions.values() if s.expires_at > now]
+
+    def restore(self, records):
+        """Загрузка снимка snapshot(); истекшие сессии пропускаются. Возвращает число загруженных"""
+        now = time.time()
+        restored = 0
+        with self._lock:
+            for token, user_login, expires_at in records:
+                if expires_at <= now:
+                    continue
+                if self.max_sessions and len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+                self._sessions[token] = Session(token, user_login, expires_at)
+                self._sessions.move_to_end(token)
+                heapq.heappush(self._expiry_heap, (expires_at, token))
+                restored += 1
+            self._compact_heap()
+        return restored
+
+    def stats(self):
+        """Текущее число сессий и счетчики"""
+        with self._lock:
+            return {
+                "live": len(self._sessions),
+                "maxSessions": self.max_sessions,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "removed": self.removed,
+            }
+
+
+class _Batch:
+    """Группа операций, фиксируемых одной транзакцией"""
+
+    __slots__ = ('ops', 'done', 'error')
+
+    def __init__(self):
+        # Операция: [вид, аргумент, результат]
+        self.ops = []
+        self.done = threading.Event()
+        self.error = None
+
+
+class SQLiteSessionStore(_PersistentMixin, _SweeperMixin):
+    """Сессии в базе SQLite в режиме WAL.
+
+    Записи (вход и выход) выполняет один поток-писатель на процесс: пока идет
+    коммит, новые операции копятся в следующей пачке, и вся пачка фиксируется
+    одной транзакцией, а вызывающие потоки ждут именно этого коммита (group
+    commit). Так fsync выполняется один раз на пачку, а не на каждый запрос,
+    а токен виден другим процессам сразу после ответа клиенту. commit_interval
+    добавляет ожидание перед коммитом, чтобы пачки были крупнее.
+
+    Чтение идет через отдельное соединение на поток. При переполнении
+    max_sessions удаляются сессии с ближайшим сроком истечения, то есть
+    созданные раньше всех.
+    """
+
+    def __init__(self, path, ttl=3600, max_sessions=None, commit_interval=0.0, batch_size=512):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.commit_interval = commit_interval
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._batches = deque()
+        self._batch_ready = threading.Condition()
+        self._writer_pid = None
+        self._sweeper = None
+        self._stop = threading.Event()
+        self._init_schema()
+
+    def _init_schema(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " token TEXT PRIMARY KEY, user_login TEXT NOT NULL, expires_at REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters ("
+                " id INTEGER PRIMARY KEY CHECK (id = 0), created INTEGER NOT NULL,"
+                " expired INTEGER NOT NULL, evicted INTEGER NOT NULL, removed INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO counters VALUES (0, 0, 0, 0, 0)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _reader(self):
+        # Соединение на поток; после fork (режим prefork) открывается заново
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = self._connect()
+            local.pid = os.getpid()
+        return local.conn
+
+    def create(self, user_login):
+        """Новая сессия; возвращается после фиксации транзакции"""
+        session = Session(str(uuid.uuid4()), user_login, time.time() + self.ttl)
+        self._submit('insert', session)
+        return session
+
+    def get(self, token):
+        """Действующая сессия по токену или None"""
+        row = self._reader().execute(
+            "SELECT user_login, expires_at FROM sessions WHERE token = ?", (token,)
+        ).fetchone()
+        if row is None or time.time() > row[1]:
+            # Истекшую запись удалит sweep()
+            return None
+        return Session(token, row[0], row[1])
+
+    def remove(self, token):
+        """Удаление сессии (выход пользователя); True, если сессия была"""
+        return self._submit('delete', token)
+
+    def _submit(self, kind, argument):
+        op = [kind, argument, None]
+        with self._batch_ready:
+            if self._writer_pid != os.getpid():
+                self._writer_pid = os.getpid()
+                self._batches = deque()
+                writer = threading.Thread(target=self._write_loop, name="session-writer")
+                writer.daemon = True
+                writer.start()
+            if not self._batches or len(self._batches[-1].ops) >= self.batch_size:
+                self._batches.append(_Batch())
+            batch = self._batches[-1]
+            batch.ops.append(op)
+            self._batch_ready.notify()
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return op[2]
+
+    def _write_loop(self):
+        conn = self._connect()
+        batches = self._batches
+        while True:
+            with self._batch_ready:
+                self._batch_ready.wait_for(lambda: batches)
+                if self.commit_interval and len(batches) == 1:
+                    # Даем другим потокам присоединиться к этой транзакции
+                    self._batch_ready.wait_for(lambda: len(batches[0].ops) >= self.batch_size,
+                                               timeout=self.commit_interval)
+                batch = batches.popleft()
+            try:
+                self._commit(conn, batch.ops)
+            except Exception as e:
+                batch.error = e
+            batch.done.set()
+
+    def _commit(self, conn, ops):
+        created = removed = evicted = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for op in ops:
+                if op[0] == 'insert':
+                    session = op[1]
+                    conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                                 (session.token, session.user_login, session.expires_at))
+                    created += 1
+                else:
+                    deleted = conn.execute("DELETE FROM sessions WHERE token = ?", (op[1],)).rowcount
+                    op[2] = deleted > 0
+                    removed += deleted
+            if self.max_sessions:
+                live = self._live(conn) + created - removed
+                if live > self.max_sessions:
+                    evicted = conn.execute(
+                        "DELETE FROM sessions WHERE token IN"
+                        " (SELECT token FROM sessions ORDER BY expires_at LIMIT ?)",
+                        (live - self.max_sessions,)
+                    ).rowcount
+            conn.execute("UPDATE counters SET created = created + ?, removed = removed + ?,"
+                         " evicted = evicted + ? WHERE id = 0", (created, removed, evicted))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _live(conn):
+        created, expired, evicted, removed = conn.execute(
+            "SELECT created, expired, evicted, removed FROM counters WHERE id = 0").fetchone()
+        return created - expired - evicted - removed
+
+    def sweep(self, now=None):
+        """Удаление истекших сессий по индексу expires_at; возвращает число удаленных"""
+        if now is None:
+            now = time.time()
+        conn = self._reader()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            swept = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+            conn.execute("UPDATE counters SET expired = expired + ? WHERE id = 0", (swept,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return swept
+
+    def stats(self):
+        """Текущее число сессий и счетчики (общие для всех процессов)"""
+        created, expired, evicted, removed = self._reader().execute(
+            "SELECT created, expired, evicted, removed FROM counters WHERE id = 0").fetchone()
+        return {
+            "live": created - expired - evicted - removed,
+            "maxSessions": self.max_sessions,
+            "created": created,
+            "expired": expired,
+            "evicted": evicted,
+            "removed": removed,
+        }
+
+
+class MmapSessionStore(_PersistentMixin, _SweeperMixin):
+    """Сессии в файле фиксированных записей, отображенном в память.
+
+    Файл - хеш-таблица с открытой адресацией: слот выбирается по первым байтам
+    UUID токена, коллизии разрешаются линейным пробированием в пределах
+    PROBE_LIMIT слотов. Процессы синхронизируются через flock, потоки одного
+    процесса - через обычную блокировку.
+
+    Запись на диск (msync) выполняет фоновый поток раз в commit_interval, а не
+    каждый вход: данные переживают перезапуск процесса сразу, сбой машины -
+    с задержкой не больше commit_interval.
+
+    Лимит max_sessions приблизительный: если в окне пробирования нет свободного
+    слота или сессий слишком много, вытесняется запись окна с ближайшим сроком.
+    sweep() за вызов просматривает SWEEP_CHUNK слотов по кругу.
+    """
+
+    MAGIC = b'SESS'
+    VERSION = 1
+    # magic, версия, число слотов, created, expired, evicted, removed
+    HEADER = struct.Struct('<4sIIxxxxQQQQ')
+    HEADER_SIZE = 64
+    # состояние, длина логина, expires_at, UUID токена, логин
+    RECORD = struct.Struct('<BB6xd16s64s')
+    FREE, USED, DELETED = 0, 1, 2
+    PROBE_LIMIT = 32
+    SWEEP_CHUNK = 65536
+
+    def __init__(self, path, ttl=3600, max_sessions=None, commit_interval=0.05):
+        if fcntl is None:
+            raise RuntimeError("mmap session backend requires a POSIX system")
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.commit_interval = commit_interval
+        slots = 1
+        while slots < 2 * (max_sessions or 65536):
+            slots *= 2
+        self._requested_slots = slots
+        self._lock = threading.Lock()
+        self._pid = None
+        self._dirty = False
+        self._sweep_cursor = 0
+        self._sweeper = None
+        self._stop = threading.Event()
+        self._open()
+
+    def _open(self):
+        # Вызывается в каждом процессе: flock работает на уровне открытого
+        # файла, поэтому унаследованный после fork дескриптор не годится
+        if self._pid is not None:
+            self._mm.close()
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            header = os.pread(self._fd, self.HEADER.size, 0) if size >= self.HEADER_SIZE else b''
+            if len(header) == self.HEADER.size and header[:4] == self.MAGIC:
+                magic, version, slots = self.HEADER.unpack(header)[:3]
+                if version != self.VERSION:
+                    raise RuntimeError(f"Unsupported session file version {version}: {self.path}")
+            else:
+                slots = self._requested_slots
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.HEADER_SIZE + slots * self.RECORD.size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, self.VERSION, slots, 0, 0, 0, 0), 0)
+            self._slots = slots
+            self._mask = slots - 1
+            self._mm = mmap.mmap(self._fd, self.HEADER_SIZE + slots * self.RECORD.size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._pid = os.getpid()
+        flusher = threading.Thread(target=self._flush_loop, name="session-flusher")
+        flusher.daemon = True
+        flusher.start()
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield self._mm
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.commit_interval)
+            if self._dirty:
+                self._dirty = False
+                self._mm.flush()
+
+    def _offset(self, slot):
+        return self.HEADER_SIZE + slot * self.RECORD.size
+
+    def _probe(self, key):
+        start = int.from_bytes(key[:8], 'little') & self._mask
+        for i in range(min(self.PROBE_LIMIT, self._slots)):
+            yield (start + i) & self._mask
+
+    def _counters(self, mm):
+        return list(self.HEADER.unpack_from(mm, 0)[3:])
+
+    def _store_counters(self, mm, counters):
+        self.HEADER.pack_into(mm, 0, self.MAGIC, self.VERSION, self._slots, *counters)
+
+    @staticmethod
+    def _key(token):
+        try:
+            return uuid.UUID(token).bytes
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    def create(self, user_login):
+        """Новая сессия"""
+        login = user_login.encode('utf-8')
+        if len(login) > 64:
+            raise ValueError("user login is too long for the mmap session backend")
+        token = uuid.uuid4()
+        now = time.time()
+        session = Session(str(token), user_login, now + self.ttl)
+        record = self.RECORD.pack(self.USED, len(login), session.expires_at, token.bytes, login)
+        with self._locked(exclusive=True) as mm:
+            counters = self._counters(mm)
+            created, expired, evicted, removed = counters
+            over_limit = self.max_sessions and created - expired - evicted - removed >= self.max_sessions
+            target = victim = None
+            reclaimed = False
+            for slot in self._probe(token.bytes):
+                state, _, expires_at, _, _ = self.RECORD.unpack_from(mm, self._offset(slot))
+                if state != self.USED:
+                    if target is None:
+                        target = slot
+                    if state == self.FREE:
+                        break
+                elif expires_at <= now:
+                    if target is None:
+                        target = slot
+                        reclaimed = True
+                        counters[1] += 1
+                elif victim is None or expires_at < victim[1]:
+                    victim = (slot, expires_at)
+            if (target is None or (over_limit and not reclaimed)) and victim is not None:
+                if target is None:
+                    target = victim[0]
+                else:
+                    # Место есть, но лимит превышен: освобождаем самую старую запись окна
+                    mm[self._offset(victim[0])] = self.DELETED
+                counters[2] += 1
+            if target is None:
+                raise RuntimeError("session table is full")
+            mm[self._offset(target):self._offset(target) + self.RECORD.size] = record
+            counters[0] += 1
+            self._store_counters(mm, counters)
+        self._dirty = True
+        return session
+
+    def _find(self, mm, key):
+        for slot in self._probe(key):
+            state, length, expires_at, token, login = self.RECORD.unpack_from(mm, self._offset(slot))
+            if state == self.FREE:
+                return None
+            if state == self.USED and token == key:
+                return slot, expires_at, login[:length]
+        return None
+
+    def get(self, token):
+        """Действующая сессия по токену или None"""
+        key = self._key(token)
+        if key is None:
+            return None
+        with self._locked(exclusive=False) as mm:
+            found = self._find(mm, key)
+        if found is None or time.time() > found[1]:
+            return None
+        return Session(token, found[2].decode('utf-8'), found[1])
+
+    def remove(self, token):
+        """Удаление сессии (выход пользователя); True, если сессия была"""
+        key = self._key(token)
+        if key is None:
+            return False
+        with self._locked(exclusive=True) as mm:
+            found = self._find(mm, key)
+            if found is None:
+                return False
+            mm[self._offset(found[0])] = self.DELETED
+            counters = self._counters(mm)
+            counters[3] += 1
+            self._store_counters(mm, counters)
+        self._dirty = True
+        return True
+
+    def sweep(self, now=None):
+        """Пометка истекших сессий в очередной порции слотов; возвращает их число"""
+        if now is None:
+            now = time.time()
+        swept = 0
+        with self._locked(exclusive=True) as mm:
+            start = self._sweep_cursor
+            end = min(start + self.SWEEP_CHUNK, self._slots)
+            for slot in range(start, end):
+                offset = self._offset(slot)
+                if mm[offset] == self.USED and self.RECORD.unpack_from(mm, offset)[2] <= now:
+                    mm[offset] = self.DELETED
+                    swept += 1
+            self._sweep_cursor = 0 if end >= self._slots else end
+            if swept:
+                counters = self._counters(mm)
+                counters[1] += swept
+                self._store_counters(mm, counters)
+        if swept:
+            self._dirty = True
+        return swept
+
+    def stats(self):
+        """Текущее число сессий и счетчики (общие для всех процессов)"""
+        with self._locked(exclusive=False) as mm:
+            created, expired, evicted, removed = self._counters(mm)
+        return {
+            "live": created - expired - evicted - removed,
+            "maxSessions": self.max_sessions,
+            "created": created,
+            "expired": expired,
+            "evicted": evicted,
+            "removed": removed,
+        }
+
+
+class BloomFilter:
+    """Множество ключей в битовом массиве: "нет" - точно нет, "да" - с вероятностью ошибки error_rate.
+
+    Фильтр блочный: все биты ключа лежат в одном 64-битном слове, поэтому
+    проверка - одно чтение и одно сравнение. Ключи - 16 равномерно
+    распределенных байт (подписи HMAC): номер слова и биты берутся прямо из
+    них, без отдельных хеш-функций.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        wanted = -capacity * math.log(error_rate) / math.log(2) ** 2
+        words = 1
+        while words * 64 < wanted:
+            words *= 2
+        self.hashes = min(8, max(1, round(words * 64 / capacity * math.log(2))))
+        self._index_bits = words.bit_length() - 1
+        self._words = array('Q', bytes(words * 8))
+
+    def _locate(self, key):
+        value = int.from_bytes(key, 'little')
+        word = value & ((1 << self._index_bits) - 1)
+        value >>= self._index_bits
+        bits = 0
+        for _ in range(self.hashes):
+            bits |= 1 << (value & 63)
+            value >>= 6
+        return word, bits
+
+    def add(self, key):
+        word, bits = self._locate(key)
+        self._words[word] |= bits
+
+    def __contains__(self, key):
+        word, bits = self._locate(key)
+        return self._words[word] & bits == bits
+
+
+class RevocationList:
+    """Отозванные токены: журнал в общей памяти и локальный индекс в каждом процессе.
+
+    Журнал - анонимный mmap, созданный до fork: его видят все процессы
+    prefork. Запись - ключ токена и срок его действия; после срока запись не
+    нужна и удаляется при уплотнении. Каждый процесс читает новые записи
+    журнала в свой фильтр Блума и точное множество: проверка токена - чтение
+    заголовка журнала и, почти всегда, отрицательный ответ фильтра.
+
+    Если журнал полон записями, которые еще действуют, при уплотнении
+    удаляются записи с ближайшим сроком (счетчик overflowed): такие токены
+    снова считаются действующими до своего срока.
+    """
+
+    # поколение (растет при уплотнении), число записей
+    HEADER = struct.Struct('<QQ')
+    # ключ токена, срок действия
+    RECORD = struct.Struct('<16sd')
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._mm = mmap.mmap(-1, self.HEADER.size + capacity * self.RECORD.size)
+        self._lock = multiprocessing.Lock()
+        self.overflowed = 0
+        # Локальный индекс: до какой записи какого поколения прочитан журнал
+        self._generation = 0
+        self._seen = 0
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._exact = {}
+        # Растет при каждом изменении локального индекса
+        self.version = 0
+
+    def __len__(self):
+        return self.HEADER.unpack_from(self._mm, 0)[1]
+
+    def sync(self):
+        """Чтение новых записей журнала; True, если индекс изменился"""
+        generation, count = self.HEADER.unpack_from(self._mm, 0)
+        if generation == self._generation and count == self._seen:
+            return False
+        with self._lock:
+            generation, count = self.HEADER.unpack_from(self._mm, 0)
+            if generation != self._generation:
+                bloom, exact, start = BloomFilter(self.capacity, self.error_rate), {}, 0
+            else:
+                bloom, exact, start = self._bloom, self._exact, self._seen
+            for index in range(start, count):
+                key, expires_at = self.RECORD.unpack_from(self._mm, self.HEADER.size + index * self.RECORD.size)
+                bloom.add(key)
+                exact[key] = expires_at
+            self._bloom, self._exact = bloom, exact
+            self._generation, self._seen = generation, count
+            self.version += 1
+        return True
+
+    def records(self, now=None):
+        """Действующие записи журнала: [(ключ, срок), ...]"""
+        if now is None:
+            now = time.time()
+        self.sync()
+        return [(key, expires_at) for key, expires_at in self._exact.items() if expires_at > now]
+
+    def __contains__(self, key):
+        # Фильтр отвечает "нет" без обращения к словарю почти для всех токенов
+        return bool(self._exact) and key in self._bloom and key in self._exact
+
+    def revoke(self, key, expires_at):
+        with self._lock:
+            generation, count = self.HEADER.unpack_from(self._mm, 0)
+            if count >= self.capacity:
+                generation, count = self._compact(time.time(), generation, count)
+            self.RECORD.pack_into(self._mm, self.HEADER.size + count * self.RECORD.size, key, expires_at)
+            self.HEADER.pack_into(self._mm, 0, generation, count + 1)
+        self.sync()
+
+    def sweep(self, now=None):
+        """Уплотнение журнала, если он заполнен больше чем наполовину; возвращает число удаленных"""
+        if len(self) < self.capacity // 2:
+            return 0
+        with self._lock:
+            generation, count = self.HEADER.unpack_from(self._mm, 0)
+            _, kept = self._compact(time.time() if now is None else now, generation, count)
+        return count - kept
+
+    def _compact(self, now, generation, count):
+        """Перезапись журнала без истекших записей; вызывается под блокировкой"""
+        records = [self.RECORD.unpack_from(self._mm, self.HEADER.size + index * self.RECORD.size)
+                   for index in range(count)]
+        records = [record for record in records if record[1] > now]
+        if len(records) >= self.capacity:
+            # Место под новые записи: вытесняются записи с ближайшим сроком
+            records.sort(key=lambda record: record[1])
+            dropped = len(records) - self.capacity * 3 // 4
+            self.overflowed += dropped
+            records = records[dropped:]
+        for index, (key, expires_at) in enumerate(records):
+            self.RECORD.pack_into(self._mm, self.HEADER.size + index * self.RECORD.size, key, expires_at)
+        generation += 1
+        self.HEADER.pack_into(self._mm, 0, generation, len(records))
+        return generation, len(records)
+
+
+def load_secret(path):
+    """Ключ подписи из файла; если файла нет, он создается со случайным ключом"""
+    try:
+        with open(path, 'rb') as f:
+            secret = f.read().strip()
+    except FileNotFoundError:
+        secret = os.urandom(32).hex().encode('ascii')
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(secret)
+    if len(secret) < 32:
+        raise ValueError(f"session secret in {path} is shorter than 32 bytes")
+    return secret
+
+
+class SignedSessionStore(_SweeperMixin):
+    """Сессии без хранилища: токен сам содержит логин и срок и подписан HMAC-SHA256.
+
+    Токен: "<срок>.<nonce>.<логин hex>.<подпись hex>", подпись - первые 16 байт
+    HMAC-SHA256 от остальной части. Проверка -
+    только вычисление подписи, без общего состояния, поэтому токен, выданный
+    одним процессом или хостом с тем же ключом, принимается любым другим.
+    Проверенные токены кэшируются (до cache_size, затем кэш сбрасывается):
+    повторный запрос с тем же токеном стоит одного обращения к словарю.
+
+    Выход отзывает токен через RevocationList; ключ отзыва - подпись. Новый отзыв сбрасывает кэш проверенных токенов процесса.
+    Отзывы общие для процессов prefork, но не для разных хостов и не
+    переживают перезапуск, кроме переноса снимком (snapshot/restore). Без
+    secret ключ случайный, и токены перестают действовать при перезапуске,
+    как у хранилища в памяти, если случайный ключ не перенесен в снимке.
+    """
+
+    def __init__(self, secret=None, ttl=3600, max_revocations=100000, cache_size=65536):
+        self.ttl = ttl
+        self.max_sessions = None
+        self.cache_size = cache_size
+        self.revocations = RevocationList(max_revocations)
+        # Случайный ключ попадает в снимок, заданный (из файла) - нет
+        self._random_secret = None if secret else os.urandom(32)
+        self._mac = hmac.new(secret or self._random_secret, digestmod='sha256')
+        self._cache = {}
+        self._sweeper = None
+        self._stop = threading.Event()
+        # Счетчики процесса, который выдал или отозвал токен
+        self.created = 0
+        self.removed = 0
+        self.rejected = 0
+
+    def _sign(self, payload):
+        # Копия HMAC с уже обработанным ключом: ключ не хешируется на каждый токен
+        mac = self._mac.copy()
+        mac.update(payload.encode('ascii'))
+        return mac.digest()[:16]
+
+    def create(self, user_login):
+        """Новая сессия: токен подписывается, нигде не сохраняясь"""
+        expires_at = int(time.time() + self.ttl)
+        payload = f"{expires_at}.{os.urandom(8).hex()}.{user_login.encode('utf-8').hex()}"
+        self.created += 1
+        return Session(f"{payload}.{self._sign(payload).hex()}", user_login, expires_at)
+
+    def _verify(self, token):
+        """(сессия, ключ отзыва) для токена с верной подписью, иначе None"""
+        payload, _, signature = token.rpartition('.')
+        parts = payload.split('.')
+        # compare_digest не сравнивает строки с не-ASCII символами (TypeError)
+        if len(parts) != 3 or not token.isascii():
+            return None
+        expected = self._sign(payload)
+        if not hmac.compare_digest(signature, expected.hex()):
+            self.rejected += 1
+            return None
+        try:
+            return Session(token, bytes.fromhex(parts[2]).decode('utf-8'), int(parts[0])), expected
+        except (ValueError, UnicodeError):
+            return None
+
+    def get(self, token):
+        """Действующая сессия по токену или None"""
+        if self.revocations.sync():
+            self._cache.clear()
+        session = self._cache.get(token)
+        if session is None:
+            version = self.revocations.version
+            verified = self._verify(token)
+            if verified is None:
+                return None
+            session, key = verified
+            if key in self.revocations:
+                return None
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[token] = session
+            # Отзыв, прочитанный другим потоком во время проверки, мог уже сбросить кэш
+            if self.revocations.version != version:
+                self._cache.pop(token, None)
+        if time.time() > session.expires_at:
+            self._cache.pop(token, None)
+            return None
+        return session
+
+    def remove(self, token):
+        """Отзыв токена (выход пользователя); True, если токен действовал"""
+        verified = self._verify(token)
+        if verified is None:
+            return False
+        session, key = verified
+        self.revocations.sync()
+        if session.expires_at < time.time() or key in self.revocations:
+            return False
+        self.revocations.revoke(key, session.expires_at)
+        self._cache.clear()
+        self.removed += 1
+        return True
+
+    def sweep(self, now=None):
+        """Уплотнение журнала отзывов: записи истекших токенов не нужны"""
+        return self.revocations.sweep(now)
+
+    def snapshot(self):
+        """Действующие отзывы и случайный ключ подписи, если ключ не задан"""
+        state = {"revocations": [[key.hex(), expires_at] for key, expires_at in self.revocations.records()]}
+        if self._random_secret is not None:
+            state["secret"] = self._random_secret.hex()
+        return state
+
+    def restore(self, state):
+        """Загрузка снимка snapshot(); возвращает число перенесенных отзывов.
+
+        Случайный ключ снимка заменяет свой случайный ключ: токены, выданные
+        до перезапуска, остаются действительными. Заданный ключ не меняется.
+        """
+        secret = state.get("secret")
+        if secret and self._random_secret is not None:
+            self._random_secret = bytes.fromhex(secret)
+            self._mac = hmac.new(self._random_secret, digestmod='sha256')
+        now = time.time()
+        restored = 0
+        for key, expires_at in state.get("revocations", ()):
+            if expires_at > now:
+                self.revocations.revoke(bytes.fromhex(key), expires_at)
+                restored += 1
+        self._cache.clear()
+        return restored
+
+    def stats(self):
+        """Счетчики процесса; число действующих сессий без хранилища неизвестно"""
+        return {
+            "live": None,
+            "maxSessions": None,
+            "created": self.created,
+            "expired": 0,
+            "evicted": 0,
+            "removed": self.removed,
+            "revoked": len(self.revocations),
+            "revocationsOverflowed": self.revocations.overflowed,
+            "rejected": self.rejected,
+            "cached": len(self._cache),
+        }
+
+
+def create_session_store(backend='memory', path=None, ttl=3600, max_sessions=None, secret=None):
+    """Хранилище сессий по имени бэкенда: memory, sqlite, mmap или signed"""
+    if backend == 'signed':
+        return SignedSessionStore(secret, ttl=ttl, max_revocations=max_sessions or 100000)
+    if backend == 'memory':
+        return SessionStore(ttl=ttl, max_sessions=max_sessions)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(path or 'sessions.db', ttl=ttl, max_sessions=max_sessions)
+    if backend == 'mmap':
+        return MmapSessionStore(path or 'sessions.mmap', ttl=ttl, max_sessions=max_sessions)
+    raise ValueError(f"Unknown session backend: {backend}")
+
+
+class SessionManager(BaseManager):
+    """Процесс-менеджер, в котором живет общее для prefork-процессов хранилище"""
+
+
+SessionManager.register('SessionStore', SessionStore,
+                        exposed=('create', 'get', 'remove', 'sweep', 'stats', 'snapshot', 'restore',
+                                 'start_sweeper', 'stop_sweeper'))
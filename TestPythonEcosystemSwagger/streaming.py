@@ -0,0 +1,121 @@
+"""Потоковая отдача ответов чата: Transfer-Encoding: chunked и Server-Sent Events.
+
+Ответ делится на токены (слово вместе с пробелами после него), токены
+группируются по chunk_size и отправляются с паузой delay перед каждой группой,
+имитируя генерацию модели. Форматы:
+
+- 'chunked' - text/plain, каждая группа токенов - отдельный HTTP-чанк;
+- 'sse' - text/event-stream: события "data: {"token": ...}" и финальное
+  "event: done" с полным ответом.
+
+Для клиентов HTTP/1.0 чанки не используются: тело ограничено закрытием соединения.
+"""
+import json
+import re
+import socket
+import threading
+import time
+
+TOKEN_RE = re.compile(r'\S+\s*|\s+')
+
+CONTENT_TYPES = {
+    'chunked': 'text/plain; charset=utf-8',
+    'sse': 'text/event-stream; charset=utf-8',
+}
+
+
+class StreamSlots:
+    """Счетчик активных потоковых ответов с пределом limit.
+
+    Заменяет BoundedSemaphore: число занятых мест (active) нужно серверу,
+    чтобы при остановке дождаться незаконченных потоков.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Занять место; False, если все заняты (ожидания нет)"""
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            if self.active <= 0:
+                raise ValueError("StreamSlots released too many times")
+            self.active -= 1
+
+
+def split_tokens(text):
+    """Разбиение текста на токены; ''.join(split_tokens(t)) == t"""
+    return TOKEN_RE.findall(text)
+
+
+def iter_chunks(text, chunk_size):
+    """Группы по chunk_size токенов"""
+    tokens = split_tokens(text)
+    for i in range(0, len(tokens), chunk_size):
+        yield ''.join(tokens[i:i + chunk_size])
+
+
+def encode_event(stream_format, chunk):
+    """Байты одной порции ответа в выбранном формате (без HTTP-чанкинга)"""
+    if stream_format == 'sse':
+        return f"data: {json.dumps({'token': chunk}, ensure_ascii=False)}\n\n".encode('utf-8')
+    return chunk.encode('utf-8')
+
+
+def encode_done(stream_format, text):
+    """Завершающая порция: для SSE - событие done с полным ответом"""
+    if stream_format == 'sse':
+        return f"event: done\ndata: {json.dumps({'answer': text}, ensure_ascii=False)}\n\n".encode('utf-8')
+    return b''
+
+
+def frame_chunk(data):
+    """HTTP/1.1 чанк: длина в шестнадцатеричном виде, данные, CRLF"""
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+
+LAST_CHUNK = b'0\r\n\r\n'
+
+
+def stream_to_socket(sock, text, stream_format, chunked, delay, chunk_size, write_timeout):
+    """Отправка ответа в уже открытое соединение (заголовки отправлены заранее).
+
+    Запись блокирующая с таймаутом write_timeout: если клиент не успевает
+    читать и буфер сокета заполнен, поток ждет (обратное давление), а при
+    превышении таймаута поток обрывается. Возвращает (отправлен ли ответ
+    полностью, сколько байт отправлено).
+    """
+    sock.settimeout(write_timeout)
+    sent = 0
+    try:
+        for chunk in iter_chunks(text, chunk_size):
+            if delay:
+                time.sleep(delay)
+            data = encode_event(stream_format, chunk)
+            if chunked:
+                data = frame_chunk(data)
+            sock.sendall(data)
+            sent += len(data)
+        tail = encode_done(stream_format, text)
+        if chunked:
+            tail = (frame_chunk(tail) if tail else b'') + LAST_CHUNK
+        if tail:
+            sock.sendall(tail)
+            sent += len(tail)
+        return True, sent
+    except (socket.timeout, OSError):
+        return False, sent
+    finally:
+        try:
+            sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        sock.close()
@@ -0,0 +1,153 @@
+"""История чата: страницы по курсору, вытеснение и удаление историй истекших сессий"""
+import time
+import unittest
+
+from chat_history import ChatHistory, ChatHistoryStore
+
+
+def ids(messages):
+    return [message.id for message in messages]
+
+
+class ChatHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.history = ChatHistory(max_messages=100)
+        for i in range(10):
+            self.history.append(f"message {i}", "user")
+
+    def test_cursor_paging(self):
+        pages = []
+        after = None
+        while True:
+            messages, has_more = self.history.page(after, limit=4)
+            pages.append(ids(messages))
+            if not has_more:
+                break
+            after = messages[-1].id
+        self.assertEqual(pages, [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]])
+
+    def test_exact_last_page_has_no_more(self):
+        messages, has_more = self.history.page(6, limit=4)
+        self.assertEqual((ids(messages), has_more), ([7, 8, 9, 10], False))
+        self.assertEqual(self.history.page(10), ([], False))
+
+    def test_cursor_survives_deleted_message(self):
+        for message_id in (4, 5, 6):
+            self.assertTrue(self.history.delete(message_id))
+        self.assertFalse(self.history.delete(5))
+        messages, has_more = self.history.page(5, limit=2)
+        self.assertEqual((ids(messages), has_more), ([7, 8], True))
+        self.assertEqual(ids(self.history.page(2, limit=3)[0]), [3, 7, 8])
+        self.assertEqual(len(self.history), 7)
+
+    def test_update_and_get(self):
+        self.assertEqual(self.history.update(3, "edited").text, "edited")
+        self.assertEqual(self.history.get(3).text, "edited")
+        self.assertIsNone(self.history.update(99, "missing"))
+
+    def test_oldest_messages_are_evicted(self):
+        history = ChatHistory(max_messages=3)
+        for i in range(5):
+            history.append(f"message {i}", "user")
+        self.assertEqual(ids(history.page()[0]), [3, 4, 5])
+        self.assertEqual(history.evicted, 2)
+        self.assertIsNone(history.get(1))
+        self.assertEqual(ids(history.page(1)[0]), [3, 4, 5])
+
+    def test_log_is_compacted(self):
+        history = ChatHistory(max_messages=10)
+        for i in range(1000):
+            history.delete(history.append(f"message {i}", "user").id)
+        history.append("last", "assistant")
+        self.assertLess(len(history._log), 200)
+        self.assertEqual(ids(history.page()[0]), [1001])
+
+    def test_clear_keeps_settings_and_ids(self):
+        self.history.settings["temperature"] = 50
+        self.assertEqual(self.history.clear(), 10)
+        self.assertEqual(self.history.page(), ([], False))
+        self.assertEqual(self.history.append("new", "user").id, 11)
+        self.assertEqual(self.history.settings, {"temperature": 50})
+
+    def test_snapshot_round_trip(self):
+        self.history.delete(2)
+        self.history.settings["topP"] = 90
+        restored = ChatHistory.from_snapshot(100, self.history.snapshot())
+        self.assertEqual([m.to_dict() for m in restored.page(limit=100)[0]],
+                         [m.to_dict() for m in self.history.page(limit=100)[0]])
+        self.assertEqual(restored.settings, {"topP": 90})
+        self.assertEqual(restored.append("next", "user").id, 11)
+
+
+class ChatHistoryStoreTest(unittest.TestCase):
+    def test_page_returns_dicts_and_cursor(self):
+        store = ChatHistoryStore()
+        for i in range(3):
+            store.append('token', f"message {i}", "user")
+        messages, next_cursor = store.page('token', limit=2)
+        self.assertEqual([m["id"] for m in messages], [1, 2])
+        self.assertEqual(next_cursor, 2)
+        self.assertEqual(store.page('token', after=next_cursor), ([store.page('token')[0][2]], None))
+        self.assertEqual(store.page('unknown'), ([], None))
+
+    def test_least_recently_used_history_is_evicted(self):
+        store = ChatHistoryStore(max_sessions=2)
+        store.append('a', "hi", "user")
+        store.set_setting('b', 'temperature', 50)
+        store.page('a')
+        store.append('c', "hi", "user")
+        self.assertEqual(store.page('a')[0][0]["text"], "hi")
+        self.assertEqual(store.settings('b'), {})
+        self.assertEqual(store.settings('c'), {})
+        self.assertEqual(list(store.snapshot()), ['a', 'c'])
+
+    def test_drop(self):
+        store = ChatHistoryStore()
+        store.append('a', "hi", "user")
+        store.drop('a')
+        store.drop('missing')
+        self.assertEqual(store.page('a'), ([], None))
+
+    def test_sweep_drops_histories_of_expired_sessions(self):
+        store = ChatHistoryStore()
+        now = time.time()
+        store.set_setting('live', 'topP', 90, now + 60)
+        store.append('forever', "hi", "user")
+        # Создание истории удаляет уже истекшие, поэтому истекшая создается последней
+        store.append('expired', "hi", "user", now - 1)
+        self.assertEqual(store.sweep(now), 1)
+        self.assertEqual(list(store.snapshot()), ['live', 'forever'])
+        self.assertEqual(store.sweep(now + 61), 1)
+        self.assertEqual(list(store.snapshot()), ['forever'])
+
+    def test_expired_histories_are_dropped_on_create(self):
+        store = ChatHistoryStore(max_sessions=2)
+        store.append('live', "hi", "user", time.time() + 60)
+        store.append('expired', "hi", "user", time.time() - 1)
+        store.append('new', "hi", "user")
+        # Место освободила истекшая история, а не давно не использованная живая
+        self.assertEqual(list(store.snapshot()), ['live', 'new'])
+
+    def test_restore_skips_expired_histories(self):
+        store = ChatHistoryStore()
+        store.append('live', "hi", "user", time.time() + 60)
+        state = store.snapshot()
+        state['expired'] = dict(state['live'], expiresAt=time.time() - 1)
+        restored = ChatHistoryStore()
+        self.assertEqual(restored.restore(state), 1)
+        self.assertEqual(restored.page('live')[0][0]["text"], "hi")
+        self.assertEqual(restored.sweep(time.time() + 61), 1)
+
+    def test_sweeper_thread(self):
+        store = ChatHistoryStore()
+        store.append('a', "hi", "user", time.time() + 0.05)
+        store.start_sweeper(0.02)
+        self.addCleanup(store.stop_sweeper)
+        deadline = time.time() + 2
+        while store.snapshot() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(store.snapshot(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
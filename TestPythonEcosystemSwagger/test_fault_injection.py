@@ -0,0 +1,89 @@
+"""Загрузка профиля сбоев: проверка формата и выбор ошибки и задержки"""
+import unittest
+from types import SimpleNamespace
+
+from fault_injection import FaultInjector
+
+CHAT = SimpleNamespace(method='POST', path='/api/chat/send')
+HEALTH = SimpleNamespace(method='GET', path='/api/health')
+
+
+class FaultProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.injector = FaultInjector()
+
+    def test_valid_profile(self):
+        self.injector.load({
+            "seed": 42,
+            "routes": {
+                "post /api/chat/send": {
+                    "latency": {"distribution": "fixed", "ms": 250},
+                    "errors": [{"status": 503, "rate": 1}],
+                    "drip": {"bytes": 16, "interval_ms": 50},
+                },
+            },
+        })
+        self.assertTrue(self.injector.active)
+        error, delay = self.injector.decide(CHAT)
+        self.assertEqual(error.status, 503)
+        self.assertEqual(delay, (0.25, 16, 0.05))
+        self.assertEqual(self.injector.decide(HEALTH), (None, None))
+
+    def test_default_route_and_retry_after(self):
+        self.injector.load({"routes": {"*": {"errors": [{"status": 429, "rate": 1, "retryAfter": 3}]}}})
+        error, delay = self.injector.decide(HEALTH)
+        self.assertEqual(error.status, 429)
+        self.assertIsNone(delay)
+
+    def test_seed_makes_choices_repeatable(self):
+        profile = {"seed": 7, "routes": {"*": {"latency": {"distribution": "normal",
+                                                           "mean_ms": 100, "stddev_ms": 30}}}}
+        samples = []
+        for _ in range(2):
+            self.injector.load(profile)
+            samples.append([self.injector.decide(CHAT)[1][0] for _ in range(5)])
+        self.assertEqual(samples[0], samples[1])
+
+    def test_invalid_profiles_raise_value_error(self):
+        invalid = [
+            [],
+            {"routes": []},
+            {"seed": "42", "routes": {}},
+            {"seed": True, "routes": {}},
+            {"seed": 1.5, "routes": {}},
+            {"routes": {"*": []}},
+            {"routes": {"*": {"latency": 5}}},
+            {"routes": {"*": {"latency": {"distribution": "fixed"}}}},
+            {"routes": {"*": {"latency": {"distribution": "fixed", "ms": "5"}}}},
+            {"routes": {"*": {"latency": {"distribution": "pareto"}}}},
+            {"routes": {"*": {"errors": {"status": 503, "rate": 0.5}}}},
+            {"routes": {"*": {"errors": [503]}}},
+            {"routes": {"*": {"errors": [{"status": 404, "rate": 0.5}]}}},
+            {"routes": {"*": {"errors": [{"status": 503, "rate": 0.7}, {"status": 500, "rate": 0.7}]}}},
+            {"routes": {"*": {"drip": [16, 50]}}},
+            {"routes": {"*": {"drip": {"bytes": -1}}}},
+            {"routes": {"/api/chat/send": {}}},
+        ]
+        for profile in invalid:
+            with self.subTest(profile=profile):
+                with self.assertRaises(ValueError):
+                    self.injector.load(profile)
+
+    def test_invalid_profile_keeps_current_one(self):
+        profile = {"routes": {"*": {"latency": {"distribution": "fixed", "ms": 10}}}}
+        self.injector.load(profile)
+        with self.assertRaises(ValueError):
+            self.injector.load({"routes": {"*": {"latency": 10}}})
+        self.assertIs(self.injector.profile, profile)
+        self.assertEqual(self.injector.decide(CHAT)[1], (0.01, 0, 0.0))
+
+    def test_clear(self):
+        self.injector.load({"routes": {"*": {"latency": {"distribution": "fixed", "ms": 10}}}})
+        self.injector.clear()
+        self.assertFalse(self.injector.active)
+        self.assertIsNone(self.injector.profile)
+        self.assertEqual(self.injector.decide(CHAT), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
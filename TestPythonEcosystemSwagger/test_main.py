@@ -0,0 +1,284 @@
+"""Сервер main.py: таблица маршрутов, заранее собранные ответы Swagger, снимок состояния, keep-alive в режиме single"""
+import gzip
+import http.client
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from unittest import mock
+
+import main
+from chat_history import ChatHistoryStore
+from lifecycle import load_state, save_state
+from main import PrecomputedResponse, Router
+from sessions import SessionStore
+
+BODY = json.dumps({"openapi": "3.0.0", "paths": {f"/api/{i}": {} for i in range(50)}}).encode('utf-8')
+
+
+class RouterTest(unittest.TestCase):
+    def setUp(self):
+        self.router = Router()
+        self.router.add('GET', '/api/chat/history', 'history')
+        self.router.add('DELETE', '/api/chat/message', 'delete')
+        self.router.add('DELETE', '/api/chat/message/{messageId}', 'delete_by_id', auth=True)
+        self.router.add('PUT', '/api/chat/message/{messageId}', 'update_by_id')
+        self.router.add('GET', '/api/users/{login}/messages/{messageId}', 'user_message')
+
+    def test_static_route(self):
+        route, params = self.router.resolve('GET', '/api/chat/history')
+        self.assertEqual((route.handler, route.path, params), ('history', '/api/chat/history', {}))
+
+    def test_path_parameters(self):
+        route, params = self.router.resolve('DELETE', '/api/chat/message/42')
+        self.assertEqual((route.handler, route.auth, params), ('delete_by_id', True, {'messageId': '42'}))
+        route, params = self.router.resolve('GET', '/api/users/%D0%B8%D0%BC%D1%8F/messages/7')
+        self.assertEqual((route.handler, params), ('user_message', {'login': 'имя', 'messageId': '7'}))
+
+    def test_static_path_is_not_a_parameter_value(self):
+        self.assertEqual(self.router.resolve('DELETE', '/api/chat/message')[0].handler, 'delete')
+
+    def test_unknown_path(self):
+        for path in ('/api/unknown', '/api/chat/message/', '/api/chat/message/1/extra', '/api/users/x/messages'):
+            with self.subTest(path=path):
+                self.assertEqual(self.router.resolve('GET', path), (None, {}))
+
+    def test_method_not_allowed_lists_allowed_methods(self):
+        self.assertEqual(self.router.resolve('POST', '/api/chat/history'), (None, ['GET', 'OPTIONS']))
+        self.assertEqual(self.router.resolve('GET', '/api/chat/message/1'), (None, ['DELETE', 'PUT', 'OPTIONS']))
+
+    def test_conflicting_parameter_names(self):
+        with self.assertRaises(ValueError):
+            self.router.add('GET', '/api/chat/message/{id}', 'other')
+
+    def test_routes(self):
+        self.assertEqual(sorted(route.handler for route in self.router.routes()),
+                         ['delete', 'delete_by_id', 'history', 'update_by_id', 'user_message'])
+
+    def test_api_table_matches_spec(self):
+        """Каждая операция спецификации есть в таблице маршрутов, и наоборот"""
+        spec = main.build_swagger_spec(8000)
+        operations = {(method.upper(), path) for path, methods in spec['paths'].items() for method in methods}
+        routes = {(route.method, route.path) for route in main.build_router().routes()}
+        self.assertEqual(routes - {('GET', '/'), ('GET', '/swagger.json')}, operations)
+
+
+class PrecomputedResponseTest(unittest.TestCase):
+    def setUp(self):
+        self.response = PrecomputedResponse(BODY, 'application/json')
+
+    def test_variants_decode_to_same_body(self):
+        self.assertEqual(gzip.decompress(self.response.bodies['gzip']), BODY)
+        self.assertEqual(zlib.decompress(self.response.bodies['deflate']), BODY)
+        self.assertEqual(self.response.bodies['identity'], BODY)
+
+    def test_strong_etag_per_encoding(self):
+        etags = self.response.etags
+        self.assertEqual(len(set(etags.values())), 3)
+        for etag in etags.values():
+            self.assertFalse(etag.startswith('W/'))
+            self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        self.assertEqual(PrecomputedResponse(BODY, 'application/json').etags, etags)
+        self.assertNotEqual(PrecomputedResponse(BODY + b' ', 'application/json').etags['identity'],
+                            etags['identity'])
+
+    def test_choose_encoding(self):
+        cases = [
+            (None, 'identity'),
+            ('', 'identity'),
+            ('gzip', 'gzip'),
+            ('deflate', 'deflate'),
+            ('gzip, deflate, br', 'gzip'),
+            ('deflate, gzip', 'gzip'),
+            ('gzip;q=0.5, deflate', 'deflate'),
+            ('GZIP', 'gzip'),
+            ('br', 'identity'),
+            ('identity', 'identity'),
+            ('*', 'gzip'),
+            ('gzip;q=0, *;q=0.5', 'deflate'),
+            ('gzip;q=0, deflate;q=0', 'identity'),
+            ('gzip;q=abc', 'identity'),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(self.response.choose_encoding(header), expected)
+
+    def test_incompressible_body_has_only_identity(self):
+        response = PrecomputedResponse(b'{}', 'application/json')
+        self.assertEqual(list(response.bodies), ['identity'])
+        self.assertEqual(response.choose_encoding('gzip'), 'identity')
+
+    def test_matches(self):
+        etags = self.response.etags
+        self.assertTrue(self.response.matches(etags['gzip']))
+        self.assertTrue(self.response.matches(f'"other", {etags["identity"]}'))
+        self.assertTrue(self.response.matches(f'W/{etags["deflate"]}'))
+        self.assertTrue(self.response.matches('*'))
+        for header in (None, '', '"other"', etags['gzip'].strip('"')):
+            with self.subTest(header=header):
+                self.assertFalse(self.response.matches(header))
+
+
+class StateTest(unittest.TestCase):
+    """collect_state/restore_state: сессии и история чата переживают перезапуск"""
+
+    def use_stores(self, backend='memory'):
+        """Новые хранилища вместо глобальных хранилищ сервера на время теста"""
+        stores = SessionStore(ttl=60), ChatHistoryStore()
+        for name, value in (('session_store', stores[0]), ('chat_history', stores[1]), ('session_backend', backend)):
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return stores
+
+    def saved_state(self):
+        """Снимок, прошедший через файл --state-file"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'state.json')
+        sessions, histories = self.use_stores()
+        session = sessions.create('пользователь')
+        histories.append(session.token, "привет", "user", session.expires_at)
+        histories.set_setting(session.token, 'temperature', 50)
+        save_state(path, main.collect_state())
+        return session, load_state(path)
+
+    def test_round_trip(self):
+        session, state = self.saved_state()
+        sessions, histories = self.use_stores()
+        main.restore_state(state)
+        restored = sessions.get(session.token)
+        self.assertEqual(restored.user_login, 'пользователь')
+        self.assertAlmostEqual(restored.expires_at, session.expires_at, places=3)
+        messages, _ = histories.page(session.token)
+        self.assertEqual([(m["text"], m["type"]) for m in messages], [("привет", "user")])
+        self.assertEqual(histories.settings(session.token), {"temperature": 50})
+
+    def test_other_session_backend_keeps_only_chat_history(self):
+        session, state = self.saved_state()
+        sessions, histories = self.use_stores(backend='sqlite')
+        main.restore_state(state)
+        self.assertIsNone(sessions.get(session.token))
+        self.assertEqual(len(histories.page(session.token)[0]), 1)
+
+    def test_unsupported_version_is_skipped(self):
+        session, state = self.saved_state()
+        state["version"] = main.STATE_VERSION + 1
+        sessions, histories = self.use_stores()
+        with self.assertLogs(main.logger, 'WARNING'):
+            main.restore_state(state)
+        self.assertEqual(len(sessions), 0)
+        self.assertEqual(histories.snapshot(), {})
+
+    def test_expired_sessions_are_not_restored(self):
+        session, state = self.saved_state()
+        sessions, _ = self.use_stores()
+        with mock.patch('time.time', return_value=time.time() + 61):
+            main.restore_state(state)
+        self.assertEqual(len(sessions), 0)
+
+
+class ServerTestCase(unittest.TestCase):
+    """Сервер в режиме single на свободном порту, общий для тестов класса"""
+
+    @classmethod
+    def setUpClass(cls):
+        main.access_log.enabled = False
+        cls.httpd = main.create_server(main.parse_args(['--host', '127.0.0.1', '--port', '0', '--mode', 'single']))
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+
+
+class SwaggerEndpointTest(ServerTestCase):
+    """_send_precomputed на работающем сервере"""
+
+    def get(self, path, headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.httpd.server_port, timeout=5)
+        self.addCleanup(connection.close)
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        return response, response.read()
+
+    def test_encodings(self):
+        spec = self.httpd.swagger_spec
+        for accept, encoding in (('gzip', 'gzip'), ('deflate', 'deflate'), ('identity', 'identity'), ('', 'identity')):
+            with self.subTest(accept=accept):
+                response, body = self.get('/swagger.json', {'Accept-Encoding': accept})
+                self.assertEqual(response.status, 200)
+                self.assertEqual(response.getheader('Content-Encoding'), None if encoding == 'identity' else encoding)
+                self.assertEqual(response.getheader('ETag'), spec.etags[encoding])
+                self.assertEqual(response.getheader('Vary'), 'Accept-Encoding')
+                self.assertEqual(int(response.getheader('Content-Length')), len(body))
+                self.assertEqual(body, spec.bodies[encoding])
+        self.assertIn('/api/auth/login', json.loads(spec.bodies['identity'])['paths'])
+
+    def test_if_none_match_returns_304_without_body(self):
+        for path, response in (('/swagger.json', self.httpd.swagger_spec), ('/', self.httpd.swagger_ui)):
+            with self.subTest(path=path):
+                first, _ = self.get(path, {'Accept-Encoding': 'gzip'})
+                etag = first.getheader('ETag')
+                self.assertEqual(etag, response.etags['gzip'])
+                second, body = self.get(path, {'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+                self.assertEqual(second.status, 304)
+                self.assertEqual(body, b'')
+                self.assertEqual(second.getheader('ETag'), etag)
+                self.assertIsNone(second.getheader('Content-Length'))
+
+    def test_stale_etag_returns_body(self):
+        response, body = self.get('/swagger.json', {'If-None-Match': '"stale"'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, self.httpd.swagger_spec.bodies['identity'])
+
+
+class MethodNotAllowedTest(ServerTestCase):
+    def test_405_with_allow_header(self):
+        for method, path, allow in (('POST', '/api/health', 'GET, OPTIONS'),
+                                    ('GET', '/api/chat/message/5', 'DELETE, OPTIONS'),
+                                    ('DELETE', '/api/admin/faults/', None)):
+            with self.subTest(method=method, path=path):
+                connection = http.client.HTTPConnection('127.0.0.1', self.httpd.server_port, timeout=5)
+                self.addCleanup(connection.close)
+                connection.request(method, path)
+                response = connection.getresponse()
+                response.read()
+                self.assertEqual(response.status, 405 if allow else 404)
+                self.assertEqual(response.getheader('Allow'), allow)
+
+
+class SingleModeKeepAliveTest(ServerTestCase):
+    """Единственный поток не ждет простаивающего клиента, но отвечает на конвейер"""
+
+    HEALTH = b'GET /api/health HTTP/1.1\r\nHost: localhost\r\n\r\n'
+
+    def exchange(self, data):
+        """Все ответы до закрытия соединения сервером"""
+        with socket.create_connection(('127.0.0.1', self.httpd.server_port), timeout=5) as sock:
+            sock.sendall(data)
+            received = b''
+            while chunk := sock.recv(65536):
+                received += chunk
+        return received
+
+    def test_pipelined_requests_share_connection(self):
+        received = self.exchange(self.HEALTH * 20)
+        self.assertEqual(received.count(b'HTTP/1.1 200 OK'), 20)
+        # Закрывает соединение только ответ на последний запрос конвейера
+        self.assertEqual(received.count(b'Connection: close'), 1)
+        self.assertTrue(received.rsplit(b'HTTP/1.1 200 OK', 1)[1].find(b'Connection: close') > 0)
+
+    def test_idle_connection_is_closed_after_response(self):
+        received = self.exchange(self.HEALTH)
+        self.assertEqual(received.count(b'HTTP/1.1 200 OK'), 1)
+        self.assertIn(b'Connection: close', received)
+
+
+if __name__ == '__main__':
+    unittest.main()
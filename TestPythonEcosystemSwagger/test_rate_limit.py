@@ -0,0 +1,74 @@
+"""Token bucket: пополнение корзины, Retry-After и удаление простаивающих корзин"""
+import unittest
+from unittest import mock
+
+from rate_limit import TokenBucketLimiter
+
+
+class TokenBucketLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('rate_limit.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_limited(self):
+        limiter = TokenBucketLimiter(rate=2, burst=3)
+        self.assertEqual([limiter.acquire('a') for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(limiter.acquire('a'), 0.5)
+        # У другого ключа своя корзина
+        self.assertEqual(limiter.acquire('b'), 0.0)
+        stats = limiter.stats()
+        self.assertEqual((stats["allowed"], stats["limited"], stats["buckets"]), (4, 1, 2))
+
+    def test_refill(self):
+        limiter = TokenBucketLimiter(rate=2, burst=3)
+        for _ in range(3):
+            limiter.acquire('a')
+        self.now += 0.25
+        self.assertAlmostEqual(limiter.acquire('a'), 0.25)
+        self.now += 0.25
+        self.assertEqual(limiter.acquire('a'), 0.0)
+        self.assertGreater(limiter.acquire('a'), 0)
+
+    def test_refill_is_capped_at_burst(self):
+        limiter = TokenBucketLimiter(rate=2, burst=3)
+        limiter.acquire('a')
+        self.now += 3600
+        self.assertEqual([limiter.acquire('a') for _ in range(3)], [0.0, 0.0, 0.0])
+        self.assertGreater(limiter.acquire('a'), 0)
+
+    def test_default_burst(self):
+        self.assertEqual(TokenBucketLimiter(rate=5).burst, 5)
+        self.assertEqual(TokenBucketLimiter(rate=0.5).burst, 1)
+
+    def test_idle_buckets_are_evicted(self):
+        limiter = TokenBucketLimiter(rate=1, burst=2, shards=1)
+        limiter.acquire('idle')
+        self.now += 1
+        limiter.acquire('active')
+        self.now += 1.5
+        # 'idle' простаивала burst / rate секунд и снова полна: ее место освобождается
+        limiter.acquire('new')
+        self.assertEqual(list(limiter._shards[0].buckets), ['active', 'new'])
+        self.assertEqual(limiter.stats()["evicted"], 1)
+
+    def test_least_recently_used_bucket_is_evicted_when_full(self):
+        limiter = TokenBucketLimiter(rate=1, burst=10, max_keys=2, shards=1)
+        limiter.acquire('a')
+        limiter.acquire('b')
+        limiter.acquire('a')
+        limiter.acquire('c')
+        self.assertEqual(list(limiter._shards[0].buckets), ['a', 'c'])
+        stats = limiter.stats()
+        self.assertEqual((stats["buckets"], stats["evicted"]), (2, 1))
+
+    def test_invalid_arguments(self):
+        for kwargs in ({"rate": 0}, {"rate": -1}, {"rate": 1, "shards": 3}):
+            with self.subTest(**kwargs):
+                with self.assertRaises(ValueError):
+                    TokenBucketLimiter(**kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+"""Чтение тела запроса: Content-Length, chunked и запросы подряд на keep-alive соединении"""
+import asyncio
+import http.client
+import io
+import unittest
+
+from async_server import AsyncHTTPServer, BadRequest
+from request_body import MAX_CHUNK_LINE, READ_CHUNK, BodyError, read_body
+
+LOGIN = b'Login=user&Password=secret'
+CHUNKED_LOGIN = (b'POST /api/auth/login HTTP/1.1\r\nHost: localhost\r\n'
+                 b'Transfer-Encoding: chunked\r\n\r\n'
+                 b'a;ext=1\r\nLogin=user\r\n10\r\n&Password=secret\r\n0\r\nX-Trailer: 1\r\n\r\n')
+HEALTH = b'GET /api/health HTTP/1.1\r\nHost: localhost\r\n\r\n'
+# Тела chunked, которые оба движка отклоняют одинаково (предел тела - 1024 байта)
+BAD_CHUNKED = [
+    (b'5\r\nabc', 400),                         # порция оборвана
+    (b'3\r\nabcX\r\n0\r\n\r\n', 400),           # нет CRLF после порции
+    (b'zz\r\nabc\r\n0\r\n\r\n', 400),           # размер не шестнадцатеричный
+    (b'-3\r\nabc\r\n0\r\n\r\n', 400),
+    (b'0x3\r\nabc\r\n0\r\n\r\n', 400),
+    (b'0_3\r\nabc\r\n0\r\n\r\n', 400),
+    (b'3\r\nabc\r\n', 400),                     # нет последней порции
+    (b'3\r\nabc\r\n0\r\nX-Trailer: 1', 400),    # оборваны завершающие заголовки
+    (b'1' * (MAX_CHUNK_LINE + 1) + b'\r\n', 400),
+    (b'800\r\n' + b'x' * 2048 + b'\r\n0\r\n\r\n', 413),
+]
+
+
+def read_request(rfile, max_size=1024 * 1024):
+    """Строка запроса, заголовки и тело - как их читает потоковый движок"""
+    requestline = rfile.readline()
+    if not requestline:
+        return None
+    headers = http.client.parse_headers(rfile)
+    return requestline.split()[1].decode('ascii'), headers, bytes(read_body(rfile, headers, max_size))
+
+
+def chunked(body_lines):
+    headers = http.client.parse_headers(io.BytesIO(b'Transfer-Encoding: chunked\r\n\r\n'))
+    return io.BytesIO(body_lines), headers
+
+
+class ReadBodyTest(unittest.TestCase):
+    def test_content_length(self):
+        rfile = io.BytesIO(b'POST /api/auth/login HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s' % (len(LOGIN), LOGIN))
+        self.assertEqual(read_request(rfile)[2], LOGIN)
+
+    def test_large_body_is_read_in_parts(self):
+        body = b'x' * (3 * READ_CHUNK + 5)
+        headers = http.client.parse_headers(io.BytesIO(b'Content-Length: %d\r\n\r\n' % len(body)))
+        self.assertEqual(bytes(read_body(io.BytesIO(body), headers, 0)), body)
+
+    def test_chunked_body_replaces_headers(self):
+        path, headers, body = read_request(io.BytesIO(CHUNKED_LOGIN))
+        self.assertEqual(body, LOGIN)
+        self.assertIsNone(headers.get('Transfer-Encoding'))
+        self.assertEqual(headers.get_all('Content-Length'), [str(len(LOGIN))])
+
+    def test_keep_alive_requests_follow_body(self):
+        stream = io.BytesIO(CHUNKED_LOGIN + HEALTH + b'POST /api/auth/logout HTTP/1.1\r\nContent-Length: 3\r\n\r\nabc'
+                            + CHUNKED_LOGIN)
+        requests = []
+        while (request := read_request(stream)) is not None:
+            requests.append((request[0], request[2]))
+        self.assertEqual(requests, [('/api/auth/login', LOGIN), ('/api/health', b''),
+                                    ('/api/auth/logout', b'abc'), ('/api/auth/login', LOGIN)])
+
+    def test_errors(self):
+        for body, status in BAD_CHUNKED:
+            with self.subTest(body=body[:20]):
+                with self.assertRaises(BodyError) as raised:
+                    read_body(*chunked(body), 1024)
+                self.assertEqual(raised.exception.status, status)
+
+    def test_other_transfer_encodings_are_not_supported(self):
+        headers = http.client.parse_headers(io.BytesIO(b'Transfer-Encoding: gzip, chunked\r\n\r\n'))
+        with self.assertRaises(BodyError) as raised:
+            read_body(io.BytesIO(b''), headers, 1024)
+        self.assertEqual(raised.exception.status, 501)
+
+    def test_invalid_content_length(self):
+        for value, status in ((b'abc', 400), (b'-1', 400), (b'4096', 413)):
+            with self.subTest(value=value):
+                headers = http.client.parse_headers(io.BytesIO(b'Content-Length: %s\r\n\r\n' % value))
+                with self.assertRaises(BodyError) as raised:
+                    read_body(io.BytesIO(b''), headers, 1024)
+                self.assertEqual(raised.exception.status, status)
+
+
+class AsyncReadRequestTest(unittest.TestCase):
+    """Тот же разбор в asyncio-движке"""
+
+    def setUp(self):
+        self.server = AsyncHTTPServer(('127.0.0.1', 0), None, max_body_size=1024)
+        self.addCleanup(self.server.socket.close)
+
+    def read_all(self, data):
+        async def read():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            requests = []
+            while (request := await self.server._read_request(reader, None)) is not None:
+                requests.append(request)
+            return requests
+        return asyncio.run(read())
+
+    def test_keep_alive_requests_follow_chunked_body(self):
+        requests = self.read_all(CHUNKED_LOGIN + HEALTH + b'\r\n' + CHUNKED_LOGIN)
+        self.assertEqual([(r.path, r.body) for r in requests],
+                         [('/api/auth/login', LOGIN), ('/api/health', b''), ('/api/auth/login', LOGIN)])
+        self.assertEqual(requests[0].headers['Content-Length'], str(len(LOGIN)))
+        self.assertFalse(requests[1].wants_close())
+
+    def test_chunked_errors_match_threaded_reader(self):
+        head = b'POST /api/auth/login HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+        for body, status in BAD_CHUNKED:
+            with self.subTest(body=body[:20]):
+                with self.assertRaises(BadRequest) as raised:
+                    self.read_all(head + body)
+                self.assertEqual(raised.exception.status, status)
+
+    def test_bare_lf_chunk_lines(self):
+        data = b'POST /api/auth/login HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\nabc\n0\n\n'
+        self.assertEqual(self.read_all(data + HEALTH)[0].body, b'abc')
+        self.assertEqual(bytes(read_body(*chunked(b'3\nabc\n0\n\n'), 1024)), b'abc')
+
+    def test_errors(self):
+        for data, status in ((HEALTH.replace(b'HTTP/1.1', b'HTTP/2.0'), 505),
+                             (CHUNKED_LOGIN.replace(b'chunked', b'gzip'), 501),
+                             (CHUNKED_LOGIN.replace(b'\r\na;ext=1', b'\r\nzz'), 400),
+                             (b'POST / HTTP/1.1\r\nContent-Length: 2048\r\n\r\n', 413)):
+            with self.subTest(status=status):
+                with self.assertRaises(BadRequest) as raised:
+                    self.read_all(data)
+                self.assertEqual(raised.exception.status, status)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Кэш закодированных JSON-ответов: попадание со второго раза и смена содержимого"""
+import json
+import unittest
+
+from responses import EncodedResponse, ResponseCache
+
+
+def body(response):
+    return json.loads(response.body)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(max_entries=4, window=8)
+
+    def test_response_is_cached_on_second_occurrence(self):
+        data = {"value": 50}
+        self.assertIsNone(self.cache.get(data))
+        response = self.cache.get(data)
+        self.assertIsInstance(response, EncodedResponse)
+        self.assertEqual(body(response), data)
+        self.assertIs(self.cache.get({"value": 50}), response)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_added_response_hits_immediately(self):
+        response = self.cache.add({"error": "Invalid session"}, 401)
+        self.assertIs(self.cache.get({"error": "Invalid session"}, 401), response)
+        self.assertEqual(response.status, 401)
+
+    def test_changed_content_is_not_served_from_cache(self):
+        """Ключ - само содержимое: новое значение никогда не получает старый ответ"""
+        for _ in range(2):
+            cached = self.cache.get({"value": 50})
+        self.assertIsNone(self.cache.get({"value": 51}))
+        self.assertEqual(body(self.cache.get({"value": 51})), {"value": 51})
+        self.assertIs(self.cache.get({"value": 50}), cached)
+        # Тот же объект с другим статусом или порядком полей - другой ответ
+        self.assertIsNone(self.cache.get({"value": 50}, 201))
+        self.cache.add({"a": 1, "b": 2})
+        self.assertIsNone(self.cache.get({"b": 2, "a": 1}))
+
+    def test_bool_and_float_values_are_not_cached(self):
+        for _ in range(2):
+            cached = self.cache.get({"value": 1})
+        self.assertIsNone(self.cache.get({"value": True}))
+        self.assertIsNone(self.cache.get({"value": 1.0}))
+        self.assertEqual(body(cached), {"value": 1})
+
+    def test_unsuitable_objects_are_not_cached(self):
+        for data in ({"a": 1, "b": 2, "c": 3, "d": 4, "e": 5}, {"text": "x" * 257}, {"list": [1]}, [1, 2]):
+            with self.subTest(data=data):
+                self.assertIsNone(self.cache.get(data))
+                self.assertIsNone(self.cache.get(data))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_window_forgets_seen_responses(self):
+        self.cache.get({"token": "first"})
+        for i in range(8):
+            self.cache.get({"token": f"unique {i}"})
+        # Окно переполнилось и очищено: первый ответ снова встречается "впервые"
+        self.assertIsNone(self.cache.get({"token": "first"}))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_full_cache_stops_accepting(self):
+        for i in range(6):
+            for _ in range(2):
+                self.cache.get({"value": i})
+        self.assertEqual(len(self.cache), 4)
+        self.assertIsNone(self.cache.get({"value": 5}))
+        self.assertIsNotNone(self.cache.get({"value": 0}))
+
+
+if __name__ == '__main__':
+    unittest.main()
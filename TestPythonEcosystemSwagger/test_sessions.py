@@ -0,0 +1,223 @@
+"""Хранилища сессий: в памяти, в файлах (SQLite, mmap) и подписанные токены"""
+import os
+import tempfile
+import time
+import unittest
+
+from sessions import MmapSessionStore, SQLiteSessionStore, SessionStore, SignedSessionStore, fcntl
+
+SECRET = b'0123456789abcdef0123456789abcdef'
+
+
+class SessionStoreTest(unittest.TestCase):
+    def test_create_get_remove(self):
+        store = SessionStore(ttl=60)
+        session = store.create('user')
+        self.assertIs(store.get(session.token), session)
+        self.assertIsNone(store.get('unknown'))
+        self.assertTrue(store.remove(session.token))
+        self.assertFalse(store.remove(session.token))
+        self.assertIsNone(store.get(session.token))
+        self.assertEqual(store.stats()["removed"], 1)
+
+    def test_sweep_removes_only_expired_sessions(self):
+        store = SessionStore(ttl=60)
+        sessions = [store.create(f'user{i}') for i in range(5)]
+        now = time.time()
+        self.assertEqual(store.sweep(now), 0)
+        self.assertEqual(store.sweep(now + 61), 5)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.stats()["expired"], 5)
+        self.assertIsNone(store.get(sessions[0].token))
+
+    def test_sweep_skips_stale_heap_entries(self):
+        store = SessionStore(ttl=60)
+        removed, kept = store.create('removed'), store.create('kept')
+        store.remove(removed.token)
+        # Запись удаленной сессии осталась в куче, но не считается истекшей
+        self.assertEqual(store.sweep(time.time() + 61), 1)
+        self.assertEqual(store.stats()["expired"], 1)
+        self.assertIsNone(store.get(kept.token))
+
+    def test_expired_session_is_not_returned_before_sweep(self):
+        store = SessionStore(ttl=-1)
+        session = store.create('user')
+        self.assertIsNone(store.get(session.token))
+        self.assertEqual(len(store), 0)
+
+    def test_least_recently_used_session_is_evicted(self):
+        store = SessionStore(ttl=60, max_sessions=3)
+        first, second, third = (store.create(f'user{i}') for i in range(3))
+        store.get(first.token)
+        fourth = store.create('user3')
+        self.assertIsNone(store.get(second.token))
+        for session in (first, third, fourth):
+            self.assertIsNotNone(store.get(session.token))
+        self.assertEqual(store.stats()["evicted"], 1)
+        self.assertEqual(len(store), 3)
+
+    def test_heap_is_compacted(self):
+        store = SessionStore(ttl=60)
+        for _ in range(3000):
+            store.remove(store.create('user').token)
+        self.assertLessEqual(len(store._expiry_heap), 1024 + 1)
+
+    def test_snapshot_restore_skips_expired(self):
+        store = SessionStore(ttl=60)
+        session = store.create('user')
+        records = store.snapshot() + [['expired', 'user', time.time() - 1]]
+        restored = SessionStore(ttl=60)
+        self.assertEqual(restored.restore(records), 1)
+        self.assertEqual(restored.get(session.token).user_login, 'user')
+
+    def test_sweeper_thread(self):
+        store = SessionStore(ttl=0.05)
+        store.create('user')
+        store.start_sweeper(0.02)
+        self.addCleanup(store.stop_sweeper)
+        deadline = time.time() + 2
+        while len(store) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(store), 0)
+
+
+class FileSessionStoreTests:
+    """Общие проверки файловых хранилищ; store_class задает подкласс"""
+
+    store_class = None
+    file_name = None
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, self.file_name)
+
+    def open(self, **kwargs):
+        return self.store_class(self.path, **kwargs)
+
+    def sweep(self, store, now=None):
+        return store.sweep(now)
+
+    def test_create_get_remove(self):
+        store = self.open(ttl=60)
+        session = store.create('пользователь')
+        found = store.get(session.token)
+        self.assertEqual((found.token, found.user_login), (session.token, 'пользователь'))
+        self.assertAlmostEqual(found.expires_at, session.expires_at, places=3)
+        self.assertIsNone(store.get('unknown'))
+        self.assertTrue(store.remove(session.token))
+        self.assertFalse(store.remove(session.token))
+        self.assertIsNone(store.get(session.token))
+        self.assertEqual(store.stats()["removed"], 1)
+
+    def test_sessions_survive_reopening(self):
+        session = self.open(ttl=60).create('user')
+        self.assertEqual(self.open(ttl=60).get(session.token).user_login, 'user')
+
+    def test_sweep_removes_only_expired_sessions(self):
+        store = self.open(ttl=60)
+        sessions = [store.create(f'user{i}') for i in range(5)]
+        self.assertEqual(self.sweep(store), 0)
+        self.assertEqual(self.sweep(store, time.time() + 61), 5)
+        stats = store.stats()
+        self.assertEqual((stats["live"], stats["expired"]), (0, 5))
+        self.assertIsNone(store.get(sessions[0].token))
+
+    def test_expired_session_is_not_returned_before_sweep(self):
+        store = self.open(ttl=-1)
+        self.assertIsNone(store.get(store.create('user').token))
+
+    def test_max_sessions(self):
+        store = self.open(ttl=60, max_sessions=3)
+        for i in range(5):
+            store.create(f'user{i}')
+        stats = store.stats()
+        self.assertEqual((stats["live"], stats["evicted"]), (3, 2))
+
+
+class SQLiteSessionStoreTest(FileSessionStoreTests, unittest.TestCase):
+    store_class = SQLiteSessionStore
+    file_name = 'sessions.db'
+
+
+@unittest.skipIf(fcntl is None, "mmap session backend requires a POSIX system")
+class MmapSessionStoreTest(FileSessionStoreTests, unittest.TestCase):
+    store_class = MmapSessionStore
+    file_name = 'sessions.mmap'
+
+    def sweep(self, store, now=None):
+        # Вызов просматривает SWEEP_CHUNK слотов: полный круг - несколько вызовов
+        passes = -(-store._slots // store.SWEEP_CHUNK)
+        return sum(store.sweep(now) for _ in range(passes))
+
+    def test_max_sessions(self):
+        # Лимит приблизительный, но записей не больше слотов: лишние вытесняются
+        store = self.open(ttl=60, max_sessions=3)
+        for i in range(20):
+            store.create(f'user{i}')
+        stats = store.stats()
+        self.assertLessEqual(stats["live"], store._slots)
+        self.assertEqual(stats["live"] + stats["evicted"], 20)
+
+    def test_invalid_tokens(self):
+        store = self.open(ttl=60)
+        for token in ('', 'not-a-uuid', None):
+            with self.subTest(token=token):
+                self.assertIsNone(store.get(token))
+                self.assertFalse(store.remove(token))
+
+
+class SignedSessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = SignedSessionStore(secret=SECRET, ttl=60)
+
+    def test_token_is_accepted_by_store_with_same_secret(self):
+        session = self.store.create('пользователь')
+        other = SignedSessionStore(secret=SECRET, ttl=60).get(session.token)
+        self.assertIsNotNone(other)
+        self.assertEqual(other.user_login, 'пользователь')
+        self.assertEqual(other.expires_at, session.expires_at)
+
+    def test_token_signed_with_other_secret_is_rejected(self):
+        token = SignedSessionStore(secret=b'x' * 32).create('user').token
+        self.assertIsNone(self.store.get(token))
+
+    def test_tampered_tokens_are_rejected(self):
+        token = self.store.create('user').token
+        expires_at, rest = token.split('.', 1)
+        for forged in (f"{int(expires_at) + 3600}.{rest}",   # продленный срок
+                       token[:-1] + ('0' if token[-1] != '0' else '1'),
+                       token + '0', '', '.', 'a.b.c', 'a.b.c.d.e'):
+            with self.subTest(token=forged):
+                self.assertIsNone(self.store.get(forged))
+
+    def test_non_ascii_token_is_rejected(self):
+        token = self.store.create('user').token
+        for forged in (token[:-2] + 'éé', token[:-1] + '٣', 'é.é.é.é'):
+            with self.subTest(token=forged):
+                self.assertIsNone(self.store.get(forged))
+                self.assertFalse(self.store.remove(forged))
+
+    def test_expired_token_is_rejected(self):
+        token = SignedSessionStore(secret=SECRET, ttl=-1).create('user').token
+        self.assertIsNone(self.store.get(token))
+
+    def test_revoked_token_is_rejected(self):
+        token = self.store.create('user').token
+        self.assertIsNotNone(self.store.get(token))
+        self.assertTrue(self.store.remove(token))
+        self.assertIsNone(self.store.get(token))
+        self.assertFalse(self.store.remove(token))
+
+    def test_random_secret_survives_snapshot(self):
+        store = SignedSessionStore(ttl=60)
+        token = store.create('user').token
+        restored = SignedSessionStore(ttl=60)
+        self.assertIsNone(restored.get(token))
+        restored.restore(store.snapshot())
+        self.assertIsNotNone(restored.get(token))
+        self.assertGreater(restored.get(token).expires_at, time.time())
+
+
+if __name__ == '__main__':
+    unittest.main()
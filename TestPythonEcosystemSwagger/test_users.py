@@ -0,0 +1,89 @@
+"""Учетные записи: хеши pbkdf2_sha256 и scrypt, загрузка файла пользователей и вход"""
+import json
+import os
+import tempfile
+import unittest
+
+from users import DEFAULT_USER, UserStore, hash_parameters, hash_password, verify_password
+
+# Малая цена хеша, чтобы тесты не ждали
+WORK_FACTORS = {'pbkdf2_sha256': 1000, 'scrypt': 1024}
+
+
+class HashPasswordTest(unittest.TestCase):
+    def test_verify(self):
+        for algorithm, work_factor in WORK_FACTORS.items():
+            with self.subTest(algorithm=algorithm):
+                encoded = hash_password('пароль', algorithm, work_factor)
+                self.assertEqual(hash_parameters(encoded), (algorithm, work_factor))
+                self.assertTrue(verify_password('пароль', encoded))
+                self.assertFalse(verify_password('пароль2', encoded))
+                # Соль случайная: одинаковые пароли дают разные хеши
+                self.assertNotEqual(hash_password('пароль', algorithm, work_factor), encoded)
+
+    def test_malformed_hashes_are_rejected(self):
+        encoded = hash_password('secret', 'pbkdf2_sha256', 1000)
+        for broken in ('', 'md5$1$abc$def', encoded.replace('pbkdf2_sha256$1000', 'pbkdf2_sha256$x'),
+                       encoded.rsplit('$', 1)[0] + '$!!!'):
+            with self.subTest(encoded=broken):
+                self.assertFalse(verify_password('secret', broken))
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            hash_password('secret', 'scrypt', 1000)
+        with self.assertRaises(ValueError):
+            hash_password('secret', 'md5', 1)
+
+
+class UserStoreTest(unittest.TestCase):
+    def write(self, data):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'users.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        return path
+
+    def test_load_and_authenticate(self):
+        users = [{"login": f"{algorithm}-user", "email": f"{algorithm}@example.com",
+                  "passwordHash": hash_password(f"{algorithm}-secret", algorithm, work_factor)}
+                 for algorithm, work_factor in WORK_FACTORS.items()]
+        users[1]["role"] = "Admin"
+        store = UserStore.load(self.write({"users": users}))
+        self.assertEqual(len(store), 2)
+        for algorithm in WORK_FACTORS:
+            with self.subTest(algorithm=algorithm):
+                user = store.authenticate(f"{algorithm}-user", f"{algorithm}-secret")
+                self.assertEqual(user.login, f"{algorithm}-user")
+                self.assertIsNone(store.authenticate(f"{algorithm}-user", "wrong"))
+        self.assertEqual(store.get('scrypt-user').profile(),
+                         {"username": "scrypt-user", "email": "scrypt@example.com", "role": "Admin"})
+
+    def test_unknown_login_is_checked_against_dummy_hash(self):
+        encoded = hash_password('secret', 'scrypt', 1024)
+        store = UserStore.load(self.write([{"login": "user", "passwordHash": encoded}]))
+        self.assertIsNone(store.authenticate('unknown', 'secret'))
+        # Фиктивный хеш той же цены, что у настоящих пользователей
+        self.assertEqual(hash_parameters(store._dummy_hash), ('scrypt', 1024))
+
+    def test_invalid_files(self):
+        for data in ({"users": {}}, {"users": [{"login": "user"}]}, {"users": [None]}, {"users": []}, "users"):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    UserStore.load(self.write(data))
+
+    def test_default_user(self):
+        store = UserStore.default('scrypt', 1024)
+        user = store.authenticate(DEFAULT_USER['login'], DEFAULT_USER['password'])
+        self.assertEqual(user.username, DEFAULT_USER['username'])
+        self.assertEqual(hash_parameters(user.password_hash), ('scrypt', 1024))
+
+    def test_authenticate_in_process_pool(self):
+        store = UserStore.default('pbkdf2_sha256', 1000, hash_workers=1)
+        self.addCleanup(store.close)
+        self.assertIsNotNone(store.authenticate(DEFAULT_USER['login'], DEFAULT_USER['password']))
+        self.assertIsNone(store.authenticate(DEFAULT_USER['login'], 'wrong'))
+
+
+if __name__ == '__main__':
+    unittest.main()
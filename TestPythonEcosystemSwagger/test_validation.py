@@ -0,0 +1,73 @@
+"""Проверка параметров по спецификации: преобразование типов и пустые поля"""
+import unittest
+
+from request_body import RequestParams
+from validation import compile_operation
+
+OPERATION = {
+    "parameters": [
+        {"name": "limit", "in": "query", "schema": {"type": "integer", "minimum": 1, "maximum": 100}},
+    ],
+    "requestBody": {
+        "content": {
+            "application/x-www-form-urlencoded": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "message": {"type": "string", "maxLength": 10},
+                        "stream": {"type": "string", "enum": ["sse", "chunked"]},
+                        "tokenDelayMs": {"type": "number", "minimum": 0, "maximum": 10000},
+                        "flag": {"type": "boolean"},
+                    },
+                    "required": ["message"],
+                }
+            }
+        }
+    },
+}
+
+
+class ValidateTest(unittest.TestCase):
+    def setUp(self):
+        self.validate = compile_operation(OPERATION)
+
+    def test_values_are_converted(self):
+        params = {'message': ['hi'], 'limit': ['5'], 'tokenDelayMs': ['2.5'], 'flag': ['TRUE']}
+        self.assertIsNone(self.validate(params))
+        self.assertEqual(params['limit'], [5])
+        self.assertEqual(params['tokenDelayMs'], [2.5])
+        self.assertEqual(params['flag'], [True])
+
+    def test_invalid_values_are_reported(self):
+        params = {'message': ['hi'], 'limit': ['0'], 'tokenDelayMs': ['nan'], 'stream': ['true']}
+        problems = self.validate(params)
+        self.assertEqual([p['field'] for p in problems], ['limit', 'stream', 'tokenDelayMs'])
+        self.assertEqual(problems[0]['message'], "limit must be between 1 and 100")
+
+    def test_only_json_style_numbers_are_accepted(self):
+        for value in (' 5', '5_0', '٥', '0x10'):
+            with self.subTest(value=value):
+                self.assertTrue(self.validate({'message': ['hi'], 'limit': [value]}))
+
+    def test_missing_required_field(self):
+        for params in ({}, {'message': ['']}):
+            with self.subTest(params=params):
+                problems = self.validate(params)
+                self.assertEqual(problems, [{"field": "message", "in": "body",
+                                             "message": "Missing required field: message"}])
+
+    def test_blank_optional_fields_are_dropped(self):
+        params = {'message': ['hi'], 'limit': [''], 'tokenDelayMs': ['']}
+        self.assertIsNone(self.validate(params))
+        self.assertEqual(params, {'message': ['hi']})
+
+    def test_blank_optional_body_field_of_request_params(self):
+        params = RequestParams({}, b'message=hi&tokenDelayMs=&stream=sse', None)
+        self.assertIsNone(self.validate(params))
+        self.assertNotIn('tokenDelayMs', params)
+        self.assertEqual(params.get('tokenDelayMs', [250])[0], 250)
+        self.assertEqual(params['stream'], ['sse'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Генератор ответов чата: n-граммная цепь Маркова по текстовому корпусу.
+
+Корпус разбирается один раз при загрузке. Состояние цепи - последние order
+слов; для каждого состояния запоминаются продолжения (следующие состояния)
+с частотами, упорядоченные по убыванию частоты. Корпус замкнут в кольцо,
+поэтому у каждого состояния есть продолжение.
+
+Выборка зависит от temperature и top-p сессии. Для каждой пары значений один
+раз строится таблица выборки и хранится в LRU-кеше: каждому состоянию
+отведено SLOTS ячеек с номерами следующих состояний, продолжение занимает
+число ячеек пропорционально своей вероятности. Вероятность продолжения с
+частотой c - c ** (1 / temperature), нормированная по всем продолжениям;
+затем остается наименьший набор самых вероятных продолжений с суммарной
+вероятностью не меньше top_p. temperature = 0 - всегда самое частое
+продолжение. Шаг генерации - одно чтение из плоского массива по случайному
+индексу, без вычислений вероятностей.
+
+Ответ задается длиной в символах, seed генератора случайных чисел и текстом
+сообщения: начало ответа выбирается среди начал предложений корпуса со
+словом из сообщения, если такие есть. Одинаковые корпус, сообщение, seed,
+temperature, top_p и длина дают один и тот же ответ.
+"""
+import random
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+# Ячеек таблицы выборки на состояние: индекс ячейки - SLOT_BITS случайных бит
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+
+WORD_RE = re.compile(r'\S+')
+SENTENCE_END = ('.', '!', '?', '…')
+PUNCTUATION = '.,!?…:;"«»()—-'
+
+
+class TextGenerator:
+    """Цепь Маркова порядка order по словам корпуса"""
+
+    def __init__(self, text, order=1, cache_size=16):
+        words = WORD_RE.findall(text)
+        if len(words) <= order:
+            raise ValueError(f"Corpus must contain more than {order} words")
+        self.order = order
+        self.cache_size = cache_size
+        self.corpus_words = len(words)
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+        ring = words + words[:order]
+        states = {}
+        keys = []
+        transitions = []
+        starts = []
+        for position in range(len(words) + 1):
+            key = tuple(ring[position:position + order])
+            state = states.get(key)
+            if state is None:
+                state = states[key] = len(keys)
+                keys.append(key)
+                transitions.append({})
+            if position:
+                counts = transitions[previous]
+                counts[state] = counts.get(state, 0) + 1
+            if position < len(words) and (position == 0 or words[position - 1].endswith(SENTENCE_END)):
+                starts.append(state)
+            previous = state
+        # Слово, которое добавляет переход в состояние, - последнее слово его ключа
+        self._emit = [key[-1] for key in keys]
+        self._keys = keys
+        # Продолжения по убыванию частоты: (частоты, следующие состояния)
+        self._successors = []
+        for counts in transitions:
+            ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            self._successors.append((tuple(c for _, c in ordered), tuple(s for s, _ in ordered)))
+        self._starts = starts
+        self._starts_by_word = {}
+        for state in starts:
+            word = _normalize(keys[state][0])
+            self._starts_by_word.setdefault(word, []).append(state)
+        self._mean_length = max(1, round(sum(map(len, words)) / len(words)) + 1)
+
+    @classmethod
+    def load(cls, path, order=1):
+        with open(path, encoding='utf-8') as f:
+            return cls(f.read(), order)
+
+    def __len__(self):
+        """Число состояний цепи"""
+        return len(self._keys)
+
+    def table(self, temperature, top_p):
+        """Таблица выборки для пары значений; строится при первом обращении"""
+        key = (temperature, top_p)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+        # Строится без блокировки: параллельные запросы с новой парой значений
+        # построят одинаковые таблицы, останется одна
+        table = self._build_table(temperature, top_p)
+        with self._lock:
+            self._tables[key] = table
+            while len(self._tables) > self.cache_size:
+                self._tables.popitem(last=False)
+        return table
+
+    def _build_table(self, temperature, top_p):
+        table = array('I', bytes(4 * SLOTS * len(self._keys)))
+        for state, (counts, successors) in enumerate(self._successors):
+            slots = _allocate(_weights(counts, temperature, top_p))
+            cells = []
+            for successor, count in zip(successors, slots):
+                cells += [successor << SLOT_BITS] * count
+            offset = state << SLOT_BITS
+            table[offset:offset + SLOTS] = array('I', cells)
+        return table
+
+    def generate(self, length, temperature=1.0, top_p=1.0, seed=None, prompt=''):
+        """Текст ровно из length символов (если length > 0)"""
+        if length <= 0:
+            return ''
+        rng = random.Random(seed)
+        table = self.table(temperature, top_p)
+        state = self._start(rng, prompt)
+        parts = list(self._keys[state])
+        size = sum(map(len, parts)) + len(parts)
+        emit = self._emit
+        append = parts.append
+        getrandbits = rng.getrandbits
+        cell = state << SLOT_BITS
+        while size <= length:
+            # Шагов с запасом по средней длине слова; длина пересчитывается после пачки
+            steps = (length - size) // self._mean_length + 1
+            for _ in range(steps):
+                cell = table[cell | getrandbits(SLOT_BITS)]
+                append(emit[cell >> SLOT_BITS])
+            size += sum(map(len, parts[-steps:])) + steps
+        return ' '.join(parts)[:length]
+
+    def _start(self, rng, prompt):
+        """Начальное состояние: начало предложения со словом из prompt или любое"""
+        candidates = []
+        for word in WORD_RE.findall(prompt or ''):
+            candidates += self._starts_by_word.get(_normalize(word), ())
+        return rng.choice(candidates or self._starts or range(len(self._keys)))
+
+
+def _normalize(word):
+    return word.strip(PUNCTUATION).lower()
+
+
+def _weights(counts, temperature, top_p):
+    """Веса продолжений (по убыванию) после temperature и top_p; хвост отброшен"""
+    if temperature <= 0 or len(counts) == 1:
+        return [1.0]
+    top = counts[0]
+    exponent = 1 / temperature
+    # (c / top) <= 1: степень не переполняется и при малой температуре
+    weights = [(count / top) ** exponent for count in counts[:SLOTS]]
+    threshold = top_p * sum(weights)
+    kept = []
+    total = 0.0
+    for weight in weights:
+        if weight <= 0:
+            break
+        kept.append(weight)
+        total += weight
+        if total >= threshold:
+            break
+    return kept
+
+
+def _allocate(weights):
+    """Число ячеек каждого веса: всего SLOTS, каждому не меньше одной"""
+    spare = SLOTS - len(weights)
+    total = sum(weights)
+    shares = [weight / total * spare for weight in weights]
+    slots = [1 + int(share) for share in shares]
+    # Остаток - по наибольшим дробным частям
+    remainder = SLOTS - sum(slots)
+    for index in sorted(range(len(weights)), key=lambda i: shares[i] - int(shares[i]), reverse=True)[:remainder]:
+        slots[index] += 1
+    return slots
@@ -0,0 +1,67 @@
+"""Запись трафика в NDJSON для воспроизведения (benchmarks/replay.py).
+
+Каждый запрос, прошедший через обработчик, - одна строка JSON:
+
+    {"ts": 1760000000.123, "client": "127.0.0.1", "method": "POST",
+     "path": "/api/chat/send", "headers": [["Content-Type", "..."], ...],
+     "body": "message=hi&sessionToken=...", "status": 200, "durationMs": 3.214,
+     "user": "v_shutenko"}
+
+ts - время начала запроса (секунды эпохи), path - вместе с query-строкой.
+Тело, которое не декодируется как UTF-8, пишется в bodyBase64; тело длиннее
+max_body обрезается, и тогда его полный размер - в bodySize. user - владелец
+сессии для маршрутов, требующих sessionToken.
+
+Запись устроена как журнал доступа (access_log.LogPipeline): поток запроса
+только кладет кортеж в очередь, JSON собирает и пишет пачками фоновый поток.
+Если поток записи не успевает, запросы не попадают в файл; на месте потерь
+в файле строка {"ts": ..., "dropped": N}. В режиме prefork укажите {pid}
+в имени файла - у каждого процесса свой файл, replay.py сливает их по ts.
+"""
+import base64
+import json
+import time
+
+from access_log import BatchWriter, LogPipeline
+
+
+class TrafficCapture(LogPipeline):
+    """Очередь записанных запросов и поток, который пишет их в файл"""
+
+    def __init__(self, path, max_body=64 * 1024, queue_size=100000, batch_size=512):
+        # Файл записи не поворачивается: replay.py читает его целиком
+        super().__init__(BatchWriter(path, max_bytes=0), queue_size=queue_size, batch_size=batch_size)
+        self.max_body = max_body
+
+    def record(self, client, method, path, headers, body, status, duration, user=None):
+        """Запрос в очередь записи; вызывается в потоке запроса после ответа"""
+        size = len(body)
+        # body может быть буфером потока (read_body), который перезапишет следующий запрос
+        body = bytes(body[:self.max_body]) if size > self.max_body else bytes(body)
+        self.put((time.time() - duration, client, method, path, headers.items(), body, size,
+                  status, duration, user))
+
+    def _format(self, item):
+        started, client, method, path, headers, body, size, status, duration, user = item
+        entry = {
+            "ts": round(started, 6),
+            "client": client,
+            "method": method,
+            "path": path,
+            "headers": headers,
+        }
+        if body:
+            try:
+                entry["body"] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                entry["bodyBase64"] = base64.b64encode(body).decode('ascii')
+        if size > len(body):
+            entry["bodySize"] = size
+        entry["status"] = status
+        entry["durationMs"] = round(duration * 1000, 3)
+        if user is not None:
+            entry["user"] = user
+        return json.dumps(entry, ensure_ascii=False)
+
+    def _format_dropped(self, count):
+        return json.dumps({"ts": round(time.time(), 6), "dropped": count})
@@ -0,0 +1,262 @@
+"""Учетные записи пользователей: файл пользователей, хеши паролей и их проверка.
+
+Файл - JSON {"users": [{"login", "passwordHash", "username", "email",
+"role"}, ...]}; пользователи индексируются словарем по логину. Пароли
+хранятся только хешами с солью в самоописывающем формате:
+
+    pbkdf2_sha256$<итерации>$<соль base64>$<хеш base64>
+    scrypt$<n>$<r>$<p>$<соль base64>$<хеш base64>
+
+Цена хеша (work factor: итерации PBKDF2 или n у scrypt) записана в самом
+хеше, поэтому задержку входа задает файл; для встроенного пользователя - параметры
+сервера. Проверка пароля - основная цена входа, она выполняется в пуле
+процессов (hash_workers) и не занимает GIL процесса сервера. Для
+неизвестного логина проверяется пароль против фиктивного хеша той же цены:
+время ответа не выдает, существует ли пользователь.
+
+Файл для нагрузочных тестов:
+    python users.py --count 100000 --output users.json --credentials credentials.csv
+"""
+import argparse
+import base64
+import csv
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import secrets
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_WORK_FACTORS = {'pbkdf2_sha256': 10000, 'scrypt': 16384}
+SALT_SIZE = 16
+HASH_SIZE = 32
+
+# Пользователь, который был единственным до появления файла пользователей
+DEFAULT_USER = {
+    "login": "v_shutenko",
+    "password": "8nEThznM",
+    "username": "Vitaliy Shutenko",
+    "email": "v_shutenko@example.com",
+    "role": "User",
+}
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def hash_password(password, algorithm='pbkdf2_sha256', work_factor=None, salt=None):
+    """Хеш пароля с солью в формате algorithm$параметры$соль$хеш"""
+    work_factor = work_factor or DEFAULT_WORK_FACTORS[algorithm]
+    salt = salt or os.urandom(SALT_SIZE)
+    secret = password.encode('utf-8')
+    if algorithm == 'pbkdf2_sha256':
+        digest = hashlib.pbkdf2_hmac('sha256', secret, salt, work_factor, HASH_SIZE)
+        return f"pbkdf2_sha256${work_factor}${_b64(salt)}${_b64(digest)}"
+    if algorithm == 'scrypt':
+        if work_factor & (work_factor - 1):
+            raise ValueError("scrypt work factor must be a power of two")
+        digest = hashlib.scrypt(secret, salt=salt, n=work_factor, r=8, p=1,
+                                maxmem=256 * work_factor * 8 + 1024 * 1024, dklen=HASH_SIZE)
+        return f"scrypt${work_factor}$8$1${_b64(salt)}${_b64(digest)}"
+    raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+
+
+def hash_parameters(encoded):
+    """(алгоритм, work factor) хеша"""
+    algorithm, work_factor = encoded.split('$', 2)[:2]
+    return algorithm, int(work_factor)
+
+
+def verify_password(password, encoded):
+    """True, если пароль соответствует хешу; выполняется и в процессах пула"""
+    try:
+        algorithm, *parameters, salt, expected = encoded.split('$')
+        salt, expected = base64.b64decode(salt), base64.b64decode(expected)
+        secret = password.encode('utf-8')
+        if algorithm == 'pbkdf2_sha256':
+            digest = hashlib.pbkdf2_hmac('sha256', secret, salt, int(parameters[0]), len(expected))
+        elif algorithm == 'scrypt':
+            n, r, p = map(int, parameters)
+            digest = hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024,
+                                    dklen=len(expected))
+        else:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest, expected)
+
+
+def _ready():
+    return True
+
+
+def _watch_parent(parent_pid):
+    """Инициализатор процесса пула: выход, когда сервер завершился.
+
+    Сервер, остановленный сигналом, не успевает закрыть пул, а процессы пула
+    держат обе стороны своей очереди и сами конца очереди не увидят.
+    Ctrl-C в терминале получает вся группа процессов: пул его не замечает,
+    пока сервер дожидается входов в обработке.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1.0)
+        os._exit(0)
+
+    threading.Thread(target=watch, name="parent-watch", daemon=True).start()
+
+
+class User:
+    __slots__ = ('login', 'password_hash', 'username', 'email', 'role')
+
+    def __init__(self, login, password_hash, username=None, email=None, role='User'):
+        self.login = login
+        self.password_hash = password_hash
+        self.username = username or login
+        self.email = email
+        self.role = role
+
+    def profile(self):
+        return {"username": self.username, "email": self.email, "role": self.role}
+
+
+class UserStore:
+    """Пользователи по логину и проверка паролей в пуле процессов.
+
+    hash_workers=0 - проверка в вызывающем потоке. Пул создается в каждом
+    процессе при первой проверке (процессы prefork получают свой) и
+    запускается через spawn: дочерние процессы не наследуют потоки и
+    блокировки сервера.
+    """
+
+    def __init__(self, users=(), hash_workers=0):
+        self._users = {user.login: user for user in users}
+        if not self._users:
+            raise ValueError("user store is empty")
+        self.hash_workers = hash_workers
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        # Для неизвестных логинов: та же цена проверки, что у настоящих пользователей
+        sample = next(iter(self._users.values())).password_hash
+        self._dummy_hash = hash_password(secrets.token_hex(8), *hash_parameters(sample))
+
+    @classmethod
+    def load(cls, path, hash_workers=0):
+        """Пользователи из файла JSON"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        entries = data.get('users') if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            raise ValueError(f"{path}: expected {{\"users\": [...]}}")
+        users = []
+        for number, entry in enumerate(entries, 1):
+            try:
+                users.append(User(entry['login'], entry['passwordHash'], entry.get('username'),
+                                  entry.get('email'), entry.get('role', 'User')))
+            except (KeyError, TypeError):
+                raise ValueError(f"{path}: user #{number} needs 'login' and 'passwordHash'") from None
+        return cls(users, hash_workers)
+
+    @classmethod
+    def default(cls, algorithm='pbkdf2_sha256', work_factor=None, hash_workers=0):
+        """Встроенный пользователь; хеш его пароля вычисляется при запуске"""
+        entry = DEFAULT_USER
+        user = User(entry['login'], hash_password(entry['password'], algorithm, work_factor),
+                    entry['username'], entry['email'], entry['role'])
+        return cls([user], hash_workers)
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, login):
+        return self._users.get(login)
+
+    def authenticate(self, login, password):
+        """Пользователь, если логин и пароль верны, иначе None"""
+        user = self._users.get(login)
+        if not self._verify(password, user.password_hash if user is not None else self._dummy_hash):
+            return None
+        return user
+
+    def _verify(self, password, encoded):
+        if not self.hash_workers:
+            return verify_password(password, encoded)
+        return self._executor().submit(verify_password, password, encoded).result()
+
+    def _executor(self):
+        if self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool_pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(self.hash_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_watch_parent, initargs=(os.getpid(),))
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def warm_up(self):
+        """Запуск процессов пула заранее, чтобы первые входы не ждали их старта"""
+        if self.hash_workers:
+            pool = self._executor()
+            for future in [pool.submit(_ready) for _ in range(self.hash_workers)]:
+                future.result()
+
+    def close(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._pool_pid = None
+
+
+def _generate_user(arguments):
+    index, algorithm, work_factor = arguments
+    login = f"user{index:06d}"
+    password = secrets.token_urlsafe(9)
+    return {
+        "login": login,
+        "passwordHash": hash_password(password, algorithm, work_factor),
+        "username": f"Load Test User {index}",
+        "email": f"{login}@example.com",
+        "role": "User",
+    }, password
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация файла пользователей для --users-file")
+    parser.add_argument('--count', type=int, default=1000, help="число пользователей (кроме встроенного)")
+    parser.add_argument('--output', default='users.json', help="файл пользователей")
+    parser.add_argument('--credentials', default=None,
+                        help="CSV login,password для нагрузочных тестов (benchmarks/loadgen.py --credentials)")
+    parser.add_argument('--algorithm', choices=sorted(DEFAULT_WORK_FACTORS), default='pbkdf2_sha256')
+    parser.add_argument('--work-factor', type=int, default=None,
+                        help="итерации PBKDF2 или n scrypt (по умолчанию 10000 и 16384)")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="процессов для хеширования")
+    args = parser.parse_args()
+
+    default = DEFAULT_USER
+    users = [{"login": default['login'],
+              "passwordHash": hash_password(default['password'], args.algorithm, args.work_factor),
+              "username": default['username'], "email": default['email'], "role": default['role']}]
+    credentials = [(default['login'], default['password'])]
+    jobs = [(index, args.algorithm, args.work_factor) for index in range(1, args.count + 1)]
+    with ProcessPoolExecutor(args.processes) as pool:
+        for user, password in pool.map(_generate_user, jobs, chunksize=256):
+            users.append(user)
+            credentials.append((user['login'], password))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"users": users}, f, ensure_ascii=False, indent=0)
+    if args.credentials:
+        with open(args.credentials, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('login', 'password'))
+            writer.writerows(credentials)
+    print(f"{len(users)} users written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Проверка параметров запроса по спецификации OpenAPI, скомпилированная заранее.
+
+Спецификация (build_swagger_spec) разбирается один раз при загрузке: для
+каждой операции строится функция проверки - кортеж полей (имя, где
+передается, обязательно ли, преобразователь) и цикл по нему. Во время
+запроса схема не обходится: каждому полю соответствует готовая функция,
+которая переводит строку в значение нужного типа (integer, number, boolean,
+string) и проверяет minimum/maximum, enum, minLength/maxLength и pattern.
+
+Проверенное значение записывается обратно в параметры уже преобразованным:
+обработчик получает int, а не строку, и не проверяет его сам. Пустая строка
+считается отсутствием поля - как и прежде для обязательных полей.
+
+Функция проверки возвращает None, если запрос корректен, иначе список
+проблем {"field", "in", "message"} для ответа 400.
+"""
+import math
+import re
+
+FORM = 'application/x-www-form-urlencoded'
+JSON = 'application/json'
+
+BOOLEANS = {'true': True, 'false': False, '1': True, '0': False}
+# int() и float() принимают пробелы по краям, "_" между цифрами и цифры
+# любых письменностей; в параметрах допускаются только числа вида JSON
+INTEGER = re.compile(r'[+-]?[0-9]+\Z')
+NUMBER = re.compile(r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?\Z')
+
+
+def _resolve(schema, components):
+    """Схема с подставленной ссылкой $ref на components/schemas"""
+    while '$ref' in schema:
+        schema = components[schema['$ref'].rsplit('/', 1)[-1]]
+    return schema
+
+
+def _format_bound(value):
+    # :g у больших целых дает 1.67772e+07
+    return str(value) if isinstance(value, int) else f"{value:g}"
+
+
+def _bounds_message(name, schema):
+    low, high = schema.get('minimum'), schema.get('maximum')
+    if low is not None and high is not None:
+        return f"{name} must be between {_format_bound(low)} and {_format_bound(high)}"
+    if low is not None:
+        return f"{name} must be >= {_format_bound(low)}"
+    return f"{name} must be <= {_format_bound(high)}"
+
+
+def _bounds_check(schema):
+    """Функция value -> bool для minimum/maximum (и exclusive-вариантов OpenAPI 3.0) или None"""
+    low, high = schema.get('minimum'), schema.get('maximum')
+    if low is None and high is None:
+        return None
+    low = -math.inf if low is None else low
+    high = math.inf if high is None else high
+    if schema.get('exclusiveMinimum') or schema.get('exclusiveMaximum'):
+        low_open, high_open = bool(schema.get('exclusiveMinimum')), bool(schema.get('exclusiveMaximum'))
+        return lambda value: (value > low if low_open else value >= low) and \
+            (value < high if high_open else value <= high)
+    return lambda value: low <= value <= high
+
+
+def build_converter(name, schema):
+    """Функция строка -> значение; ValueError с сообщением для клиента. None - проверять нечего"""
+    kind = schema.get('type', 'string')
+    enum = schema.get('enum')
+    if kind in ('integer', 'number'):
+        parse = int if kind == 'integer' else float
+        well_formed = (INTEGER if kind == 'integer' else NUMBER).match
+        type_message = f"{name} must be an {kind}" if kind == 'integer' else f"{name} must be a number"
+        in_bounds = _bounds_check(schema)
+        bounds_message = _bounds_message(name, schema) if in_bounds is not None else None
+
+        def convert(value):
+            try:
+                # Строку длиннее sys.get_int_max_str_digits() int() тоже не примет
+                number = parse(value) if well_formed(value) is not None else None
+            except ValueError:
+                number = None
+            if number is None:
+                raise ValueError(type_message)
+            if kind == 'number' and not math.isfinite(number):
+                raise ValueError(type_message)
+            if in_bounds is not None and not in_bounds(number):
+                raise ValueError(bounds_message)
+            return number
+        return convert
+    if kind == 'boolean':
+        message = f"{name} must be true or false"
+
+        def convert(value):
+            try:
+                return BOOLEANS[value.lower()]
+            except KeyError:
+                raise ValueError(message) from None
+        return convert
+
+    checks = []
+    if enum is not None:
+        allowed = frozenset(enum)
+        checks.append((allowed.__contains__, f"{name} must be one of: {', '.join(map(str, enum))}"))
+    if 'minLength' in schema:
+        minimum = schema['minLength']
+        checks.append((lambda value: len(value) >= minimum, f"{name} must be at least {minimum} characters"))
+    if 'maxLength' in schema:
+        maximum = schema['maxLength']
+        checks.append((lambda value: len(value) <= maximum, f"{name} must be at most {maximum} characters"))
+    if 'pattern' in schema:
+        search = re.compile(schema['pattern']).search
+        checks.append((lambda value: search(value) is not None, f"{name} must match {schema['pattern']}"))
+    if not checks:
+        return None
+
+    def convert(value):
+        for check, message in checks:
+            if not check(value):
+                raise ValueError(message)
+        return value
+    return convert
+
+
+def operation_fields(operation, components):
+    """[(имя, где передается, обязательно, схема)] параметров и полей тела операции"""
+    fields = []
+    for parameter in operation.get('parameters', ()):
+        parameter = _resolve(parameter, components)
+        fields.append((parameter['name'], parameter.get('in', 'query'), bool(parameter.get('required')),
+                       _resolve(parameter.get('schema', {}), components)))
+    content = operation.get('requestBody', {}).get('content', {})
+    media = content.get(FORM) or content.get(JSON)
+    if media is not None:
+        schema = _resolve(media.get('schema', {}), components)
+        required = set(schema.get('required', ()))
+        for name, field_schema in schema.get('properties', {}).items():
+            fields.append((name, 'body', name in required, _resolve(field_schema, components)))
+    return fields
+
+
+def compile_operation(operation, components=None, skip=()):
+    """Функция проверки params (RequestParams или dict parse_qs) или None, если проверять нечего"""
+    checks = tuple(
+        (name, location, required, build_converter(name, schema))
+        for name, location, required, schema in operation_fields(operation, components or {})
+        if name not in skip
+    )
+    checks = tuple(check for check in checks if check[2] or check[3] is not None)
+    if not checks:
+        return None
+
+    def validate(params):
+        problems = None
+        get = params.get
+        for name, location, required, convert in checks:
+            values = get(name)
+            if not values or values[0] == '':
+                if required:
+                    problems = problems or []
+                    problems.append({"field": name, "in": location, "message": f"Missing required field: {name}"})
+                elif values:
+                    # Пустое необязательное поле - как отсутствующее: обработчик
+                    # получает только преобразованные значения
+                    params.pop(name, None)
+                continue
+            if convert is not None:
+                try:
+                    params[name] = [convert(values[0])]
+                except ValueError as e:
+                    problems = problems or []
+                    problems.append({"field": name, "in": location, "message": str(e)})
+        return problems
+    return validate
+
+
+def compile_validators(spec, skip=()):
+    """{(МЕТОД, шаблон пути): функция проверки} для всех операций спецификации"""
+    components = spec.get('components', {}).get('schemas', {})
+    validators = {}
+    for path, operations in spec.get('paths', {}).items():
+        for method, operation in operations.items():
+            validator = compile_operation(operation, components, skip)
+            if validator is not None:
+                validators[(method.upper(), path)] = validator
+    return validators